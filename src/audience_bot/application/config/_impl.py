@@ -15,6 +15,27 @@ class PipelineConfig:
     report_force_excel: bool = False
     max_total_bytes: int = 50 * 1024 * 1024
     max_processing_seconds: int = 15
+    eager_processing: bool = True
+    eager_workers: int = 2
+    # Где async API выполняет этапы пайплайна: пул потоков или процессов.
+    pipeline_executor: str = "thread"
+    pipeline_workers: int = 2
+    provenance_cap: int = 0
+    audience_store_path: str = ""
+    incremental_ingestion: bool = False
+    enrichment_enabled: bool = False
+    enrichment_workers: int = 4
+    enrichment_rate_per_second: float = 20.0
+    enrichment_max_profiles: int = 500
+    enrichment_cache_path: str = ".cache/enrichment.json"
+    enrichment_cache_ttl_seconds: int = 7 * 24 * 60 * 60
+    excel_engine: str = "openpyxl"
+    report_force_csv: bool = False
+    report_force_jsonl: bool = False
+    report_gzip: bool = False
+    report_max_file_bytes: int = 50 * 1024 * 1024
+    report_cache_max_bytes: int = 64 * 1024 * 1024
+    report_cache_ttl_seconds: int = 10 * 60
 
     @classmethod
     def from_settings(cls, settings: AppSettings) -> "PipelineConfig":
@@ -27,6 +48,26 @@ class PipelineConfig:
             report_force_excel=settings.report_force_excel,
             max_total_bytes=settings.max_total_bytes,
             max_processing_seconds=settings.max_processing_seconds,
+            eager_processing=settings.eager_processing,
+            eager_workers=settings.eager_workers,
+            pipeline_executor=settings.pipeline_executor,
+            pipeline_workers=settings.pipeline_workers,
+            provenance_cap=settings.provenance_cap,
+            audience_store_path=settings.audience_store_path,
+            incremental_ingestion=settings.incremental_ingestion,
+            enrichment_enabled=settings.enrichment_enabled,
+            enrichment_workers=settings.enrichment_workers,
+            enrichment_rate_per_second=settings.enrichment_rate_per_second,
+            enrichment_max_profiles=settings.enrichment_max_profiles,
+            enrichment_cache_path=settings.enrichment_cache_path,
+            enrichment_cache_ttl_seconds=settings.enrichment_cache_ttl_seconds,
+            excel_engine=settings.excel_engine,
+            report_force_csv=settings.report_force_csv,
+            report_force_jsonl=settings.report_force_jsonl,
+            report_gzip=settings.report_gzip,
+            report_max_file_bytes=settings.report_max_file_bytes,
+            report_cache_max_bytes=settings.report_cache_max_bytes,
+            report_cache_ttl_seconds=settings.report_cache_ttl_seconds,
         )
 
 
@@ -37,6 +78,8 @@ class TelegramConfig:
     poll_timeout: int
     base_url: str
     file_base_url: str
+    # Сколько file_id отправленных документов помнить для повторной отправки без загрузки; 0 — не помнить.
+    file_id_cache_size: int = 256
 
     @classmethod
     def from_settings(cls, settings: AppSettings) -> "TelegramConfig":
@@ -48,4 +91,5 @@ class TelegramConfig:
             poll_timeout=settings.telegram_poll_timeout,
             base_url=settings.telegram_base_url,
             file_base_url=settings.telegram_file_base_url,
+            file_id_cache_size=settings.telegram_file_id_cache_size,
         )
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Literal
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,6 +11,16 @@ class AppSettings(BaseSettings):
     telegram_poll_timeout: int = 30
     telegram_base_url: str = "https://api.telegram.org"
     telegram_file_base_url: str = "https://api.telegram.org/file"
+    telegram_file_id_cache_size: int = 256
+    # Эндпоинт /metrics (Prometheus); 0 — выключен.
+    metrics_port: int = 0
+    metrics_host: str = "127.0.0.1"
+    # Трассировка апдейтов: none — выключена, jsonl — файл, otlp — коллектор OTLP/HTTP.
+    trace_exporter: Literal["none", "jsonl", "otlp"] = "none"
+    trace_jsonl_path: str = "traces.jsonl"
+    trace_otlp_endpoint: str = "http://127.0.0.1:4318/v1/traces"
+    # Профили этапов (cProfile, tracemalloc) в этот каталог при остановке бота; пусто — выключено.
+    profile_dir: str = ""
 
     max_files: int = 10
     max_file_size: int = 5 * 1024 * 1024
@@ -16,9 +28,29 @@ class AppSettings(BaseSettings):
     max_messages: int = 200_000
     max_total_bytes: int = 50 * 1024 * 1024
     max_processing_seconds: int = 15
+    eager_processing: bool = True
+    eager_workers: int = 2
+    pipeline_executor: Literal["thread", "process"] = "thread"
+    pipeline_workers: int = 2
+    provenance_cap: int = 0
+    audience_store_path: str = ""
+    incremental_ingestion: bool = False
+    enrichment_enabled: bool = False
+    enrichment_workers: int = 4
+    enrichment_rate_per_second: float = 20.0
+    enrichment_max_profiles: int = 500
+    enrichment_cache_path: str = ".cache/enrichment.json"
+    enrichment_cache_ttl_seconds: int = 7 * 24 * 60 * 60
 
     report_text_threshold: int = 50
     report_force_excel: bool = False
+    report_force_csv: bool = False
+    report_force_jsonl: bool = False
+    report_gzip: bool = False
+    report_max_file_bytes: int = 50 * 1024 * 1024
+    report_cache_max_bytes: int = 64 * 1024 * 1024
+    report_cache_ttl_seconds: int = 10 * 60
+    excel_engine: Literal["openpyxl", "streaming"] = "openpyxl"
 
     model_config = SettingsConfigDict(
         env_file_encoding="utf-8",
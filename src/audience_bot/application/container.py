@@ -1,25 +1,108 @@
 from __future__ import annotations
 
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+import multiprocessing
+from typing import Optional
+
 from dependency_injector import containers, providers
 
-from ..domain.reporting import ReportPolicy
+from ..domain.extraction import AudienceExtractor
+from ..domain.reporting import ReportFormat, ReportPackager, ReportPolicy
+from ..infrastructure.audience_store import SqliteAudienceStore
+from ..infrastructure.enrichment import ProfileEnricher, TTLDiskCache, bucket_for_token
 from ..infrastructure.excel_renderer import ExcelRendererAdapter
 from ..infrastructure.extraction_adapter import ExtractionAdapter
+from ..infrastructure.metrics_server import MetricsServer
 from ..infrastructure.parsers import ParserAdapter
 from ..infrastructure.reporting_adapter import ReportingAdapter
+from ..infrastructure.table_export import TableReportWriter
 from ..infrastructure.temp_storage import InMemoryTempStorageAdapter
-from .config import PipelineConfig, TelegramConfig
+from ..infrastructure.xlsx_stream import StreamingExcelRendererAdapter
+from .config import AppSettings, PipelineConfig, TelegramConfig
+from .metrics import ACTIVE_SESSIONS, REGISTRY, TEMP_STORAGE_BYTES
+from .profiling import StageProfiler
+from .tracing import JsonlSpanExporter, OtlpHttpSpanExporter, SpanExporter
 from .services.conversation import ConversationService
+from .services.report_cache import ReportCache
 from .services.sessions import InMemorySessionStore
 from .usecases.pipeline import (
     BuildAudienceReportUC,
     ExtractAudienceUC,
     ParseChatExportUC,
     RunFullPipelineUC,
+    init_pipeline_worker,
 )
 from .config.settings import load_app_settings
 
 
+def _forced_format(config: PipelineConfig) -> Optional[ReportFormat]:
+    if config.report_force_csv:
+        return ReportFormat.CSV
+    if config.report_force_jsonl:
+        return ReportFormat.JSONL
+    return None
+
+
+def _build_enricher(settings: AppSettings, config: PipelineConfig) -> Optional[ProfileEnricher]:
+    """Обогащение через getChat требует токена бота; без него шаг выключен."""
+    if not config.enrichment_enabled or not settings.telegram_bot_token:
+        return None
+    # Импорт здесь: telegram-адаптер зависит от сервисов приложения, которые импортируют контейнер.
+    from ..infrastructure.telegram import TelegramAPIAdapter
+
+    return ProfileEnricher(
+        api=TelegramAPIAdapter(TelegramConfig.from_settings(settings)),
+        cache=TTLDiskCache(config.enrichment_cache_path, config.enrichment_cache_ttl_seconds),
+        limiter=bucket_for_token(settings.telegram_bot_token, config.enrichment_rate_per_second),
+        max_workers=config.enrichment_workers,
+        max_profiles=config.enrichment_max_profiles,
+    )
+
+
+def _build_metrics_server(
+    settings: AppSettings, session_store: InMemorySessionStore, temp_storage: InMemoryTempStorageAdapter
+) -> Optional[MetricsServer]:
+    """Эндпоинт метрик включается только с METRICS_PORT; датчики читают состояние при каждом запросе."""
+    if not settings.metrics_port:
+        return None
+    ACTIVE_SESSIONS.set_function(session_store.active_count)
+    TEMP_STORAGE_BYTES.set_function(temp_storage.total_bytes)
+    return MetricsServer(REGISTRY, host=settings.metrics_host, port=settings.metrics_port)
+
+
+def _build_span_exporter(settings: AppSettings) -> Optional[SpanExporter]:
+    if settings.trace_exporter == "jsonl":
+        return JsonlSpanExporter(settings.trace_jsonl_path)
+    if settings.trace_exporter == "otlp":
+        return OtlpHttpSpanExporter(settings.trace_otlp_endpoint)
+    return None
+
+
+def _build_profiler(settings: AppSettings) -> Optional[StageProfiler]:
+    return StageProfiler(settings.profile_dir) if settings.profile_dir else None
+
+
+def build_pipeline(env_file: str) -> RunFullPipelineUC:
+    """Пайплайн для процесса пула: свой контейнер, без вложенного пула."""
+    container = AppContainer()
+    container.config.env_file.from_value(env_file)
+    container.pipeline_executor.override(providers.Object(None))
+    return container.pipeline()
+
+
+def _build_pipeline_executor(config: PipelineConfig, env_file: str) -> Executor:
+    if config.pipeline_executor == "process":
+        # spawn, а не fork: в родителе уже работают потоки (eager-загрузка, экспорт спанов).
+        return ProcessPoolExecutor(
+            max_workers=config.pipeline_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_pipeline_worker,
+            initargs=(partial(build_pipeline, env_file),),
+        )
+    return ThreadPoolExecutor(max_workers=config.pipeline_workers, thread_name_prefix="pipeline")
+
+
 class AppContainer(containers.DeclarativeContainer):
     config = providers.Configuration()
     config.env_file.from_value(".env")
@@ -34,36 +117,93 @@ class AppContainer(containers.DeclarativeContainer):
     )
 
     parser_adapter = providers.Singleton(ParserAdapter)
-    extractor_adapter = providers.Singleton(ExtractionAdapter)
-    excel_renderer = providers.Singleton(ExcelRendererAdapter)
+    audience_extractor = providers.Singleton(
+        AudienceExtractor,
+        provenance_cap=pipeline_config.provided.provenance_cap,
+    )
+    extractor_adapter = providers.Singleton(ExtractionAdapter, extractor=audience_extractor)
+    excel_renderer = providers.Selector(
+        pipeline_config.provided.excel_engine,
+        openpyxl=providers.Singleton(ExcelRendererAdapter),
+        streaming=providers.Singleton(StreamingExcelRendererAdapter),
+    )
+    table_writer = providers.Singleton(TableReportWriter, compress=pipeline_config.provided.report_gzip)
     reporting_adapter = providers.Singleton(
         ReportingAdapter,
         renderer=excel_renderer,
         report_policy=report_policy,
         force_excel=pipeline_config.provided.report_force_excel,
+        table_writer=table_writer,
+        force_format=providers.Callable(_forced_format, pipeline_config),
+        packager=providers.Singleton(ReportPackager, max_file_bytes=pipeline_config.provided.report_max_file_bytes),
     )
 
     parse_uc = providers.Singleton(ParseChatExportUC, parser=parser_adapter)
     extract_uc = providers.Singleton(ExtractAudienceUC, extractor=extractor_adapter)
     report_uc = providers.Singleton(BuildAudienceReportUC, report_builder=reporting_adapter)
 
+    audience_store = providers.Singleton(
+        lambda config: SqliteAudienceStore(config.audience_store_path) if config.audience_store_path else None,
+        pipeline_config,
+    )
+
+    profile_enricher = providers.Singleton(
+        lambda settings, config: _build_enricher(settings, config),
+        settings,
+        pipeline_config,
+    )
+
+    pipeline_executor = providers.Singleton(_build_pipeline_executor, pipeline_config, config.env_file)
+
     pipeline = providers.Singleton(
         RunFullPipelineUC,
         parser_uci=parse_uc,
         extractor_uc=extract_uc,
         reporting_uc=report_uc,
         config=pipeline_config,
+        audience_store=audience_store,
+        ingestion_store=providers.Callable(
+            lambda store, config: store if config.incremental_ingestion else None,
+            audience_store,
+            pipeline_config,
+        ),
+        enricher=profile_enricher,
+        executor=pipeline_executor,
     )
 
     session_store = providers.Singleton(InMemorySessionStore)
     temp_storage = providers.Singleton(InMemoryTempStorageAdapter)
 
+    upload_executor = providers.Singleton(
+        lambda config: (
+            ThreadPoolExecutor(max_workers=config.eager_workers, thread_name_prefix="eager-upload")
+            if config.eager_processing
+            else None
+        ),
+        pipeline_config,
+    )
+
+    report_cache = providers.Singleton(
+        lambda config: (
+            ReportCache(config.report_cache_max_bytes, config.report_cache_ttl_seconds)
+            if config.report_cache_max_bytes > 0
+            else None
+        ),
+        pipeline_config,
+    )
+
     conversation_service = providers.Factory(
         ConversationService,
         session_store=session_store,
         pipeline=pipeline,
         temp_storage=temp_storage,
         config=pipeline_config,
+        executor=upload_executor,
+        report_cache=report_cache,
     )
 
     telegram_config = providers.Singleton(TelegramConfig.from_settings, settings)
+
+    metrics_server = providers.Singleton(_build_metrics_server, settings, session_store, temp_storage)
+    span_exporter = providers.Singleton(_build_span_exporter, settings)
+    profiler = providers.Singleton(_build_profiler, settings)
@@ -0,0 +1,238 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .profiling import active_profiler
+from .tracing import start_span
+
+# Границы гистограмм длительности, секунды: от разбора маленького файла до отчёта на минуту.
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> _LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: ожидались метки {self.labelnames}, получены {tuple(labels)}.")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        header = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        return header + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[_LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}" for key, value in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labelnames)
+        self._bounds = tuple(sorted(buckets))
+        # Метки → (счётчики по корзинам без накопления, сумма, количество).
+        self._values: Dict[_LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            counts, total, count = self._values.get(key) or ([0] * (len(self._bounds) + 1), 0.0, 0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value, count + 1)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip((*self._bounds, float("inf")), counts):
+                cumulative += bucket
+                labels = _format_labels(self.labelnames, key, f'le="{_format_number(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_number(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Мгновенное значение без меток; либо задаётся ``set``, либо читается функцией при выдаче."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str) -> None:
+        super().__init__(name, documentation)
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        self._function = function
+
+    def value(self) -> float:
+        return float(self._function()) if self._function is not None else self._value
+
+    def _samples(self) -> List[str]:
+        return [f"{self.name} {_format_number(self.value())}"]
+
+
+class MetricsRegistry:
+    """Метрики процесса в текстовом формате Prometheus (exposition format 0.0.4)."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._register(Gauge(name, documentation))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Метрика {metric.name} уже зарегистрирована.")
+            self._metrics[metric.name] = metric
+        return metric
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "audience_bot_stage_duration_seconds",
+    "Длительность этапа обработки (parse, extract, build, render, upload, download).",
+    ("stage", "format"),
+)
+STAGE_TOTAL = REGISTRY.counter(
+    "audience_bot_stage_total",
+    "Число выполнений этапа обработки по исходу (ok, error).",
+    ("stage", "format", "outcome"),
+)
+STAGE_BYTES = REGISTRY.counter(
+    "audience_bot_stage_bytes_total",
+    "Байты, прошедшие через этап: входные файлы, готовые отчёты, загрузки в Telegram и из него.",
+    ("stage", "format"),
+)
+ACTIVE_SESSIONS = REGISTRY.gauge("audience_bot_active_sessions", "Сессии с загруженными файлами или в обработке.")
+TEMP_STORAGE_BYTES = REGISTRY.gauge("audience_bot_temp_storage_bytes", "Байты во временном хранилище файлов.")
+
+
+def file_format(filename: str) -> str:
+    """Метка формата по имени файла: всё после первой точки (``csv.gz``, ``xlsx``, ``json``)."""
+    return filename.rpartition("/")[2].partition(".")[2].lower()
+
+
+class StageObservation:
+    """Изменяемые метки замера: формат отчёта часто известен только в конце этапа."""
+
+    __slots__ = ("format", "bytes")
+
+    def __init__(self, report_format: str) -> None:
+        self.format = report_format
+        self.bytes = 0
+
+
+@contextmanager
+def observe_stage(stage: str, report_format: str = "") -> Iterator[StageObservation]:
+    """Длительность, исход и объём этапа; исключение записывается как ``outcome="error"`` и пробрасывается.
+
+    Этап заодно — спан ``stage.<имя>`` текущей трассы и, при включённом
+    профилировании, отдельный CPU- и memory-профиль.
+    """
+    observation = StageObservation(report_format)
+    profiler = active_profiler()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        with start_span(f"stage.{stage}") as span, (
+            profiler.stage(stage) if profiler is not None else nullcontext()
+        ):
+            yield observation
+            span.set_attribute("format", observation.format)
+            span.set_attribute("bytes", observation.bytes)
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=stage, format=observation.format)
+        STAGE_TOTAL.inc(stage=stage, format=observation.format, outcome=outcome)
+        if observation.bytes:
+            STAGE_BYTES.inc(observation.bytes, stage=stage, format=observation.format)
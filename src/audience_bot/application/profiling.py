@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import cProfile
+import json
+import logging
+import pstats
+import re
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Глубина стека, которую tracemalloc хранит для аллокации: хватает, чтобы дойти до кода этапа.
+_TRACE_FRAMES = 16
+_TOP_ALLOCATIONS = 15
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+_FunctionKey = Tuple[str, int, str]
+
+
+@dataclass
+class _StageStats:
+    profiles: List[cProfile.Profile] = field(default_factory=list)
+    calls: int = 0
+    peak_bytes: int = 0
+    # Место аллокации → (байт, блоков), прирост за время этапа, суммарно по вызовам.
+    allocations: Dict[str, List[int]] = field(default_factory=dict)
+
+
+def _frame_name(key: _FunctionKey) -> str:
+    filename, line, function = key
+    if filename == "~":
+        return function
+    return f"{function} ({Path(filename).name}:{line})"
+
+
+def folded_stacks(stats: pstats.Stats, max_depth: int = 64) -> List[str]:
+    """Стеки в формате «a;b;c микросекунды» для flamegraph.pl, speedscope и inferno.
+
+    cProfile хранит только пары вызывающий → вызываемый, поэтому стеки
+    восстанавливаются обходом графа от корней; время вызываемой функции
+    делится между вызывающими пропорционально рёбрам графа.
+    """
+    entries = stats.stats  # type: ignore[attr-defined]
+    callees: Dict[_FunctionKey, List[_FunctionKey]] = {}
+    for function, (_, _, _, _, callers) in entries.items():
+        for caller in callers:
+            callees.setdefault(caller, []).append(function)
+    roots = [function for function, entry in entries.items() if not entry[4]]
+    lines: Dict[str, float] = {}
+
+    def walk(function: _FunctionKey, stack: List[str], on_stack: set, share: float) -> None:
+        _, _, own_time, total_time, _ = entries[function]
+        path = stack + [_frame_name(function)]
+        joined = ";".join(path)
+        lines[joined] = lines.get(joined, 0.0) + own_time * share
+        if len(path) >= max_depth:
+            return
+        on_stack.add(function)
+        for callee in callees.get(function, ()):
+            if callee in on_stack:
+                continue
+            edge = entries[callee][4].get(function)
+            callee_total = entries[callee][3]
+            if not edge or callee_total <= 0:
+                continue
+            # Доля времени вызываемой функции, пришедшая из этого вызывающего.
+            walk(callee, path, on_stack, share * min(edge[3] / callee_total, 1.0))
+        on_stack.discard(function)
+
+    for root in roots:
+        walk(root, [], set(), 1.0)
+    return [f"{stack} {round(seconds * 1_000_000)}" for stack, seconds in lines.items() if seconds * 1_000_000 >= 1]
+
+
+class StageProfiler:
+    """CPU-профиль (cProfile) и память (tracemalloc) отдельно по каждому этапу пайплайна.
+
+    Этапы — те же, что в метриках (``observe_stage``). Вложенный этап
+    приостанавливает профиль внешнего, поэтому время не считается дважды.
+    Профилируемые этапы разных потоков выполняются по очереди: с Python 3.12
+    одновременно может быть включён только один профилировщик, а пик
+    tracemalloc общий на процесс. Результаты копятся
+    между прогонами и записываются ``dump``: ``<этап>.pstats`` (snakeviz,
+    flameprof, ``python -m pstats``), ``<этап>.folded`` (flamegraph.pl,
+    speedscope) и ``memory.json`` с пиком и крупнейшими аллокациями этапа.
+    """
+
+    def __init__(self, output_dir: str | Path) -> None:
+        self.output_dir = Path(output_dir)
+        self._stages: Dict[str, _StageStats] = {}
+        self._lock = threading.Lock()
+        # Реентерабельная: вложенные этапы идут в том же потоке под той же блокировкой.
+        self._serial = threading.RLock()
+        self._local = threading.local()
+        self._started_tracemalloc = False
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(_TRACE_FRAMES)
+            self._started_tracemalloc = True
+
+    def stop(self) -> None:
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        with self._serial:
+            yield from self._profiled(name)
+
+    def _profiled(self, name: str) -> Iterator[None]:
+        stack: List[cProfile.Profile] = self._local.__dict__.setdefault("stack", [])
+        if stack:
+            stack[-1].disable()
+        profile = cProfile.Profile()
+        stack.append(profile)
+        tracing = tracemalloc.is_tracing()
+        before = tracemalloc.take_snapshot() if tracing else None
+        if tracing:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            stack.pop()
+            peak = tracemalloc.get_traced_memory()[1] - baseline if tracing else 0
+            after = tracemalloc.take_snapshot() if tracing else None
+            self._record(name, profile, peak, before, after)
+            if stack:
+                stack[-1].enable()
+
+    def _record(
+        self,
+        name: str,
+        profile: cProfile.Profile,
+        peak: int,
+        before: Optional[tracemalloc.Snapshot],
+        after: Optional[tracemalloc.Snapshot],
+    ) -> None:
+        growth: List[tracemalloc.StatisticDiff] = []
+        if before is not None and after is not None:
+            growth = [diff for diff in after.compare_to(before, "lineno") if diff.size_diff > 0][:_TOP_ALLOCATIONS]
+        with self._lock:
+            stats = self._stages.setdefault(name, _StageStats())
+            stats.profiles.append(profile)
+            stats.calls += 1
+            stats.peak_bytes = max(stats.peak_bytes, peak)
+            for diff in growth:
+                frame = diff.traceback[0]
+                location = f"{frame.filename}:{frame.lineno}"
+                totals = stats.allocations.setdefault(location, [0, 0])
+                totals[0] += diff.size_diff
+                totals[1] += diff.count_diff
+
+    def dump(self) -> List[Path]:
+        """Записать накопленные профили; возвращает созданные файлы."""
+        with self._lock:
+            stages = {name: (list(stats.profiles), stats.calls, stats.peak_bytes, dict(stats.allocations))
+                      for name, stats in self._stages.items()}
+        if not stages:
+            return []
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        written: List[Path] = []
+        memory = {}
+        for name, (profiles, calls, peak_bytes, allocations) in sorted(stages.items()):
+            stem = _UNSAFE_NAME.sub("_", name)
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            pstats_path = self.output_dir / f"{stem}.pstats"
+            stats.dump_stats(pstats_path)
+            folded_path = self.output_dir / f"{stem}.folded"
+            folded_path.write_text("\n".join(folded_stacks(stats)) + "\n", encoding="utf-8")
+            written += [pstats_path, folded_path]
+            top = sorted(allocations.items(), key=lambda item: item[1][0], reverse=True)[:_TOP_ALLOCATIONS]
+            memory[name] = {
+                "calls": calls,
+                "peak_bytes": peak_bytes,
+                "top_allocations": [
+                    {"location": location, "size_bytes": size, "blocks": count} for location, (size, count) in top
+                ],
+            }
+        memory_path = self.output_dir / "memory.json"
+        memory_path.write_text(json.dumps(memory, ensure_ascii=False, indent=2), encoding="utf-8")
+        written.append(memory_path)
+        logger.info("profile_written", extra={"path": str(self.output_dir), "stages": len(stages)})
+        return written
+
+
+_profiler: Optional[StageProfiler] = None
+
+
+def configure_profiling(profiler: Optional[StageProfiler]) -> None:
+    """Включить профилирование этапов (или выключить, передав None)."""
+    global _profiler
+    previous, _profiler = _profiler, profiler
+    if previous is not None and previous is not profiler:
+        previous.stop()
+    if profiler is not None:
+        profiler.start()
+
+
+def active_profiler() -> Optional[StageProfiler]:
+    return _profiler
@@ -1,17 +1,26 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import asyncio
+from concurrent.futures import Executor
+import contextvars
+from dataclasses import dataclass, field
+from functools import partial
 import io
 import logging
 import zipfile
-from typing import List, Optional
+from typing import Iterator, List, Optional, Tuple
 
+from ...domain.extraction import AudienceProfile, ProfileType
+from ...domain.messages import TimeWindow
+from ...domain.reporting import ReportFormat
 from ..config import PipelineConfig
-from ..usecases.dto import RawFileDTO
+from ..tracing import start_span, traced
+from ..usecases.dto import PartialExtractionDTO, RawFileDTO, ReportDTO
 from ..usecases.exceptions import PipelineError
 from ..usecases.files import TempFileRef
 from ..usecases.pipeline import RunFullPipelineUC
 from ..usecases.ports import ITempFileStorage
+from .report_cache import ReportCache, report_key
 from .sessions import ISessionStore, SessionRecord, SessionState
 
 
@@ -27,23 +36,32 @@ HELP_TEXT = (
     "/start – приветствие.\n"
     "/help или ? – справка по форматам и лимитам.\n"
     "/reset – очистить текущую сессию.\n"
-    "/process [chat|file] – построить отчёт (текст или Excel); опционально указать формат доставки.\n\n"
+    "/process [chat|file] [csv|jsonl] [период] – построить отчёт (текст или Excel); опционально указать формат "
+    "доставки, выгрузку CSV/JSON Lines для обработки программами и период: 30d (последние 30 дней), 2025-01-01..2025-03-31, 2025-01-01.. или ..2025-03-31.\n"
+    "/process compare – сравнить аудитории нескольких чатов (пересечения — дополнительные листы Excel).\n"
+    "/find <префикс> – найти профили последнего отчёта по началу username или имени.\n"
+    "/who <id|@username> – показать профиль последнего отчёта и сообщения, из которых он получен.\n\n"
     "Сессия: корзина ваших загрузок до вызова /process или /reset; хранится до {ttl_min} минут.\n"
     "Лимиты на одну сессию: до {max_files} файлов, каждый ≤ {max_mb} МБ. "
     "Формат отчёта: текст, если участников ≤ {plain_threshold}; иначе Excel."
     "\nФормат данных: JSON — предпочтителен (есть user_id, точная дедупликация). "
-    "HTML — поддерживается, но беден данными (только отображаемые имена), возможны дубли. "
-    "Рекомендуем присылать JSON и не смешивать форматы данных в одной сессии (не загружайте одновременно JSON и HTML одного и того же чата)."
+    "HTML — поддерживается, но беден данными (только отображаемые имена). "
+    "Файлы JSON и HTML можно загружать в одну сессию: профили сопоставляются по id, username и имени, "
+    "если они встречаются вместе хотя бы в одном сообщении."
 )
 RESET_TEXT = "Сессия очищена, можете загрузить новые файлы истории чата."
 NO_FILES_TEXT = "Файлы истории чата не загружены. Отправьте данные, прежде чем вызывать /process."
 PROCESSING_ERROR_TEXT = "Не удалось обработать файлы истории чата. Попробуй позже."
 SESSION_LIMIT_TEXT = "Достигнут лимит файлов. Удали старые и попробуй снова."
 SIZE_LIMIT_TEXT = "Файл превышает максимальный допустимый размер."
-MIXED_FORMAT_TEXT = (
-    "В одной сессии нельзя смешивать разные форматы данных (JSON и HTML). "
-    "Заверши обработку /process или сбрось сессию /reset, затем загружай файлы одного формата данных."
-)
+NO_AUDIENCE_TEXT = "Нет готового отчёта. Загрузите файлы и вызовите /process, затем повторите запрос."
+FIND_LIMIT = 20
+_CATEGORY_TITLES = {
+    ProfileType.PARTICIPANT: "участник",
+    ProfileType.MENTIONED_ONLY: "упомянут",
+    ProfileType.CHANNEL: "канал",
+    ProfileType.BOT: "бот",
+}
 
 
 @dataclass
@@ -52,6 +70,10 @@ class BotResponse:
     file_bytes: Optional[bytes] = None
     filename: Optional[str] = None
     is_error: bool = False
+    # Следующие вложения (имя, байты), если отчёт разбит на несколько файлов.
+    extra_files: List[Tuple[str, bytes]] = field(default_factory=list)
+    # Текст страницами, если он длиннее одного сообщения; отправляются вместо ``text``.
+    pages: Optional[Iterator[str]] = None
 
 
 class ConversationService:
@@ -61,11 +83,15 @@ class ConversationService:
         pipeline: RunFullPipelineUC,
         temp_storage: ITempFileStorage,
         config: PipelineConfig,
+        executor: Optional[Executor] = None,
+        report_cache: Optional[ReportCache] = None,
     ):
         self._sessions = session_store
         self._pipeline = pipeline
         self._storage = temp_storage
         self._config = config
+        self._executor = executor
+        self._report_cache = report_cache
 
     def start(self, user_id: str) -> BotResponse:
         self._sessions.clear(user_id)
@@ -93,6 +119,7 @@ class ConversationService:
         )
         return BotResponse(text=message)
 
+    @traced("conversation.upload_file")
     def upload_file(self, user_id: str, raw_file: RawFileDTO) -> BotResponse:
         record = self._sessions.get(user_id)
         if len(record.files) >= self._config.max_files:
@@ -115,20 +142,12 @@ class ConversationService:
                 text="Формат файла не похож на файл истории Telegram-чата (JSON/HTML). Проверьте данные и попробуйте снова.",
                 is_error=True,
             )
-        if record.export_format and record.export_format != detected_format:
-            logger.info(
-                "upload_rejected_format_mixed",
-                extra={
-                    "user_id": user_id,
-                    "expected_format": record.export_format,
-                    "got_format": detected_format,
-                    "file_name": raw_file.filename,
-                },
-            )
-            return BotResponse(text=MIXED_FORMAT_TEXT, is_error=True)
-
         temp_ref = self._storage.save(raw_file.filename, raw_file.content, raw_file.mime_type)
         record.add_file(temp_ref)
+        if self._executor is not None:
+            # Контекст копируется, чтобы фоновая подготовка попала в трассу загрузки.
+            context = contextvars.copy_context()
+            record.add_partial(temp_ref, self._executor.submit(context.run, self._pipeline.prepare, raw_file, user_id))
         record.export_format = record.export_format or detected_format
         record.state = SessionState.COLLECTING
         self._sessions.save(record)
@@ -138,21 +157,128 @@ class ConversationService:
         )
         return BotResponse(text=f"Файл '{raw_file.filename}' загружен ({len(record.files)}).")
 
-    def process(self, user_id: str, chat_name: Optional[str], target: str = "auto") -> BotResponse:
+    @traced("conversation.process")
+    def process(
+        self,
+        user_id: str,
+        chat_name: Optional[str],
+        target: str = "auto",
+        window: Optional[TimeWindow] = None,
+        compare: bool = False,
+        report_format: Optional[ReportFormat] = None,
+    ) -> BotResponse:
         record = self._sessions.get(user_id)
         if not record.files:
             return BotResponse(text=NO_FILES_TEXT, is_error=True)
-        raw_files = self._build_raw_files(record.files)
         try:
-            report = self._pipeline.execute(raw_files, chat_name=chat_name, user_id=user_id)
+            key = self._report_key(record, chat_name, window, compare, report_format)
+            run = partial(self._run_pipeline, record, chat_name, window, compare, report_format)
+            report = run() if key is None else self._report_cache.get_or_compute(key, run)
         except PipelineError as exc:
-            logger.warning(
-                "process_failed",
-                extra={"user_id": user_id, "chat_name": chat_name, "error": str(exc)},
-            )
-            return BotResponse(text=str(exc) or PROCESSING_ERROR_TEXT, is_error=True)
+            return self._failed(user_id, chat_name, exc)
         finally:
             self._cleanup_session(record)
+        return self._respond(record, report, target)
+
+    async def process_async(
+        self,
+        user_id: str,
+        chat_name: Optional[str],
+        target: str = "auto",
+        window: Optional[TimeWindow] = None,
+        compare: bool = False,
+        report_format: Optional[ReportFormat] = None,
+    ) -> BotResponse:
+        """``process`` для асинхронного фронтенда: этапы — в пуле пайплайна, блокирующие шаги — в потоках.
+
+        Отмена задачи прерывает обработку на границе этапов; сессия очищается так же, как после отчёта.
+        """
+        with start_span("conversation.process_async"):
+            record = self._sessions.get(user_id)
+            if not record.files:
+                return BotResponse(text=NO_FILES_TEXT, is_error=True)
+            try:
+                key = self._report_key(record, chat_name, window, compare, report_format)
+                run = partial(self._run_pipeline_async, record, chat_name, window, compare, report_format)
+                report = await (run() if key is None else self._report_cache.get_or_compute_async(key, run))
+            except PipelineError as exc:
+                return self._failed(user_id, chat_name, exc)
+            finally:
+                self._cleanup_session(record)
+            # Вложения CSV/JSONL рендерятся при сборке ответа — тоже не в цикле событий.
+            return await asyncio.to_thread(self._respond, record, report, target)
+
+    def _run_pipeline(
+        self,
+        record: SessionRecord,
+        chat_name: Optional[str],
+        window: Optional[TimeWindow],
+        compare: bool,
+        report_format: Optional[ReportFormat],
+    ) -> ReportDTO:
+        user_id = record.user_id
+        if compare:
+            raw_files = self._build_raw_files(record.files)
+            return self._pipeline.execute_overlap(
+                raw_files, chat_name=chat_name, user_id=user_id, window=window, report_format=report_format
+            )
+        partials = self._collect_partials(record) if self._uses_partials(window, compare) else None
+        if partials is not None:
+            return self._pipeline.execute_prepared(
+                partials, chat_name=chat_name, user_id=user_id, report_format=report_format
+            )
+        raw_files = self._build_raw_files(record.files)
+        return self._pipeline.execute(
+            raw_files, chat_name=chat_name, user_id=user_id, window=window, report_format=report_format
+        )
+
+    async def _run_pipeline_async(
+        self,
+        record: SessionRecord,
+        chat_name: Optional[str],
+        window: Optional[TimeWindow],
+        compare: bool,
+        report_format: Optional[ReportFormat],
+    ) -> ReportDTO:
+        user_id = record.user_id
+        if compare:
+            raw_files = self._build_raw_files(record.files)
+            return await self._pipeline.execute_overlap_async(
+                raw_files, chat_name=chat_name, user_id=user_id, window=window, report_format=report_format
+            )
+        # Ожидание фоновой подготовки файлов блокирует — выносим его из цикла событий.
+        partials = None
+        if self._uses_partials(window, compare):
+            partials = await asyncio.to_thread(self._collect_partials, record)
+        if partials is not None:
+            return await self._pipeline.execute_prepared_async(
+                partials, chat_name=chat_name, user_id=user_id, report_format=report_format
+            )
+        raw_files = self._build_raw_files(record.files)
+        return await self._pipeline.execute_async(
+            raw_files, chat_name=chat_name, user_id=user_id, window=window, report_format=report_format
+        )
+
+    @staticmethod
+    def _failed(user_id: str, chat_name: Optional[str], exc: PipelineError) -> BotResponse:
+        logger.warning(
+            "process_failed",
+            extra={"user_id": user_id, "chat_name": chat_name, "error": str(exc)},
+        )
+        return BotResponse(text=str(exc) or PROCESSING_ERROR_TEXT, is_error=True)
+
+    def _respond(self, record: SessionRecord, report: ReportDTO, target: str) -> BotResponse:
+        record.remember_audience(report.audience)
+        self._sessions.save(record)
+
+        if report.format in (ReportFormat.CSV, ReportFormat.JSONL, ReportFormat.CSV_ZIP, ReportFormat.SQLITE):
+            text = report.note or f"Отчёт готов ({report.format.value.upper()}). Смотри вложение."
+            return BotResponse(
+                text=text,
+                file_bytes=report.file_bytes(),
+                filename=report.filename,
+                extra_files=[(part.filename or "audience-report.zip", part.file_bytes()) for part in report.parts],
+            )
 
         if target == "chat" and report.format.value == "excel":
             note = "Слишком много участников для текста. Отправляем файл."
@@ -169,13 +295,110 @@ class ConversationService:
                     file_bytes=None,
                     is_error=False,
                 )
-            return BotResponse(text=report.text or "Отчёт пуст.", is_error=False)
+            pages = report.iter_pages() if report.pages is not None else None
+            return BotResponse(text=report.text or "Отчёт пуст.", pages=pages, is_error=False)
         return BotResponse(
             text="Отчёт готов. Смотри вложение.",
             file_bytes=report.excel_bytes,
             filename="audience-report.xlsx",
         )
 
+    def find(self, user_id: str, prefix: str) -> BotResponse:
+        index = self._sessions.get(user_id).audience_index()
+        if index is None:
+            return BotResponse(text=NO_AUDIENCE_TEXT, is_error=True)
+        if not prefix.strip():
+            return BotResponse(text="Укажите начало username или имени: /find ali", is_error=True)
+        found = index.find(prefix, limit=FIND_LIMIT + 1)
+        if not found:
+            return BotResponse(text=f"Профилей на «{prefix}» не найдено.")
+        lines = [self._format_profile(category, profile) for category, profile in found[:FIND_LIMIT]]
+        if len(found) > FIND_LIMIT:
+            lines.append(f"Показаны первые {FIND_LIMIT}; уточните запрос.")
+        return BotResponse(text="\n".join(lines))
+
+    def who(self, user_id: str, query: str) -> BotResponse:
+        index = self._sessions.get(user_id).audience_index()
+        if index is None:
+            return BotResponse(text=NO_AUDIENCE_TEXT, is_error=True)
+        query = query.strip()
+        if query.isdigit():
+            entry = index.by_user_id(int(query))
+        else:
+            entry = index.by_username(query) if query else None
+        if entry is None:
+            return BotResponse(text=f"Профиль «{query}» не найден в последнем отчёте.")
+        category, profile = entry
+        lines = [self._format_profile(category, profile)]
+        if profile.profile_id.user_id is not None:
+            lines.append(f"user_id: {profile.profile_id.user_id}")
+        if index.provenance is not None:
+            explanation = index.provenance.describe(profile.profile_id)
+            if explanation:
+                lines.append(f"Основание: {explanation}")
+        return BotResponse(text="\n".join(lines))
+
+    @staticmethod
+    def _format_profile(category: ProfileType, profile: AudienceProfile) -> str:
+        title = profile.display_name or "—"
+        if profile.username:
+            title = f"@{profile.username.lstrip('@')} — {title}"
+        return f"{title} ({_CATEGORY_TITLES.get(category, category.value)})"
+
+    def _report_key(
+        self,
+        record: SessionRecord,
+        chat_name: Optional[str],
+        window: Optional[TimeWindow],
+        compare: bool,
+        report_format: Optional[ReportFormat],
+    ) -> Optional[str]:
+        """Ключ кэша отчётов; None — кэш выключен, у файла нет хэша содержимого или ведётся история аудиторий.
+
+        С хранилищем аудиторий отчёт зависит не только от файлов: лист «Изменения»
+        и накопленная аудитория меняются после каждого прогона и принадлежат загрузившему.
+        """
+        hashes = [ref.content_hash for ref in record.files]
+        config = self._config
+        if self._report_cache is None or config.audience_store_path or None in hashes:
+            return None
+        return report_key(
+            hashes,
+            chat_name,
+            window,
+            compare,
+            report_format,
+            config.report_text_threshold,
+            config.report_force_excel,
+            config.report_force_csv,
+            config.report_force_jsonl,
+            config.report_gzip,
+            config.excel_engine,
+        )
+
+    @staticmethod
+    def _uses_partials(window: Optional[TimeWindow], compare: bool) -> bool:
+        """Фоновые результаты покрывают весь экспорт: срез по периоду и сравнение чатов разбирают файлы заново."""
+        return window is None and not compare
+
+    def _collect_partials(self, record: SessionRecord) -> Optional[List[PartialExtractionDTO]]:
+        """Готовые фоновые результаты по всем файлам сессии или None, если нужен полный прогон.
+
+        Ошибки пайплайна из фоновой задачи пробрасываются как есть: полный прогон упал бы так же.
+        """
+        if self._executor is None or any(ref.id not in record.partials for ref in record.files):
+            return None
+        partials: List[PartialExtractionDTO] = []
+        for ref in record.files:
+            try:
+                partials.append(record.partials[ref.id].result(timeout=self._config.max_processing_seconds))
+            except PipelineError:
+                raise
+            except Exception:
+                logger.warning("eager_partial_unavailable", extra={"user_id": record.user_id, "file_id": ref.id})
+                return None
+        return partials
+
     def _build_raw_files(self, refs: List[TempFileRef]) -> List[RawFileDTO]:
         files: List[RawFileDTO] = []
         for ref in refs:
@@ -194,7 +417,7 @@ class ConversationService:
     def _detect_export_format(content: bytes) -> Optional[str]:
         """Грубое определение формата данных по содержимому файла.
 
-        Используется только для UX-ограничения: не смешивать HTML и JSON в одной сессии.
+        Используется для отсева файлов, не похожих на экспорт Telegram-чата.
         Возвращает один из логических классов формата:
         - \"structured\" — JSON или ZIP с экспортом внутри;
         - \"html\" — HTML-экспорт;
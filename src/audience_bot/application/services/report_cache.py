@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from ..usecases.dto import ReportDTO
+from ..usecases.exceptions import PipelineCancelledError
+
+logger = logging.getLogger(__name__)
+
+# Грубая оценка памяти на профиль результата, который кэш держит ради /find и /who.
+_PROFILE_BYTES = 256
+
+
+def report_key(content_hashes: Iterable[str], *settings: object) -> str:
+    """Ключ отчёта: отсортированные хэши файлов (порядок загрузки не важен) и параметры отчёта."""
+    digest = hashlib.sha256()
+    for content_hash in sorted(content_hashes):
+        digest.update(content_hash.encode("ascii"))
+        digest.update(b"\0")
+    digest.update(repr(settings).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ReportCache:
+    """Готовые отчёты по одинаковым наборам файлов: LRU с бюджетом в байтах и TTL.
+
+    Одинаковые запросы, пришедшие одновременно, не считаются параллельно:
+    первый запускает вычисление, остальные ждут его Future («single-flight»).
+    Ошибки не кэшируются — их получают все ожидающие этого прогона.
+    """
+
+    def __init__(self, max_bytes: int, ttl_seconds: float) -> None:
+        self._max_bytes = max_bytes
+        self._ttl = ttl_seconds
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, int, ReportDTO]]" = OrderedDict()
+        self._in_flight: Dict[str, "Future[ReportDTO]"] = {}
+        self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def get_or_compute(self, key: str, compute: Callable[[], ReportDTO]) -> ReportDTO:
+        cached, pending, owner = self._claim(key)
+        if cached is not None:
+            return cached
+        if not owner:
+            logger.info("report_cache_wait", extra={"key": key[:12]})
+            return pending.result()
+
+        try:
+            report, size = self._freeze(compute())
+        except BaseException as exc:
+            self._abandon(key, pending, exc)
+            raise
+        return self._complete(key, pending, report, size)
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Awaitable[ReportDTO]]) -> ReportDTO:
+        """То же для async API: ожидание чужого прогона и рендер для кэша не блокируют цикл событий."""
+        cached, pending, owner = self._claim(key)
+        if cached is not None:
+            return cached
+        if not owner:
+            logger.info("report_cache_wait", extra={"key": key[:12]})
+            # shield: отмена одного ожидающего не должна отменять общий Future.
+            return await asyncio.shield(asyncio.wrap_future(pending))
+
+        try:
+            report, size = await asyncio.to_thread(self._freeze, await compute())
+        except asyncio.CancelledError:
+            # Остальным ожидающим — обычная ошибка пайплайна, а не отмена чужой задачи.
+            self._abandon(key, pending, PipelineCancelledError("Обработка отменена."))
+            raise
+        except BaseException as exc:
+            self._abandon(key, pending, exc)
+            raise
+        return self._complete(key, pending, report, size)
+
+    def _claim(self, key: str) -> Tuple[Optional[ReportDTO], Optional["Future[ReportDTO]"], bool]:
+        """Готовый отчёт, либо Future прогона и признак, что считать его этому вызову."""
+        with self._lock:
+            cached = self._lookup(key)
+            if cached is not None:
+                logger.info("report_cache_hit", extra={"key": key[:12]})
+                return cached, None, False
+            pending = self._in_flight.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._in_flight[key] = Future()
+        return None, pending, owner
+
+    def _abandon(self, key: str, pending: "Future[ReportDTO]", exc: BaseException) -> None:
+        with self._lock:
+            del self._in_flight[key]
+        pending.set_exception(exc)
+
+    def _complete(self, key: str, pending: "Future[ReportDTO]", report: ReportDTO, size: int) -> ReportDTO:
+        with self._lock:
+            del self._in_flight[key]
+            self._store(key, report, size)
+        pending.set_result(report)
+        return report
+
+    def _lookup(self, key: str) -> Optional[ReportDTO]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, report = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return report
+
+    def _store(self, key: str, report: ReportDTO, size: int) -> None:
+        if size > self._max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self._ttl, size, report)
+        self._bytes += size
+        while self._bytes > self._max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+
+    @staticmethod
+    def _freeze(report: ReportDTO) -> Tuple[ReportDTO, int]:
+        """Отчёт, который можно отдавать повторно, и его оценка в байтах.
+
+        Потоковые выгрузки рендерятся один раз: повторная отдача — копия байтов,
+        а не новый проход по листам.
+        """
+        report = report.detached()
+        return report, ReportCache._size(report)
+
+    @staticmethod
+    def _size(report: ReportDTO) -> int:
+        size = len(report.text.encode("utf-8")) if report.text else 0
+        size += len(report.excel_bytes or b"")
+        if report.writer is not None:
+            size += len(report.file_bytes())
+        if report.pages is not None:
+            size += sum(len(page.encode("utf-8")) for page in report.pages())
+        size += sum(ReportCache._size(part) for part in report.parts)
+        if report.audience is not None:
+            size += report.audience.profile_count() * _PROFILE_BYTES
+        return size
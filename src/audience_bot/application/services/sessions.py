@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+from concurrent.futures import Future
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from enum import Enum
 from typing import Dict, List, Optional
 
+from ...domain.extraction import AudienceIndex, ExtractionResult
+from ..usecases.dto import PartialExtractionDTO
 from ..usecases.files import TempFileRef
 from ..usecases.ports import ISessionStore
 
@@ -22,6 +25,11 @@ class SessionRecord:
     files: List[TempFileRef] = field(default_factory=list)
     state: SessionState = SessionState.EMPTY
     export_format: Optional[str] = None
+    # Фоновые разбор и извлечение по каждому файлу, ключ — TempFileRef.id.
+    partials: Dict[str, "Future[PartialExtractionDTO]"] = field(default_factory=dict)
+    # Результат последнего /process — для /find и /who; индекс строится при первом запросе.
+    audience: Optional[ExtractionResult] = None
+    _audience_index: Optional[AudienceIndex] = field(default=None, repr=False)
     created_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -29,10 +37,26 @@ class SessionRecord:
         self.files.append(temp_file)
         self.updated_at = datetime.now(timezone.utc)
 
+    def add_partial(self, temp_file: TempFileRef, partial: "Future[PartialExtractionDTO]") -> None:
+        self.partials[temp_file.id] = partial
+
+    def remember_audience(self, audience: Optional[ExtractionResult]) -> None:
+        self.audience = audience
+        self._audience_index = None
+
+    def audience_index(self) -> Optional[AudienceIndex]:
+        if self._audience_index is None and self.audience is not None:
+            self._audience_index = AudienceIndex.build(self.audience)
+        return self._audience_index
+
     def clear(self) -> None:
+        for partial in self.partials.values():
+            partial.cancel()
+        self.partials.clear()
         self.files.clear()
         self.state = SessionState.EMPTY
         self.export_format = None
+        self.remember_audience(None)
         self.updated_at = datetime.now(timezone.utc)
 
 
@@ -47,6 +71,10 @@ class InMemorySessionStore(ISessionStore):
             self._store[user_id] = record
         return record
 
+    def active_count(self) -> int:
+        """Сессии с загруженными файлами или в обработке — для метрик."""
+        return sum(1 for record in list(self._store.values()) if record.files or record.state != SessionState.EMPTY)
+
     def save(self, session: SessionRecord) -> None:
         session.updated_at = datetime.now(timezone.utc)
         self._store[session.user_id] = session
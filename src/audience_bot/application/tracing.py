@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import wraps
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, TypeVar
+
+logger = logging.getLogger(__name__)
+
+_F = TypeVar("_F", bound=Callable[..., Any])
+
+
+@dataclass
+class Span:
+    """Интервал работы внутри обработки одного апдейта; ``trace_id`` — сквозной id корреляции."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    status: str = "ok"
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "duration_ms": round((self.end_ns - self.start_ns) / 1e6, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class _NoopSpan:
+    """Заглушка при выключенной трассировке: без аллокаций и системных часов."""
+
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None:
+        ...
+
+    def shutdown(self) -> None:
+        ...
+
+
+class JsonlSpanExporter:
+    """По строке JSON на завершённый спан; водопад апдейта собирается по ``trace_id``."""
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = Path(path)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._stream = open(self._path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            self._stream.write(line)
+            self._stream.flush()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._stream.close()
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span], service_name: str = "audience-bot") -> Dict[str, Any]:
+    """Тело запроса OTLP/HTTP JSON (``/v1/traces``) для пачки спанов."""
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "audience_bot"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                **({"parentSpanId": span.parent_id} if span.parent_id else {}),
+                                "name": span.name,
+                                "kind": 1,
+                                "startTimeUnixNano": str(span.start_ns),
+                                "endTimeUnixNano": str(span.end_ns),
+                                "attributes": [
+                                    {"key": key, "value": _otlp_value(value)} for key, value in span.attributes.items()
+                                ],
+                                "status": {"code": 2 if span.status == "error" else 1},
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class OtlpHttpSpanExporter:
+    """Отправка в OTLP-коллектор (HTTP/JSON) пачками из фонового потока — обработку апдейта не задерживает.
+
+    Очередь ограничена: если коллектор недоступен, лишние спаны отбрасываются.
+    """
+
+    def __init__(self, endpoint: str, batch_size: int = 256, flush_seconds: float = 1.0, timeout: float = 5.0) -> None:
+        self._endpoint = endpoint
+        self._batch_size = batch_size
+        self._flush_seconds = flush_seconds
+        self._timeout = timeout
+        self._queue: "queue.Queue[Optional[Span]]" = queue.Queue(maxsize=batch_size * 16)
+        self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            logger.warning("trace_span_dropped", extra={"span": span.name})
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=self._timeout + self._flush_seconds)
+
+    def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: List[Span] = []
+            deadline = time.monotonic() + self._flush_seconds
+            while len(batch) < self._batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            if batch:
+                self._post(batch)
+
+    def _post(self, batch: List[Span]) -> None:
+        body = json.dumps(otlp_payload(batch), default=str).encode("utf-8")
+        request = urllib.request.Request(self._endpoint, data=body, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(request, timeout=self._timeout) as response:
+                response.read()
+        except Exception:
+            logger.warning("trace_export_failed", extra={"endpoint": self._endpoint, "spans": len(batch)})
+
+
+_exporter: Optional[SpanExporter] = None
+_current: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("audience_bot_span", default=None)
+
+
+def configure_tracing(exporter: Optional[SpanExporter]) -> None:
+    """Включить (или выключить, передав None) запись спанов; вызывается один раз при старте."""
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    if previous is not None and previous is not exporter:
+        previous.shutdown()
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current.get()
+    return span.trace_id if span is not None else None
+
+
+@contextmanager
+def start_span(name: str, **attributes: Any) -> Iterator[Any]:
+    """Дочерний спан текущего, а без него — корень новой трассы.
+
+    При выключенной трассировке отдаёт заглушку и ничего не записывает.
+    """
+    exporter = _exporter
+    if exporter is None:
+        yield _NOOP_SPAN
+        return
+    parent = _current.get()
+    span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else os.urandom(16).hex(),
+        span_id=os.urandom(8).hex(),
+        parent_id=parent.span_id if parent is not None else None,
+        start_ns=time.time_ns(),
+        attributes=dict(attributes),
+    )
+    token = _current.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.status = "error"
+        span.set_attribute("error", type(exc).__name__)
+        raise
+    finally:
+        _current.reset(token)
+        span.end_ns = time.time_ns()
+        try:
+            exporter.export(span)
+        except Exception:
+            logger.warning("trace_export_failed", extra={"span": name}, exc_info=True)
+
+
+def traced(name: str) -> Callable[[_F], _F]:
+    """Вызов функции — спан ``name``; при выключенной трассировке — прямой вызов."""
+
+    def decorate(function: _F) -> _F:
+        @wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if _exporter is None:
+                return function(*args, **kwargs)
+            with start_span(name):
+                return function(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
@@ -1,12 +1,15 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import io
+from dataclasses import dataclass, field, replace
 from datetime import datetime
-from typing import List, Optional
+from functools import partial
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
 
-from audience_bot.domain.extraction import ExtractionResult
-from audience_bot.domain.messages import ChatMessage
-from audience_bot.domain.reporting import ReportFormat
+from audience_bot.domain.extraction import AudienceOverlap, ExtractionResult
+from audience_bot.domain.extraction.delta import AudienceDelta
+from audience_bot.domain.messages import ChatMessage, Watermark
+from audience_bot.domain.reporting import ReportFormat, paginate
 
 
 @dataclass
@@ -20,17 +23,68 @@ class RawFileDTO:
 @dataclass
 class ParsedMessagesDTO:
     messages: List[ChatMessage]
+    chat_name: Optional[str] = None
+    # (id чата из экспорта или None, число сообщений) по файлам — в порядке messages.
+    chats: List[Tuple[Optional[str], int]] = field(default_factory=list)
+
+    @property
+    def chat_id(self) -> Optional[str]:
+        """Id чата, если все файлы — экспорты одного чата с известным id."""
+        ids = {chat_id for chat_id, _ in self.chats}
+        return ids.pop() if len(ids) == 1 else None
+
+    def by_chat(self) -> Dict[Optional[str], List[ChatMessage]]:
+        """Сообщения по id чата экспорта; чаты без новых сообщений тоже попадают — с пустым списком."""
+        groups: Dict[Optional[str], List[ChatMessage]] = {}
+        offset = 0
+        for chat_id, count in self.chats:
+            groups.setdefault(chat_id, []).extend(self.messages[offset : offset + count])
+            offset += count
+        if offset < len(self.messages):
+            groups.setdefault(None, []).extend(self.messages[offset:])
+        return groups
 
 
 @dataclass
 class ExtractionResultDTO:
     result: ExtractionResult
+    overlap: Optional[AudienceOverlap] = None
+    delta: Optional[AudienceDelta] = None
+
+
+@dataclass
+class ChatTailDTO:
+    """Новые сообщения одного чата экспорта: извлечение и граница только по ним."""
+
+    # None — id чата нет (HTML) или накопленная аудитория не ведётся: хвост не сохраняется.
+    chat_id: Optional[str]
+    # None — все сообщения чата уже учтены в накопленной аудитории.
+    extraction: Optional[ExtractionResultDTO]
+    watermark: Watermark = field(default_factory=Watermark)
+    message_count: int = 0
+
+
+@dataclass
+class PartialExtractionDTO:
+    """Результат разбора и извлечения одного файла, подготовленный заранее (при загрузке)."""
+
+    tails: List[ChatTailDTO]
+    message_count: int
+    total_bytes: int
+    chat_name: Optional[str] = None
+    chat_id: Optional[str] = None
 
 
 @dataclass
 class ReportMetadataDTO:
     export_time: datetime
     chat_name: Optional[str]
+    # Формат, запрошенный пользователем (/process csv, --format); None — по настройкам и порогу.
+    requested_format: Optional[ReportFormat] = None
+
+
+def _replay(data: bytes, sink: BinaryIO) -> None:
+    sink.write(data)
 
 
 @dataclass
@@ -38,3 +92,50 @@ class ReportDTO:
     format: ReportFormat
     text: Optional[str] = None
     excel_bytes: Optional[bytes] = None
+    # Итоговый результат извлечения: сессия сохраняет его для /find и /who.
+    audience: Optional[ExtractionResult] = None
+    # CSV/JSONL не рендерятся заранее: writer пишет отчёт прямо в приёмник.
+    writer: Optional[Callable[[BinaryIO], None]] = None
+    filename: Optional[str] = None
+    # Следующие файлы отчёта, если он не помещается в один файл отправки.
+    parts: List["ReportDTO"] = field(default_factory=list)
+    note: Optional[str] = None
+    # Текстовый отчёт страницами по размеру сообщения; каждый вызов — новый генератор.
+    pages: Optional[Callable[[], Iterator[str]]] = None
+
+    def iter_pages(self) -> Iterator[str]:
+        if self.pages is not None:
+            return self.pages()
+        return paginate([self.text]) if self.text else iter(())
+
+    def full_text(self) -> Optional[str]:
+        """Текст отчёта одной строкой — для консоли и тестов."""
+        if self.pages is None:
+            return self.text
+        return "\n".join(self.pages())
+
+    def write_to(self, sink: BinaryIO) -> None:
+        if self.writer is not None:
+            self.writer(sink)
+        elif self.excel_bytes is not None:
+            sink.write(self.excel_bytes)
+
+    def file_bytes(self) -> bytes:
+        """Файл отчёта целиком — для отправки вложением."""
+        buffer = io.BytesIO()
+        self.write_to(buffer)
+        return buffer.getvalue()
+
+    def detached(self) -> "ReportDTO":
+        """Копия без ленивых источников: файлы отрендерены, страницы собраны.
+
+        Такой отчёт можно отдавать повторно и передавать в другой процесс.
+        """
+        report = self
+        if report.writer is not None:
+            report = replace(report, writer=partial(_replay, report.file_bytes()))
+        if report.pages is not None:
+            report = replace(report, pages=partial(iter, tuple(report.pages())))
+        if report.parts:
+            report = replace(report, parts=[part.detached() for part in report.parts])
+        return report
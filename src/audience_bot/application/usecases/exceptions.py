@@ -4,3 +4,7 @@ class PipelineError(Exception):
 
 class InvalidInputError(PipelineError):
     pass
+
+
+class PipelineCancelledError(PipelineError):
+    """Обработка отменена вызывающим (async API) до завершения."""
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import hashlib
 import uuid
 from dataclasses import dataclass
 from datetime import datetime, timezone
@@ -11,6 +12,10 @@ def _now() -> datetime:
     return datetime.now(timezone.utc)
 
 
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
 @dataclass(frozen=True)
 class TempFileRef:
     id: str
@@ -19,9 +24,18 @@ class TempFileRef:
     size_bytes: int
     mime_type: Optional[str]
     created_at: datetime
+    # SHA-256 содержимого: одинаковые файлы разных сессий дают один ключ кэша отчётов.
+    content_hash: Optional[str] = None
 
     @classmethod
-    def create(cls, path: Path, filename: str, mime_type: Optional[str], size_bytes: int) -> "TempFileRef":
+    def create(
+        cls,
+        path: Path,
+        filename: str,
+        mime_type: Optional[str],
+        size_bytes: int,
+        content_hash: Optional[str] = None,
+    ) -> "TempFileRef":
         return cls(
             id=uuid.uuid4().hex,
             path=path,
@@ -29,4 +43,5 @@ class TempFileRef:
             size_bytes=size_bytes,
             mime_type=mime_type,
             created_at=_now(),
+            content_hash=content_hash,
         )
@@ -1,29 +1,101 @@
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import Executor, ProcessPoolExecutor
+import contextvars
+from dataclasses import dataclass
 from datetime import datetime, timezone
+from functools import partial
+import multiprocessing
+import threading
 import time
 import logging
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from ...domain.extraction import AudienceOverlap
+from ...domain.extraction.ingestion import IngestionState
+from ...domain.messages import ChatMessage, TimeWindow, Watermark, WatermarkLookup, message_number
+from ...domain.reporting import ReportFormat
+from ..metrics import file_format, observe_stage
+from ..tracing import traced
 from .dto import (
+    ChatTailDTO,
     ExtractionResultDTO,
     ParsedMessagesDTO,
+    PartialExtractionDTO,
     RawFileDTO,
     ReportDTO,
     ReportMetadataDTO,
 )
-from .exceptions import InvalidInputError, PipelineError
-from .ports import IExtractor, IParser, IReportBuilder
+from .exceptions import InvalidInputError, PipelineCancelledError, PipelineError
+from .ports import IAudienceStore, IExtractor, IIngestionStore, IParser, IProfileEnricher, IReportBuilder
+
+
+def _input_format(files: List[RawFileDTO]) -> str:
+    """Метка формата входа для метрик: расширение файлов или ``mixed``."""
+    formats = {file_format(getattr(file, "filename", "") or "") for file in files}
+    return formats.pop() if len(formats) == 1 else "mixed"
+
+
+def _store_key(user_id: str, chat_id: str) -> str:
+    """Ключ чата в хранилищах: id чата из экспорта и загрузивший пользователь.
+
+    Названия чатов («Чат», «Family») совпадают у разных людей, а сохранённая
+    аудитория одного пользователя не должна попадать в отчёты другого.
+    """
+    return f"{user_id}:{chat_id}"
+
+
+# Событие отмены async-вызова, в котором выполняется текущий этап (threading.Event или прокси менеджера).
+_cancel_event: "contextvars.ContextVar[Optional[Any]]" = contextvars.ContextVar("audience_bot_cancel", default=None)
+
+
+def _check_cancelled() -> None:
+    """Точка отмены на границе этапов: брошенный async-вызов не доделывает работу."""
+    event = _cancel_event.get()
+    if event is not None and event.is_set():
+        raise PipelineCancelledError("Обработка отменена.")
+
+
+def _run_cancellable(event: Any, function: Callable[..., ReportDTO], args: tuple, kwargs: dict) -> ReportDTO:
+    _cancel_event.set(event)
+    return function(*args, **kwargs)
+
+
+_worker_pipeline: Optional["RunFullPipelineUC"] = None
+
+
+def init_pipeline_worker(factory: Callable[[], "RunFullPipelineUC"]) -> None:
+    """Инициализатор процесса пула: у каждого процесса свой пайплайн со своими адаптерами."""
+    global _worker_pipeline
+    _worker_pipeline = factory()
+
+
+def _execute_in_worker(event: Any, method: str, args: tuple, kwargs: dict) -> ReportDTO:
+    if _worker_pipeline is None:
+        raise PipelineError("Процесс пула не инициализирован (init_pipeline_worker).")
+    # Ленивые writer и pages не передаются между процессами — отчёт рендерится здесь.
+    return _run_cancellable(event, getattr(_worker_pipeline, method), args, kwargs).detached()
 
 
 class ParseChatExportUC:
     def __init__(self, parser: IParser):
         self._parser = parser
 
-    def execute(self, files: List[RawFileDTO], chat_id: Optional[str], user_id: str) -> ParsedMessagesDTO:
+    def execute(
+        self,
+        files: List[RawFileDTO],
+        chat_id: Optional[str],
+        user_id: str,
+        window: Optional[TimeWindow] = None,
+        watermarks: Optional[WatermarkLookup] = None,
+    ) -> ParsedMessagesDTO:
         if not files:
             raise InvalidInputError("Список файлов пуст.")
-        return self._parser.parse(files)
+        _check_cancelled()
+        with observe_stage("parse", _input_format(files)) as stage:
+            stage.bytes = sum(len(getattr(file, "content", None) or b"") for file in files)
+            return self._parser.parse(files, window=window, watermarks=watermarks)
 
 
 class ExtractAudienceUC:
@@ -33,7 +105,16 @@ class ExtractAudienceUC:
     def execute(self, parsed: ParsedMessagesDTO) -> ExtractionResultDTO:
         if not parsed.messages:
             raise InvalidInputError("Нет сообщений для извлечения.")
-        return self._extractor.extract(parsed)
+        _check_cancelled()
+        with observe_stage("extract"):
+            return self._extractor.extract(parsed)
+
+    def merge(self, partials: List[ExtractionResultDTO]) -> ExtractionResultDTO:
+        if not partials:
+            raise InvalidInputError("Нет результатов для объединения.")
+        _check_cancelled()
+        with observe_stage("merge"):
+            return self._extractor.merge(partials)
 
 
 class BuildAudienceReportUC:
@@ -43,7 +124,23 @@ class BuildAudienceReportUC:
     def execute(
         self, extraction: ExtractionResultDTO, metadata: ReportMetadataDTO
     ) -> ReportDTO:
-        return self._report_builder.build(extraction, metadata)
+        """Метка формата — выбранный формат отчёта; Excel рендерится внутри этого этапа."""
+        _check_cancelled()
+        with observe_stage("build") as stage:
+            report = self._report_builder.build(extraction, metadata)
+            stage.format = report.format.value
+            return report
+
+
+@dataclass
+class _PendingIngestion:
+    """Новое состояние накопленной аудитории чата, которое сохраняется после отчёта."""
+
+    key: str
+    state: IngestionState
+    # Состояние, из которого получено новое (None — чат ещё не накапливался), и хвосты чата.
+    previous: Optional[IngestionState]
+    tails: List[ChatTailDTO]
 
 
 class RunFullPipelineUC:
@@ -53,51 +150,393 @@ class RunFullPipelineUC:
         extractor_uc: ExtractAudienceUC,
         reporting_uc: BuildAudienceReportUC,
         config: "PipelineConfig",
+        audience_store: Optional[IAudienceStore] = None,
+        ingestion_store: Optional[IIngestionStore] = None,
+        enricher: Optional[IProfileEnricher] = None,
+        executor: Optional[Executor] = None,
     ):
+        """``executor`` — пул для ``*_async``; None — пул потоков цикла событий по умолчанию."""
         self._parse = parser_uci
         self._extract = extractor_uc
         self._report = reporting_uc
         self._config = config
+        self._audience_store = audience_store
+        self._ingestion_store = ingestion_store
+        self._enricher = enricher
+        self._executor = executor
+        self._manager: Optional[Any] = None
+        self._manager_lock = threading.Lock()
 
+    @traced("pipeline.execute")
     def execute(
         self,
         files: List[RawFileDTO],
         chat_name: Optional[str],
         user_id: str,
+        window: Optional[TimeWindow] = None,
+        report_format: Optional[ReportFormat] = None,
     ) -> ReportDTO:
         try:
             start = time.time()
             total_bytes = sum(len(f.content or b"") for f in files)
-            if total_bytes > self._config.max_total_bytes:
-                raise PipelineError(
-                    f"Превышен лимит объёма входных данных ({total_bytes} > {self._config.max_total_bytes} байт)."
-                )
-            parsed = self._parse.execute(files, chat_name, user_id)
-            if len(parsed.messages) > self._config.max_messages:
-                raise PipelineError(f"Превышен лимит сообщений ({len(parsed.messages)} > {self._config.max_messages}).")
+            self._check_total_bytes(total_bytes)
+            # Накопленная аудитория нужна только для полной истории, не для среза по периоду.
+            ingest = window is None and self._ingestion_store is not None
+            watermarks = self._watermarks(user_id) if ingest else None
+            parsed = self._parse.execute(files, chat_name, user_id, window=window, watermarks=watermarks)
+            if window is not None and not parsed.messages:
+                raise InvalidInputError(f"В выбранном периоде ({window.describe()}) нет сообщений.")
+            self._check_message_count(len(parsed.messages))
             logger.info(
                 "parsed_export",
                 extra={"user_id": user_id, "message_count": len(parsed.messages)},
             )
-            extracted = self._extract.execute(parsed)
-            metadata = ReportMetadataDTO(export_time=datetime.now(timezone.utc), chat_name=chat_name)
-            result = self._report.execute(extracted, metadata)
-            elapsed = time.time() - start
-            if elapsed > self._config.max_processing_seconds:
-                raise PipelineError(
-                    f"Превышен лимит времени обработки ({elapsed:.1f}s > {self._config.max_processing_seconds}s)."
-                )
+            extracted, pending = self._accumulate(self._tails(parsed, ingest), user_id)
+            start += self._enrich(extracted, user_id, start)
+            self._record_delta(extracted, parsed.chat_id, user_id)
+            report = self._build_report(extracted, chat_name, start, total_bytes, len(parsed.messages), report_format)
+            self._save_ingestion(pending, user_id)
+            return report
+        except PipelineError:
+            raise
+        except Exception as exc:
+            raise PipelineError("Ошибка выполнения пайплайна.") from exc
+
+    @traced("pipeline.execute_overlap")
+    def execute_overlap(
+        self,
+        files: List[RawFileDTO],
+        chat_name: Optional[str],
+        user_id: str,
+        window: Optional[TimeWindow] = None,
+        report_format: Optional[ReportFormat] = None,
+    ) -> ReportDTO:
+        """Сравнение аудиторий нескольких чатов.
+
+        Файлы группируются по названию чата из экспорта (иначе — по имени файла),
+        каждый чат извлекается один раз, пересечения считаются в AudienceOverlap.
+        """
+        try:
+            start = time.time()
+            total_bytes = sum(len(f.content or b"") for f in files)
+            self._check_total_bytes(total_bytes)
+            groups: Dict[str, List[ChatMessage]] = {}
+            for file in files:
+                parsed = self._parse.execute([file], chat_name, user_id, window=window)
+                groups.setdefault(parsed.chat_name or file.filename, []).extend(parsed.messages)
+            message_count = sum(len(messages) for messages in groups.values())
+            self._check_message_count(message_count)
+            if len(groups) < 2:
+                raise InvalidInputError("Для сравнения нужны экспорты минимум двух разных чатов.")
+            per_chat = [
+                (name, self._extract.execute(ParsedMessagesDTO(messages=messages)))
+                for name, messages in groups.items()
+            ]
+            merged = self._extract.merge([extracted for _, extracted in per_chat])
+            merged.overlap = AudienceOverlap.build([(name, extracted.result) for name, extracted in per_chat])
             logger.info(
-                "pipeline_metrics",
-                extra={
-                    "total_bytes": total_bytes,
-                    "message_count": len(parsed.messages),
-                    "elapsed_seconds": round(elapsed, 3),
-                },
+                "overlap_built",
+                extra={"user_id": user_id, "chat_count": len(groups), "profile_count": len(merged.overlap.table)},
+            )
+            return self._build_report(merged, chat_name, start, total_bytes, message_count, report_format)
+        except PipelineError:
+            raise
+        except Exception as exc:
+            raise PipelineError("Ошибка выполнения пайплайна.") from exc
+
+    async def execute_async(
+        self,
+        files: List[RawFileDTO],
+        chat_name: Optional[str],
+        user_id: str,
+        window: Optional[TimeWindow] = None,
+        report_format: Optional[ReportFormat] = None,
+    ) -> ReportDTO:
+        """``execute`` в пуле пайплайна, не блокируя цикл событий.
+
+        Отмена задачи прерывает обработку на ближайшей границе этапов
+        (``PipelineCancelledError`` внутри пула, ``CancelledError`` у вызывающего).
+        """
+        return await self._run_async("execute", files, chat_name, user_id, window=window, report_format=report_format)
+
+    async def execute_overlap_async(
+        self,
+        files: List[RawFileDTO],
+        chat_name: Optional[str],
+        user_id: str,
+        window: Optional[TimeWindow] = None,
+        report_format: Optional[ReportFormat] = None,
+    ) -> ReportDTO:
+        return await self._run_async(
+            "execute_overlap", files, chat_name, user_id, window=window, report_format=report_format
+        )
+
+    async def execute_prepared_async(
+        self,
+        partials: List[PartialExtractionDTO],
+        chat_name: Optional[str],
+        user_id: str,
+        report_format: Optional[ReportFormat] = None,
+    ) -> ReportDTO:
+        return await self._run_async("execute_prepared", partials, chat_name, user_id, report_format=report_format)
+
+    async def _run_async(self, method: str, *args: Any, **kwargs: Any) -> ReportDTO:
+        loop = asyncio.get_running_loop()
+        if isinstance(self._executor, ProcessPoolExecutor):
+            event = self._process_event()
+            call = partial(_execute_in_worker, event, method, args, kwargs)
+        else:
+            event = threading.Event()
+            # Копия контекста — этапы в потоке пула попадают в трассу вызывающего.
+            call = partial(
+                contextvars.copy_context().run, _run_cancellable, event, getattr(self, method), args, kwargs
+            )
+        try:
+            return await loop.run_in_executor(self._executor, call)
+        except asyncio.CancelledError:
+            event.set()
+            raise
+
+    def _process_event(self) -> Any:
+        """Событие отмены, видимое из процесса пула: прокси менеджера, который поднимается при первом вызове."""
+        with self._manager_lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager.Event()
+
+    @traced("pipeline.prepare")
+    def prepare(self, file: RawFileDTO, user_id: str) -> PartialExtractionDTO:
+        """Разбор и извлечение одного файла — выполняется в фоне сразу после загрузки."""
+        try:
+            total_bytes = len(file.content or b"")
+            self._check_total_bytes(total_bytes)
+            ingest = self._ingestion_store is not None
+            parsed = self._parse.execute([file], None, user_id, watermarks=self._watermarks(user_id) if ingest else None)
+            self._check_message_count(len(parsed.messages))
+            return PartialExtractionDTO(
+                tails=self._tails(parsed, ingest),
+                message_count=len(parsed.messages),
+                total_bytes=total_bytes,
+                chat_name=parsed.chat_name,
+                chat_id=parsed.chat_id,
             )
-            return result
         except PipelineError:
             raise
         except Exception as exc:
             raise PipelineError("Ошибка выполнения пайплайна.") from exc
+
+    @traced("pipeline.execute_prepared")
+    def execute_prepared(
+        self,
+        partials: List[PartialExtractionDTO],
+        chat_name: Optional[str],
+        user_id: str,
+        report_format: Optional[ReportFormat] = None,
+    ) -> ReportDTO:
+        """Отчёт по заранее подготовленным файлам: остаётся только слияние и рендер."""
+        try:
+            start = time.time()
+            total_bytes = sum(partial.total_bytes for partial in partials)
+            message_count = sum(partial.message_count for partial in partials)
+            self._check_total_bytes(total_bytes)
+            self._check_message_count(message_count)
+            tails = [tail for partial in partials for tail in partial.tails]
+            extracted, pending = self._accumulate(tails, user_id, merge_single=True)
+            start += self._enrich(extracted, user_id, start)
+            chat_ids = {partial.chat_id for partial in partials}
+            self._record_delta(extracted, chat_ids.pop() if len(chat_ids) == 1 else None, user_id)
+            report = self._build_report(extracted, chat_name, start, total_bytes, message_count, report_format)
+            self._save_ingestion(pending, user_id)
+            return report
+        except PipelineError:
+            raise
+        except Exception as exc:
+            raise PipelineError("Ошибка выполнения пайплайна.") from exc
+
+    def _build_report(
+        self,
+        extracted: ExtractionResultDTO,
+        chat_name: Optional[str],
+        start: float,
+        total_bytes: int,
+        message_count: int,
+        report_format: Optional[ReportFormat] = None,
+    ) -> ReportDTO:
+        metadata = ReportMetadataDTO(
+            export_time=datetime.now(timezone.utc), chat_name=chat_name, requested_format=report_format
+        )
+        result = self._report.execute(extracted, metadata)
+        result.audience = extracted.result
+        elapsed = time.time() - start
+        if elapsed > self._config.max_processing_seconds:
+            raise PipelineError(
+                f"Превышен лимит времени обработки ({elapsed:.1f}s > {self._config.max_processing_seconds}s)."
+            )
+        logger.info(
+            "pipeline_metrics",
+            extra={
+                "total_bytes": total_bytes,
+                "message_count": message_count,
+                "elapsed_seconds": round(elapsed, 3),
+            },
+        )
+        return result
+
+    def _watermarks(self, user_id: str) -> Optional[WatermarkLookup]:
+        """Граница обработанной истории для парсера — по id чата из экспорта и пользователю."""
+        store = self._ingestion_store
+        if store is None:
+            return None
+        loaded: Dict[str, Optional[Watermark]] = {}
+
+        def lookup(chat_id: Optional[str]) -> Optional[Watermark]:
+            if not chat_id:
+                return None
+            if chat_id not in loaded:
+                loaded[chat_id] = store.load_watermark(_store_key(user_id, chat_id))
+            return loaded[chat_id]
+
+        return lookup
+
+    def _tails(self, parsed: ParsedMessagesDTO, ingest: bool) -> List[ChatTailDTO]:
+        """Извлечение новых сообщений; при накоплении — отдельно по каждому чату экспорта.
+
+        Граница чата сдвигается только его собственными сообщениями.
+        """
+        if not ingest:
+            return [ChatTailDTO(chat_id=None, extraction=self._extract.execute(parsed) if parsed.messages else None)]
+        tails = []
+        for chat_id, messages in parsed.by_chat().items():
+            extraction = self._extract.execute(ParsedMessagesDTO(messages=messages)) if messages else None
+            watermark = self._advance(Watermark(), messages) if chat_id else Watermark()
+            tails.append(ChatTailDTO(chat_id, extraction, watermark, len(messages)))
+        return tails
+
+    def _accumulate(
+        self, tails: List[ChatTailDTO], user_id: str, merge_single: bool = False
+    ) -> Tuple[ExtractionResultDTO, List["_PendingIngestion"]]:
+        """Слить новые сообщения с накопленными аудиториями их чатов.
+
+        ``merge_single`` — сливать и единственную часть: подготовленные результаты
+        хранятся в сессии, и отчёт не должен менять их на месте.
+
+        Новое состояние чатов только готовится: сохраняет его ``_save_ingestion``
+        после успешного отчёта, иначе повтор после сбоя увидел бы «нет новых сообщений».
+        """
+        parts: List[ExtractionResultDTO] = []
+        by_chat: Dict[str, List[ChatTailDTO]] = {}
+        for tail in tails:
+            if tail.chat_id is not None and self._ingestion_store is not None:
+                by_chat.setdefault(tail.chat_id, []).append(tail)
+            elif tail.extraction is not None:
+                parts.append(tail.extraction)
+        pending = []
+        for chat_id, chat_tails in by_chat.items():
+            key = _store_key(user_id, chat_id)
+            state = self._ingestion_store.load_ingestion(key)
+            merged = self._merge_tails(state, chat_tails)
+            if merged is None:
+                continue
+            extracted, next_state, new_messages = merged
+            pending.append(_PendingIngestion(key, next_state, state, chat_tails))
+            logger.info(
+                "incremental_ingest",
+                extra={
+                    "user_id": user_id,
+                    "chat_id": chat_id,
+                    "new_messages": new_messages,
+                    "total_messages": next_state.message_count,
+                },
+            )
+            parts.append(extracted)
+        if not parts:
+            raise InvalidInputError("В файлах нет сообщений.")
+        if len(parts) == 1 and not merge_single:
+            return parts[0], pending
+        return self._extract.merge(parts), pending
+
+    def _merge_tails(
+        self, state: Optional[IngestionState], tails: List[ChatTailDTO]
+    ) -> Optional[Tuple[ExtractionResultDTO, IngestionState, int]]:
+        """Накопленная аудитория чата вместе с хвостами: (извлечение, новое состояние, новых сообщений).
+
+        Хвосты, которые граница ``state`` уже покрывает, пропускаются — их учёл другой прогон.
+        """
+        if state is not None:
+            covers = state.watermark.covers
+            tails = [tail for tail in tails if not covers(tail.watermark.message_id, tail.watermark.timestamp)]
+        new = [tail.extraction for tail in tails if tail.extraction is not None]
+        parts = new if state is None else [ExtractionResultDTO(result=state.result), *new]
+        if not parts:
+            return None
+        extracted = parts[0] if len(parts) == 1 else self._extract.merge(parts)
+        watermark = state.watermark if state is not None else Watermark()
+        new_messages = 0
+        for tail in tails:
+            watermark = watermark.advance(tail.watermark.message_id, tail.watermark.timestamp)
+            new_messages += tail.message_count
+        total = (state.message_count if state is not None else 0) + new_messages
+        state = IngestionState(watermark=watermark, result=extracted.result, message_count=total)
+        return extracted, state, new_messages
+
+    def _save_ingestion(self, pending: List["_PendingIngestion"], user_id: str) -> None:
+        """Сохранить состояния чатов; если чат успел сохранить другой прогон — слить хвосты с его состоянием."""
+        store = self._ingestion_store
+        for item in pending:
+            state, previous = item.state, item.previous
+            while not store.save_ingestion(item.key, state, previous):
+                previous = store.load_ingestion(item.key)
+                merged = self._merge_tails(previous, item.tails)
+                if merged is None:
+                    break
+                state = merged[1]
+                logger.info("incremental_ingest_rebased", extra={"user_id": user_id, "key": item.key})
+
+    @staticmethod
+    def _advance(watermark: Watermark, messages: List[ChatMessage]) -> Watermark:
+        for message in messages:
+            watermark = watermark.advance(message_number(message.message_id), message.timestamp)
+        return watermark
+
+    def _enrich(self, extracted: ExtractionResultDTO, user_id: str, start: float) -> float:
+        """Описания профилей из Telegram API — необязательный шаг, его сбой не отменяет отчёт.
+
+        Запросы к API ограничены по частоте, поэтому их время не входит в лимит
+        обработки (возвращается, чтобы сдвинуть начало отсчёта), а сами запросы
+        получают дедлайн — оставшуюся часть лимита.
+        """
+        if self._enricher is None:
+            return 0.0
+        began = time.time()
+        remaining = max(self._config.max_processing_seconds - (began - start), 0.0)
+        try:
+            self._enricher.enrich(extracted.result, timeout=remaining)
+        except Exception:
+            logger.warning("enrichment_failed", extra={"user_id": user_id}, exc_info=True)
+        return time.time() - began
+
+    def _record_delta(self, extracted: ExtractionResultDTO, chat_id: Optional[str], user_id: str) -> None:
+        """Сохранить аудиторию чата и приложить изменения с прошлого прогона.
+
+        Хранилище необязательно: без id чата из экспорта (HTML, файлы разных чатов)
+        сопоставлять прогоны не с чем, а ошибка записи не должна лишать
+        пользователя самого отчёта.
+        """
+        if self._audience_store is None or not chat_id:
+            return
+        key = _store_key(user_id, chat_id)
+        try:
+            extracted.delta = self._audience_store.record(key, extracted.result)
+        except Exception:
+            logger.warning("audience_store_failed", extra={"user_id": user_id, "chat_id": chat_id}, exc_info=True)
+
+    def _check_total_bytes(self, total_bytes: int) -> None:
+        if total_bytes > self._config.max_total_bytes:
+            raise PipelineError(
+                f"Превышен лимит объёма входных данных ({total_bytes} > {self._config.max_total_bytes} байт)."
+            )
+
+    def _check_message_count(self, message_count: int) -> None:
+        if message_count > self._config.max_messages:
+            raise PipelineError(f"Превышен лимит сообщений ({message_count} > {self._config.max_messages}).")
 logger = logging.getLogger(__name__)
@@ -1,9 +1,13 @@
 from __future__ import annotations
 
-from typing import List, Optional, Protocol, TYPE_CHECKING
+from typing import BinaryIO, List, Optional, Protocol, TYPE_CHECKING
 
 if TYPE_CHECKING:
-    from ...domain.reporting import ExcelReport
+    from ...domain.extraction import ExtractionResult
+    from ...domain.extraction.delta import AudienceDelta
+    from ...domain.extraction.ingestion import IngestionState
+    from ...domain.messages import TimeWindow, Watermark, WatermarkLookup
+    from ...domain.reporting import ExcelReport, ReportFormat
 
 from .dto import (
     ExtractionResultDTO,
@@ -16,7 +20,12 @@ from .files import TempFileRef
 
 
 class IParser(Protocol):
-    def parse(self, files: List[RawFileDTO]) -> ParsedMessagesDTO:
+    def parse(
+        self,
+        files: List[RawFileDTO],
+        window: Optional["TimeWindow"] = None,
+        watermarks: Optional["WatermarkLookup"] = None,
+    ) -> ParsedMessagesDTO:
         ...
 
 
@@ -24,6 +33,9 @@ class IExtractor(Protocol):
     def extract(self, parsed: ParsedMessagesDTO) -> ExtractionResultDTO:
         ...
 
+    def merge(self, partials: List[ExtractionResultDTO]) -> ExtractionResultDTO:
+        ...
+
 
 class IReportBuilder(Protocol):
     def build(
@@ -32,11 +44,42 @@ class IReportBuilder(Protocol):
         ...
 
 
+class IAudienceStore(Protocol):
+    def record(self, chat: str, result: "ExtractionResult") -> "AudienceDelta":
+        ...
+
+
+class IProfileEnricher(Protocol):
+    def enrich(self, result: "ExtractionResult", timeout: Optional[float] = None) -> int:
+        ...
+
+
+class IIngestionStore(Protocol):
+    def load_watermark(self, chat: str) -> Optional["Watermark"]:
+        ...
+
+    def load_ingestion(self, chat: str) -> Optional["IngestionState"]:
+        ...
+
+    def save_ingestion(
+        self, chat: str, state: "IngestionState", previous: Optional["IngestionState"] = None
+    ) -> bool:
+        ...
+
+
 class IExcelRenderer(Protocol):
     def render(self, report: "ExcelReport") -> bytes:
         ...
 
 
+class ITableWriter(Protocol):
+    def filename(self, report_format: "ReportFormat", part: int = 0) -> str:
+        ...
+
+    def write(self, report: "ExcelReport", report_format: "ReportFormat", sink: BinaryIO) -> None:
+        ...
+
+
 class ISessionStore(Protocol):
     def get(self, user_id: str) -> Optional["SessionRecord"]:
         ...
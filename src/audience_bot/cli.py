@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import argparse
+import atexit
 import logging
 import logging.config
 import pathlib
 import sys
+from typing import List, Optional
 
 try:
     import yaml
@@ -12,8 +14,13 @@ except ImportError:  # pragma: no cover - fallback for environments without PyYA
     yaml = None
 
 from .application.container import AppContainer
+from .application.profiling import StageProfiler, configure_profiling
+from .application.tracing import configure_tracing
 from .application.usecases.dto import RawFileDTO
 from .application.usecases.pipeline import RunFullPipelineUC
+from .domain.extraction import AudienceExtractor, ExtractionResult
+from .domain.messages import TimeWindow
+from .domain.reporting import ReportFormat
 from .infrastructure.telegram import (
     BotController,
     ConsoleTelegramAPIAdapter,
@@ -31,6 +38,27 @@ def _build_container(env_file: str) -> AppContainer:
     return container
 
 
+def explain_profiles(result: ExtractionResult, query: str) -> List[str]:
+    """Строки пояснения для профилей, у которых username, имя или user_id совпадает с запросом."""
+    provenance = result.provenance
+    needle = query.strip().lstrip("@").casefold()
+    lines: List[str] = []
+    for category, profile in result.iter_entries():
+        candidates = (profile.username, profile.display_name, profile.profile_id.user_id)
+        if not any(value is not None and str(value).lstrip("@").casefold() == needle for value in candidates):
+            continue
+        title = f"@{profile.username}" if profile.username else profile.display_name or "—"
+        lines.append(f"{title} ({category.value})")
+        if provenance is None:
+            continue
+        for message_id, role in provenance.lookup(profile.profile_id):
+            lines.append(f"  #{message_id}: {role}")
+        hidden = provenance.total(profile.profile_id) - len(provenance.lookup(profile.profile_id))
+        if hidden > 0:
+            lines.append(f"  … ещё {hidden}")
+    return lines
+
+
 def main() -> None:
     # logging setup
     if yaml:
@@ -57,9 +85,49 @@ def main() -> None:
     parser.add_argument("--simulate-telegram", action="store_true", help="Сымитировать серию Telegram-команд.")
     parser.add_argument("--poll-telegram", action="store_true", help="Запустить long polling Telegram API.")
     parser.add_argument("--env-file", default=".env", help="Файл переменных окружения.")
+    parser.add_argument("--since", default=None, help="Учитывать сообщения начиная с даты ГГГГ-ММ-ДД.")
+    parser.add_argument("--until", default=None, help="Учитывать сообщения по дату ГГГГ-ММ-ДД включительно.")
+    parser.add_argument("--last-days", type=int, default=None, help="Учитывать только последние N дней.")
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="Сравнить аудитории нескольких чатов (каждый файл или название чата в JSON — отдельный чат).",
+    )
+    parser.add_argument(
+        "--format",
+        choices=[report_format.value for report_format in ReportFormat],
+        default=None,
+        help="Формат отчёта; по умолчанию — по порогу участников и настройкам REPORT_FORCE_*.",
+    )
+    parser.add_argument(
+        "--explain",
+        default=None,
+        metavar="QUERY",
+        help="Показать, из каких сообщений получен профиль (username, имя или user_id).",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        default=None,
+        metavar="DIR",
+        help="Снять CPU- и memory-профиль каждого этапа; по умолчанию — каталог рядом с отчётом.",
+    )
     args = parser.parse_args()
 
     container = _build_container(args.env_file)
+    exporter = container.span_exporter()
+    if exporter is not None:
+        configure_tracing(exporter)
+        # Выгрузить очередь спанов и закрыть файл при выходе.
+        atexit.register(configure_tracing, None)
+    if args.profile is not None:
+        profiler: Optional[StageProfiler] = StageProfiler(args.profile or "audience-report.profile")
+    else:
+        profiler = container.profiler()
+    if profiler is not None:
+        configure_profiling(profiler)
+        atexit.register(_dump_profile, profiler)
 
     if args.poll_telegram:
         settings = container.settings()
@@ -77,18 +145,53 @@ def main() -> None:
     if not args.paths:
         parser.error("Укажи хотя бы один файл истории чата (JSON или HTML).")
 
+    try:
+        window = build_time_window(args.since, args.until, args.last_days)
+    except ValueError as exc:
+        parser.error(str(exc))
+
     files = [load_raw_file(path) for path in args.paths]
+    if args.explain:
+        settings = container.pipeline_config()
+        parsed = container.parse_uc().execute(files, chat_id=args.chat_name, user_id="cli", window=window)
+        extractor = AudienceExtractor(provenance_cap=settings.provenance_cap or 20)
+        lines = explain_profiles(extractor.extract(parsed.messages, window=window), args.explain)
+        print("\n".join(lines) if lines else f"Профиль «{args.explain}» не найден.")
+        return
+
     pipeline = container.pipeline()
-    report = pipeline.execute(files, chat_name=args.chat_name, user_id="cli")
+    report_format = ReportFormat(args.format) if args.format else None
+    if args.compare:
+        report = pipeline.execute_overlap(
+            files, chat_name=args.chat_name, user_id="cli", window=window, report_format=report_format
+        )
+    else:
+        report = pipeline.execute(
+            files, chat_name=args.chat_name, user_id="cli", window=window, report_format=report_format
+        )
 
     if report.format.value == "plain_text":
         print("Результат:")
-        print(report.text or "Нет текста.")
+        print(report.full_text() or "Нет текста.")
     else:
-        output = pathlib.Path("audience-report.xlsx")
-        with open(output, "wb") as stream:
-            stream.write(report.excel_bytes or b"")
-        print(f"Excel отчёт записан → {output}")
+        if report.note:
+            print(report.note)
+        for part in [report, *report.parts]:
+            output = pathlib.Path(part.filename or "audience-report.xlsx")
+            # CSV/JSONL пишутся в файл потоком, без сборки отчёта в памяти.
+            with open(output, "wb") as stream:
+                part.write_to(stream)
+            print(f"Отчёт ({part.format.value}) записан → {output}")
+        if profiler is not None and args.profile == "":
+            output = pathlib.Path(report.filename or "audience-report.xlsx")
+            profiler.output_dir = output.with_name(f"{output.name}.profile")
+
+
+def _dump_profile(profiler: StageProfiler) -> None:
+    configure_profiling(None)
+    written = profiler.dump()
+    if written:
+        print(f"Профиль этапов записан → {profiler.output_dir}")
 
 
 def run_polling(container: AppContainer) -> None:
@@ -98,10 +201,16 @@ def run_polling(container: AppContainer) -> None:
     controller = BotController(conversation, api_adapter)
     webhook = TelegramWebhookAdapter(controller)
     poller = TelegramPollingService(webhook, telegram_config)
+    metrics_server = container.metrics_server()
+    if metrics_server is not None:
+        metrics_server.start()
     try:
         poller.run()
     except KeyboardInterrupt:
         logger.info("Polling остановлен.")
+    finally:
+        if metrics_server is not None:
+            metrics_server.stop()
 
 
 def create_telegram_stack(container: AppContainer) -> tuple[BotController, TelegramWebhookAdapter]:
@@ -152,6 +261,18 @@ def simulate_telegram_flow(webhook: TelegramWebhookAdapter, paths: list[pathlib.
     )
 
 
+def build_time_window(
+    since: Optional[str], until: Optional[str], last_days: Optional[int]
+) -> Optional[TimeWindow]:
+    if last_days is not None:
+        if since or until:
+            raise ValueError("--last-days нельзя сочетать с --since/--until.")
+        return TimeWindow.last_days(last_days)
+    if since or until:
+        return TimeWindow.from_days(since, until)
+    return None
+
+
 def load_raw_file(path: pathlib.Path) -> RawFileDTO:
     content = path.read_bytes()
     suffix = path.suffix.lower()
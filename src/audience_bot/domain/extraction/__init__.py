@@ -10,6 +10,12 @@ from .core import (
     ProfileId,
     ProfileType,
 )
+from .activity import ActivityDay, ActivityHistogram
+from .identity import IdentityResolver
+from .provenance import ProvenanceIndex
+from .query import AudienceIndex
+from .overlap import AudienceOverlap, ChatAudience
+from .table import ProfileTable
 
 __all__ = [
     "AudienceExtractor",
@@ -20,4 +26,12 @@ __all__ = [
     "DeduplicationPolicy",
     "ClassificationPolicy",
     "AudienceExtractionError",
+    "IdentityResolver",
+    "AudienceOverlap",
+    "ChatAudience",
+    "ProfileTable",
+    "ProvenanceIndex",
+    "AudienceIndex",
+    "ActivityDay",
+    "ActivityHistogram",
 ]
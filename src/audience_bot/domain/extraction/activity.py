@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from ..messages import ProfileId
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - NumPy необязателен, есть запасной путь на array
+    np = None
+
+_NO_AUTHOR = -1
+
+
+@dataclass(frozen=True)
+class ActivityDay:
+    day: date
+    messages: int
+    unique_authors: int
+
+
+class ActivityHistogram:
+    """Сообщения и уникальные авторы по дням.
+
+    Во время извлечения на сообщение пишутся два числа в массивы (порядковый
+    номер дня и плотный id автора). Корзины считаются один раз при первом
+    чтении: с NumPy — векторно (bincount, unique), без него — проходом по массивам.
+    Уникальные авторы дня хранятся битовым множеством по id автора, поэтому
+    авторов за несколько дней можно получить объединением множеств. Корзины и
+    множества заводятся только для дней с сообщениями, и выводятся тоже только
+    они: одна дата-выброс (эпоха, далёкое будущее) не раздувает ни память, ни
+    лист отчёта на весь промежуток между датами.
+    """
+
+    def __init__(self) -> None:
+        self._authors: Dict[ProfileId, int] = {}
+        self._author_keys: List[ProfileId] = []
+        self._days = array("l")
+        self._author_ids = array("l")
+        # Порядковые номера дней с сообщениями (по возрастанию) и номер их строки в корзинах.
+        self._rows: Optional[Dict[int, int]] = None
+        self._active: List[int] = []
+        self._counts: List[int] = []
+        self._bitsets: List[bytes] = []
+
+    def record(self, timestamp: Optional[datetime], author: Optional[ProfileId]) -> None:
+        # Сообщения без даты в гистограмму не попадают.
+        if timestamp is None:
+            return
+        self._days.append(timestamp.toordinal())
+        self._author_ids.append(self._author_id(author) if author is not None else _NO_AUTHOR)
+        self._rows = None
+
+    def absorb(self, other: "ActivityHistogram", rekey: Callable[[ProfileId], ProfileId]) -> None:
+        """Добавить записи другой гистограммы, сопоставив авторов через ``rekey``."""
+        mapping = [self._author_id(rekey(key)) for key in other._author_keys]
+        self._days.extend(other._days)
+        self._author_ids.extend(mapping[author] if author != _NO_AUTHOR else _NO_AUTHOR for author in other._author_ids)
+        self._rows = None
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    def export(self) -> Tuple[List[ProfileId], array, array]:
+        """Авторы и записи (порядковый номер дня, id автора) — для хранения между прогонами."""
+        return list(self._author_keys), self._days, self._author_ids
+
+    @classmethod
+    def restore(cls, authors: List[ProfileId], days: Iterable[int], author_ids: Iterable[int]) -> "ActivityHistogram":
+        histogram = cls()
+        for author in authors:
+            histogram._author_id(author)
+        # iter(): массивы другого типа (например, int64 из хранилища) extend не принимает.
+        histogram._days.extend(iter(days))
+        histogram._author_ids.extend(iter(author_ids))
+        return histogram
+
+    def days(self) -> List[ActivityDay]:
+        """Дни с сообщениями по возрастанию; дни без активности не выводятся."""
+        self._buckets()
+        return [
+            ActivityDay(
+                day=date.fromordinal(ordinal),
+                messages=self._counts[row],
+                unique_authors=int.from_bytes(self._bitsets[row], "little").bit_count(),
+            )
+            for row, ordinal in enumerate(self._active)
+        ]
+
+    def authors_between(self, since: date, until: date) -> int:
+        """Уникальные авторы за дни [since, until] включительно — объединение дневных множеств."""
+        self._buckets()
+        first = bisect_left(self._active, since.toordinal())
+        last = bisect_right(self._active, until.toordinal())
+        mask = 0
+        for row in range(first, last):
+            mask |= int.from_bytes(self._bitsets[row], "little")
+        return mask.bit_count()
+
+    def _author_id(self, author: ProfileId) -> int:
+        author_id = self._authors.get(author)
+        if author_id is None:
+            author_id = len(self._author_keys)
+            self._authors[author] = author_id
+            self._author_keys.append(author)
+        return author_id
+
+    def _buckets(self) -> Dict[int, int]:
+        if self._rows is None:
+            if not self._days:
+                self._active, self._counts, self._bitsets = [], [], []
+            elif np is not None:
+                self._count_numpy()
+            else:
+                self._count_arrays()
+            self._rows = {ordinal: row for row, ordinal in enumerate(self._active)}
+        return self._rows
+
+    def _count_numpy(self) -> None:
+        days = np.frombuffer(self._days, dtype=np.dtype(f"i{self._days.itemsize}"))
+        authors = np.frombuffer(self._author_ids, dtype=np.dtype(f"i{self._author_ids.itemsize}"))
+        # Сжатый индекс строк: номер дня среди дней с сообщениями, а не смещение от первой даты.
+        active, rows = np.unique(days, return_inverse=True)
+        rows = rows.reshape(-1)
+        self._active = active.tolist()
+        self._counts = np.bincount(rows, minlength=len(active)).tolist()
+        known = authors != _NO_AUTHOR
+        width = max(len(self._author_keys), 1)
+        pairs, columns = np.divmod(np.unique(rows[known] * width + authors[known]), width)
+        bitsets = np.zeros((len(active), (len(self._author_keys) + 7) // 8), dtype=np.uint8)
+        np.bitwise_or.at(bitsets, (pairs, columns >> 3), (1 << (columns & 7)).astype(np.uint8))
+        self._bitsets = [row.tobytes() for row in bitsets]
+
+    def _count_arrays(self) -> None:
+        self._active = sorted(set(self._days))
+        rows = {ordinal: row for row, ordinal in enumerate(self._active)}
+        counts = [0] * len(self._active)
+        bitsets = [bytearray((len(self._author_keys) + 7) // 8) for _ in self._active]
+        for day, author in zip(self._days, self._author_ids):
+            row = rows[day]
+            counts[row] += 1
+            if author != _NO_AUTHOR:
+                bitsets[row][author >> 3] |= 1 << (author & 7)
+        self._counts = counts
+        self._bitsets = [bytes(bits) for bits in bitsets]
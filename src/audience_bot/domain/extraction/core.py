@@ -1,10 +1,16 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
+from array import array
+from collections.abc import Mapping as MappingABC
+from dataclasses import dataclass, replace
 from enum import Enum
-from typing import Dict, Iterable, List, Optional
+from typing import Callable, Iterable, Iterator, List, Mapping, Optional, Tuple
 
-from ..messages import ChatMessage, ProfileContext, ProfileId, RawUserRef
+from ..messages import ChatMessage, ProfileContext, ProfileId, RawUserRef, TimeWindow
+from .activity import ActivityHistogram
+from .identity import IdentityResolver
+from .provenance import ProvenanceIndex
+from .table import ProfileTable
 
 
 class ProfileType(str, Enum):
@@ -48,62 +54,145 @@ class ClassificationPolicy:
         return ProfileType.MENTIONED_ONLY
 
 
-@dataclass
+# Категории профиля в ExtractionResult; хранятся по одному байту на профиль.
+_NONE = 0
+_PARTICIPANT = 1
+_MENTIONED = 2
+_CHANNEL = 3
+_CATEGORY_TYPES = {
+    _PARTICIPANT: ProfileType.PARTICIPANT,
+    _MENTIONED: ProfileType.MENTIONED_ONLY,
+    _CHANNEL: ProfileType.CHANNEL,
+}
+
+
 class ExtractionResult:
-    participants: Dict[ProfileId, AudienceProfile] = field(default_factory=dict)
-    mentioned_only: Dict[ProfileId, AudienceProfile] = field(default_factory=dict)
-    channels: Dict[ProfileId, AudienceProfile] = field(default_factory=dict)
+    """Профили аудитории по категориям: участники, упомянутые, каналы.
+
+    Каждой идентичности выдаётся плотный целый id в ProfileTable, категория
+    хранится в массиве байтов по этому id. Перенос профиля между категориями —
+    запись одного байта; ``participants``/``mentioned_only``/``channels`` — живые
+    представления только для чтения поверх таблицы, без копии профилей.
+
+    Приоритеты: участник вытесняет упомянутого и канал; канал вытесняет
+    участника и упомянутого; упоминание не понижает участника или канал.
+    """
+
+    def __init__(self) -> None:
+        self._table = ProfileTable()
+        self._categories = array("b")
+        self._counts = [0, 0, 0, 0]
+        # Заполняется, если извлечение запущено с provenance_cap > 0.
+        self.provenance: Optional[ProvenanceIndex] = None
+        self.activity: Optional[ActivityHistogram] = None
+
+    @property
+    def participants(self) -> Mapping[ProfileId, AudienceProfile]:
+        return self._view(_PARTICIPANT)
+
+    @property
+    def mentioned_only(self) -> Mapping[ProfileId, AudienceProfile]:
+        return self._view(_MENTIONED)
+
+    @property
+    def channels(self) -> Mapping[ProfileId, AudienceProfile]:
+        return self._view(_CHANNEL)
 
     def add_participant(self, profile: AudienceProfile) -> None:
-        self._add(profile, self.participants, [self.mentioned_only])
+        self._add(profile, _PARTICIPANT)
 
     def add_mentioned(self, profile: AudienceProfile) -> None:
-        if profile.profile_id in self.participants:
+        index = self._table.index_of(profile.profile_id)
+        if index is not None and self._categories[index] in (_PARTICIPANT, _CHANNEL):
             return
-        self._add(profile, self.mentioned_only, [])
+        self._add(profile, _MENTIONED)
 
     def add_channel(self, profile: AudienceProfile) -> None:
-        self._add(profile, self.channels, [self.participants, self.mentioned_only])
+        self._add(profile, _CHANNEL)
 
-    def _add(
-        self,
-        profile: AudienceProfile,
-        target: Dict[ProfileId, AudienceProfile],
-        to_clean: Iterable[Dict[ProfileId, AudienceProfile]],
-    ) -> None:
-        for collection in to_clean:
-            collection.pop(profile.profile_id, None)
-        target[profile.profile_id] = profile
+    def _add(self, profile: AudienceProfile, category: int) -> None:
+        index = self._table.assign(profile)
+        if index == len(self._categories):
+            self._categories.append(_NONE)
+        previous = self._categories[index]
+        self._categories[index] = category
+        self._counts[previous] -= 1
+        self._counts[category] += 1
 
-    def merge(self, other: "ExtractionResult") -> None:
-        for profile in other.participants.values():
-            self.add_participant(profile)
-        for profile in other.mentioned_only.values():
-            self.add_mentioned(profile)
-        for profile in other.channels.values():
+    def update_profile(self, profile: AudienceProfile) -> bool:
+        """Заменить данные уже известного профиля, не меняя его категорию."""
+        if self._table.index_of(profile.profile_id) is None:
+            return False
+        self._table.assign(profile)
+        return True
+
+    def add(self, profile: AudienceProfile, category: ProfileType) -> None:
+        """Добавление в категорию, заданную ProfileType (PARTICIPANT, MENTIONED_ONLY или CHANNEL)."""
+        if category == ProfileType.CHANNEL:
             self.add_channel(profile)
+        elif category == ProfileType.MENTIONED_ONLY:
+            self.add_mentioned(profile)
+        else:
+            self.add_participant(profile)
+
+    def iter_entries(self) -> Iterator[Tuple[ProfileType, AudienceProfile]]:
+        """Пары (категория, профиль) в порядке появления идентичностей."""
+        for index, _, profile in self._table.items():
+            category = self._categories[index]
+            if category != _NONE:
+                yield _CATEGORY_TYPES[category], profile
+
+    def profile_count(self) -> int:
+        return len(self._table)
+
+    def merge(self, other: "ExtractionResult") -> None:
+        for category, profile in other.iter_entries():
+            self.add(profile, category)
 
     def finalize(self) -> None:
-        """Поддерживаем инвариант единственности и приоритетов."""
-        self.mentioned_only = {
-            pid: profile
-            for pid, profile in self.mentioned_only.items()
-            if pid not in self.participants
-        }
-        self.channels = {
-            pid: profile
-            for pid, profile in self.channels.items()
-            if pid not in self.participants
-        }
+        """Инвариант единственности и приоритетов поддерживается при каждом добавлении."""
 
     def participant_count(self) -> int:
-        return len(self.participants)
+        return self._counts[_PARTICIPANT]
 
     def mentioned_count(self) -> int:
-        return len(self.mentioned_only)
+        return self._counts[_MENTIONED]
 
     def channel_count(self) -> int:
-        return len(self.channels)
+        return self._counts[_CHANNEL]
+
+    def _view(self, category: int) -> Mapping[ProfileId, AudienceProfile]:
+        return _CategoryView(self, category)
+
+
+class _CategoryView(MappingABC):
+    """Профили одной категории: чтение идёт прямо по таблице, изменения результата видны сразу."""
+
+    __slots__ = ("_result", "_category")
+
+    def __init__(self, result: ExtractionResult, category: int) -> None:
+        self._result = result
+        self._category = category
+
+    def __getitem__(self, key: ProfileId) -> AudienceProfile:
+        index = self._result._table.index_of(key)
+        if index is None or self._result._categories[index] != self._category:
+            raise KeyError(key)
+        return self._result._table.profile(index)
+
+    def __contains__(self, key: object) -> bool:
+        index = self._result._table.index_of(key)  # type: ignore[arg-type]
+        return index is not None and self._result._categories[index] == self._category
+
+    def __iter__(self) -> Iterator[ProfileId]:
+        categories, category = self._result._categories, self._category
+        for index, key, _ in self._result._table.items():
+            if categories[index] == category:
+                yield key
+
+    def __len__(self) -> int:
+        return self._result._counts[self._category]
+
 
 
 class AudienceExtractionError(Exception):
@@ -115,45 +204,114 @@ class AudienceExtractor:
         self,
         classification_policy: Optional[ClassificationPolicy] = None,
         deduplication_policy: Optional[DeduplicationPolicy] = None,
+        resolve_identities: bool = True,
+        provenance_cap: int = 0,
     ):
         self._classification_policy = classification_policy or ClassificationPolicy()
         self._deduplication_policy = deduplication_policy or DeduplicationPolicy()
+        self._resolve_identities = resolve_identities
+        self._provenance_cap = provenance_cap
 
-    def extract(self, messages: List[ChatMessage]) -> ExtractionResult:
+    def extract(self, messages: List[ChatMessage], window: Optional[TimeWindow] = None) -> ExtractionResult:
+        if window is not None and window.is_bounded:
+            messages = [msg for msg in messages if window.contains(msg.timestamp)]
         if not messages:
             raise AudienceExtractionError("Нет сообщений для анализа.")
+        resolver = self._build_resolver(messages) if self._resolve_identities else None
         result = ExtractionResult()
+        provenance = ProvenanceIndex(self._provenance_cap) if self._provenance_cap > 0 else None
+        activity = ActivityHistogram()
         for msg in messages:
-            if msg.is_service_message:
-                continue
-            contexts = []
-            if msg.author:
-                contexts.append(ProfileContext(raw=msg.author, source="author", message_id=msg.message_id))
-            for mention in msg.mentions:
-                contexts.append(ProfileContext(raw=mention, source="mention", message_id=msg.message_id))
-            if msg.forward_author and msg.forward_author.is_channel:
-                contexts.append(ProfileContext(raw=msg.forward_author, source="forward", message_id=msg.message_id))
-            elif msg.forward_author:
-                contexts.append(ProfileContext(raw=msg.forward_author, source="forward_user", message_id=msg.message_id))
-            for context in contexts:
-                if context.raw.is_deleted:
-                    continue
-                profile_id = ProfileId.from_raw(context.raw)
+            author_id: Optional[ProfileId] = None
+            for context in self._iter_contexts(msg):
+                if resolver is not None:
+                    profile_id = resolver.resolve(context.raw)
+                else:
+                    profile_id = ProfileId.from_raw(context.raw)
                 if profile_id is None:
                     continue
+                if context.source == "author":
+                    author_id = profile_id
+                if provenance is not None:
+                    provenance.record(profile_id, context.source, context.message_id)
                 profile = AudienceProfile(
                     profile_id=profile_id,
                     profile_type=self._classify(context),
-                    username=context.raw.username,
+                    username=context.raw.username or profile_id.username,
                     display_name=context.raw.display_name,
                     first_name=context.raw.first_name,
                     last_name=context.raw.last_name,
                     has_channel=context.raw.is_channel,
                 )
                 self._apply_profile(profile, result)
+            if not msg.is_service_message:
+                activity.record(msg.timestamp, author_id)
+        result.provenance = provenance
+        result.activity = activity
         result.finalize()
         return result
 
+    def merge(self, partials: Iterable[ExtractionResult]) -> ExtractionResult:
+        """Слияние частичных результатов по отдельным файлам.
+
+        Идентичности между файлами связываются заново по ключам ProfileId, поэтому
+        профиль с user_id из одного файла и тот же username из другого сливаются.
+        """
+        partials = list(partials)
+        rekey: Callable[[ProfileId], ProfileId] = lambda profile_id: profile_id
+        if self._resolve_identities:
+            resolver = IdentityResolver()
+            for partial in partials:
+                for collection in (partial.participants, partial.mentioned_only, partial.channels):
+                    for profile_id in collection:
+                        resolver.observe(profile_id)
+            rekey = lambda profile_id: resolver.resolve(profile_id) or profile_id
+        result = ExtractionResult()
+        for partial in partials:
+            result.merge(self._rekey(partial, rekey) if self._resolve_identities else partial)
+            if partial.provenance is not None:
+                if result.provenance is None:
+                    result.provenance = ProvenanceIndex(partial.provenance.cap)
+                result.provenance.absorb(partial.provenance, rekey)
+            if partial.activity is not None:
+                if result.activity is None:
+                    result.activity = ActivityHistogram()
+                result.activity.absorb(partial.activity, rekey)
+        result.finalize()
+        return result
+
+    @staticmethod
+    def _rekey(partial: ExtractionResult, rekey: Callable[[ProfileId], ProfileId]) -> ExtractionResult:
+        rekeyed = ExtractionResult()
+        for category, profile in partial.iter_entries():
+            rekeyed.add(replace(profile, profile_id=rekey(profile.profile_id)), category)
+        return rekeyed
+
+    def _build_resolver(self, messages: List[ChatMessage]) -> IdentityResolver:
+        """Первый проход: связываем ключи идентичности по всем сообщениям всех файлов."""
+        resolver = IdentityResolver()
+        for msg in messages:
+            for context in self._iter_contexts(msg):
+                resolver.observe(context.raw)
+        return resolver
+
+    @staticmethod
+    def _iter_contexts(msg: ChatMessage) -> Iterator[ProfileContext]:
+        if msg.is_service_message:
+            return
+        contexts = []
+        if msg.author:
+            contexts.append(ProfileContext(raw=msg.author, source="author", message_id=msg.message_id))
+        for mention in msg.mentions:
+            contexts.append(ProfileContext(raw=mention, source="mention", message_id=msg.message_id))
+        if msg.forward_author and msg.forward_author.is_channel:
+            contexts.append(ProfileContext(raw=msg.forward_author, source="forward", message_id=msg.message_id))
+        elif msg.forward_author:
+            contexts.append(ProfileContext(raw=msg.forward_author, source="forward_user", message_id=msg.message_id))
+        for context in contexts:
+            if not context.raw.is_deleted:
+                yield context
+
     def _classify(self, context: ProfileContext) -> ProfileType:
         if context.source in {"mention", "forward_user"}:
             return self._classification_policy.classify_mention(context.raw)
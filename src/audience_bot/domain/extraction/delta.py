@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from ..messages import ProfileId
+from .core import ProfileType
+from .identity import identity_keys
+
+CHANGE_NEW = "new"
+CHANGE_GONE = "gone"
+CHANGE_CATEGORY = "changed"
+
+
+def storage_key(profile_id: ProfileId) -> Optional[str]:
+    """Стабильный строковый ключ профиля для хранилища — самый надёжный ключ идентичности."""
+    keys = identity_keys(profile_id)
+    if not keys:
+        return None
+    kind, value = keys[0]
+    return f"{kind}:{value}"
+
+
+@dataclass(frozen=True)
+class DeltaEntry:
+    change: str
+    user_id: Optional[int]
+    username: Optional[str]
+    display_name: Optional[str]
+    previous: Optional[ProfileType] = None
+    current: Optional[ProfileType] = None
+    first_seen: Optional[str] = None
+
+
+@dataclass
+class AudienceDelta:
+    """Изменения аудитории чата относительно предыдущего сохранённого прогона."""
+
+    chat: str
+    previous_run_at: Optional[str] = None
+    entries: List[DeltaEntry] = field(default_factory=list)
+
+    @property
+    def is_first_run(self) -> bool:
+        return self.previous_run_at is None
+
+    def of(self, change: str) -> List[DeltaEntry]:
+        return [entry for entry in self.entries if entry.change == change]
+
+    def summary(self) -> str:
+        if self.is_first_run:
+            return "Первый сохранённый отчёт по этому чату — изменений пока нет."
+        return (
+            f"С отчёта от {self.previous_run_at}: новых {len(self.of(CHANGE_NEW))}, "
+            f"ушли {len(self.of(CHANGE_GONE))}, сменили категорию {len(self.of(CHANGE_CATEGORY))}."
+        )
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Tuple, Union
+
+from ..messages import ProfileId, RawUserRef
+
+IdentityKey = Tuple[str, Hashable]
+# ProfileId несёт те же поля идентичности, что и RawUserRef, — это позволяет
+# повторно связывать уже извлечённые профили при слиянии частичных результатов.
+IdentitySource = Union[RawUserRef, ProfileId]
+
+
+def _normalize_username(username: Optional[str]) -> Optional[str]:
+    if not username:
+        return None
+    normalized = username.strip().lstrip("@").casefold()
+    return normalized or None
+
+
+def identity_keys(raw: IdentitySource) -> List[IdentityKey]:
+    """Ключи идентичности ссылки в порядке убывания надёжности: user_id → username → display_name."""
+    keys: List[IdentityKey] = []
+    if raw.user_id is not None:
+        keys.append(("user_id", raw.user_id))
+    username = _normalize_username(raw.username)
+    if username:
+        keys.append(("username", username))
+    if raw.display_name and raw.display_name.strip():
+        keys.append(("display_name", raw.display_name.strip().casefold()))
+    return keys
+
+
+@dataclass
+class _Component:
+    user_id: Optional[int] = None
+    username: Optional[str] = None
+
+    def has_strong_key(self) -> bool:
+        return self.user_id is not None or self.username is not None
+
+
+class IdentityResolver:
+    """Union-find над ключами идентичности (user_id, username, display_name).
+
+    Ключи связываются, когда одна ссылка на пользователя содержит их вместе
+    (например, id + username в JSON и username + имя в HTML). Объединение
+    отклоняется, если у компонент разные user_id или разные username, а через
+    одно отображаемое имя не связываются две компоненты, у каждой из которых
+    уже есть user_id или username: так однофамильцы не склеиваются. Такие имена
+    помечаются неоднозначными и дальше не разрешаются в компоненту.
+    """
+
+    def __init__(self) -> None:
+        self._parent: Dict[IdentityKey, IdentityKey] = {}
+        self._rank: Dict[IdentityKey, int] = {}
+        self._components: Dict[IdentityKey, _Component] = {}
+        self._ambiguous: set[IdentityKey] = set()
+
+    def observe(self, raw: IdentitySource) -> None:
+        keys = identity_keys(raw)
+        if not keys:
+            return
+        head = keys[0]
+        self._ensure(head, raw)
+        for key in keys[1:]:
+            self._ensure(key, raw)
+            by_name = key[0] == "display_name"
+            if not self._union(head, key, by_name) and by_name:
+                self._ambiguous.add(key)
+
+    def resolve(self, raw: IdentitySource) -> Optional[ProfileId]:
+        """Канонический ProfileId для ссылки; совпадает для всех ссылок одной компоненты."""
+        keys = identity_keys(raw)
+        if not keys:
+            return None
+        head = keys[0]
+        if head not in self._parent or head in self._ambiguous:
+            if isinstance(raw, ProfileId):
+                return raw
+            return ProfileId.from_raw(raw)
+        component = self._components[self._find(head)]
+        return ProfileId(
+            user_id=component.user_id,
+            username=component.username or raw.username,
+            display_name=raw.display_name or None,
+        )
+
+    def component_count(self) -> int:
+        return sum(1 for key in self._parent if self._parent[key] == key)
+
+    def _ensure(self, key: IdentityKey, raw: IdentitySource) -> None:
+        if key in self._parent:
+            return
+        self._parent[key] = key
+        self._rank[key] = 0
+        component = _Component()
+        if key[0] == "user_id":
+            component.user_id = raw.user_id
+        elif key[0] == "username":
+            component.username = raw.username
+        self._components[key] = component
+
+    def _find(self, key: IdentityKey) -> IdentityKey:
+        root = key
+        while self._parent[root] != root:
+            root = self._parent[root]
+        # Сжатие путей: следующий поиск по этим ключам будет O(1).
+        while self._parent[key] != root:
+            self._parent[key], key = root, self._parent[key]
+        return root
+
+    def _union(self, a: IdentityKey, b: IdentityKey, by_name: bool = False) -> bool:
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return True
+        comp_a, comp_b = self._components[root_a], self._components[root_b]
+        if self._conflicts(comp_a, comp_b):
+            return False
+        if by_name and comp_a.has_strong_key() and comp_b.has_strong_key():
+            # Общее имя — слабый признак: две компоненты с собственными id/username им не склеиваются.
+            return False
+        if self._rank[root_a] < self._rank[root_b]:
+            root_a, root_b = root_b, root_a
+            comp_a, comp_b = comp_b, comp_a
+        self._parent[root_b] = root_a
+        if self._rank[root_a] == self._rank[root_b]:
+            self._rank[root_a] += 1
+        if comp_a.user_id is None:
+            comp_a.user_id = comp_b.user_id
+        if comp_a.username is None:
+            comp_a.username = comp_b.username
+        del self._components[root_b]
+        return True
+
+    @staticmethod
+    def _conflicts(a: _Component, b: _Component) -> bool:
+        if a.user_id is not None and b.user_id is not None and a.user_id != b.user_id:
+            return True
+        return (
+            a.username is not None
+            and b.username is not None
+            and _normalize_username(a.username) != _normalize_username(b.username)
+        )
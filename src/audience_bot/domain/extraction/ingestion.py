@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Tuple
+
+from ..messages import ProfileId, Watermark
+from .core import AudienceProfile, ExtractionResult, ProfileType
+
+_SortKey = Tuple[str, Any]
+
+
+@dataclass
+class IngestionState:
+    """Накопленная аудитория чата и граница уже обработанных сообщений."""
+
+    watermark: Watermark
+    result: ExtractionResult
+    message_count: int = 0
+
+
+def _sort_key(profile_id: ProfileId) -> _SortKey:
+    kind, value = profile_id._comparison_key()
+    return kind, value
+
+
+def encode_entry(category: ProfileType, profile: AudienceProfile) -> str:
+    """Одна строка JSON на (категория, профиль); ключ идентичности идёт первым."""
+    pid = profile.profile_id
+    return json.dumps(
+        [
+            list(_sort_key(pid)),
+            category.value,
+            [pid.user_id, pid.username, pid.display_name],
+            profile.profile_type.value,
+            profile.username,
+            profile.display_name,
+            profile.first_name,
+            profile.last_name,
+            profile.has_channel,
+            profile.description,
+            profile.registered_at,
+        ],
+        ensure_ascii=False,
+    )
+
+
+def decode_entry(line: str) -> Tuple[_SortKey, ProfileType, AudienceProfile]:
+    (key, category, pid, profile_type, username, display_name, first, last, has_channel, description, registered) = (
+        json.loads(line)
+    )
+    profile = AudienceProfile(
+        profile_id=ProfileId(user_id=pid[0], username=pid[1], display_name=pid[2]),
+        profile_type=ProfileType(profile_type),
+        username=username,
+        display_name=display_name,
+        first_name=first,
+        last_name=last,
+        has_channel=has_channel,
+        description=description,
+        registered_at=registered,
+    )
+    return (key[0], key[1]), ProfileType(category), profile
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .core import AudienceProfile, ExtractionResult
+from .identity import IdentityResolver
+from .table import ProfileTable
+
+
+def bits_from_indexes(indexes: Iterable[int]) -> int:
+    """Битовое множество из индексов за линейное время (без промежуточных больших целых)."""
+    indexes = list(indexes)
+    if not indexes:
+        return 0
+    buffer = bytearray(max(indexes) // 8 + 1)
+    for index in indexes:
+        buffer[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Индексы установленных битов по возрастанию за один проход по двоичной записи."""
+    if mask <= 0:
+        return
+    digits = format(mask, "b")[::-1]
+    position = digits.find("1")
+    while position != -1:
+        yield position
+        position = digits.find("1", position + 1)
+
+
+@dataclass(frozen=True)
+class ChatAudience:
+    name: str
+    members: int
+
+    def size(self) -> int:
+        return self.members.bit_count()
+
+
+class AudienceOverlap:
+    """Участники нескольких чатов в общей таблице профилей и битовые множества по чатам."""
+
+    def __init__(self, table: ProfileTable, chats: Sequence[ChatAudience]) -> None:
+        self.table = table
+        self.chats: List[ChatAudience] = list(chats)
+        self._by_name = {chat.name: chat for chat in self.chats}
+
+    @classmethod
+    def build(cls, results: Sequence[Tuple[str, ExtractionResult]]) -> "AudienceOverlap":
+        """Сравниваются участники (авторы сообщений) каждого чата.
+
+        Идентичности между чатами связываются тем же IdentityResolver, что и при
+        слиянии файлов одного чата.
+        """
+        resolver = IdentityResolver()
+        for _, result in results:
+            for profile_id in result.participants:
+                resolver.observe(profile_id)
+        table = ProfileTable()
+        chats: List[ChatAudience] = []
+        for name, result in results:
+            indexes = []
+            for profile_id, profile in result.participants.items():
+                canonical = resolver.resolve(profile_id) or profile_id
+                index = table.index_of(canonical)
+                if index is None:
+                    index = table.intern(replace(profile, profile_id=canonical))
+                indexes.append(index)
+            chats.append(ChatAudience(name=name, members=bits_from_indexes(indexes)))
+        return cls(table, chats)
+
+    def chat(self, name: str) -> ChatAudience:
+        return self._by_name[name]
+
+    def union(self, names: Optional[Iterable[str]] = None) -> int:
+        mask = 0
+        for chat in self._select(names):
+            mask |= chat.members
+        return mask
+
+    def intersection(self, names: Optional[Iterable[str]] = None) -> int:
+        selected = self._select(names)
+        if not selected:
+            return 0
+        mask = selected[0].members
+        for chat in selected[1:]:
+            mask &= chat.members
+        return mask
+
+    def difference(self, name: str, others: Optional[Iterable[str]] = None) -> int:
+        """Участники чата ``name``, которых нет ни в одном из ``others`` (по умолчанию — во всех остальных)."""
+        if others is None:
+            others = [chat.name for chat in self.chats if chat.name != name]
+        return self.chat(name).members & ~self.union(others)
+
+    def pairwise(self) -> Iterator[Tuple[ChatAudience, ChatAudience, int]]:
+        for i, left in enumerate(self.chats):
+            for right in self.chats[i + 1:]:
+                yield left, right, left.members & right.members
+
+    def iter_membership(self) -> Iterator[Tuple[int, List[bool]]]:
+        """Для каждого профиля — признаки присутствия по чатам (в порядке ``chats``).
+
+        Двоичная запись каждого множества строится один раз, а не сдвиг на профиль.
+        """
+        digits = [format(chat.members, "b")[::-1] if chat.members else "" for chat in self.chats]
+        for index in range(len(self.table)):
+            yield index, [index < len(row) and row[index] == "1" for row in digits]
+
+    def profiles(self, mask: int) -> List[AudienceProfile]:
+        return [self.table.profile(index) for index in iter_bits(mask)]
+
+    def _select(self, names: Optional[Iterable[str]]) -> List[ChatAudience]:
+        if names is None:
+            return list(self.chats)
+        return [self._by_name[name] for name in names]
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..messages import ProfileId
+
+ROLE_AUTHOR = "author"
+ROLE_MENTION = "mention"
+ROLE_FORWARD = "forward"
+ROLE_FORWARD_USER = "forward_user"
+
+_ROLES = (ROLE_AUTHOR, ROLE_MENTION, ROLE_FORWARD, ROLE_FORWARD_USER)
+_ROLE_CODES = {role: code for code, role in enumerate(_ROLES)}
+_ROLE_TITLES = {
+    ROLE_AUTHOR: "автор",
+    ROLE_MENTION: "упоминание",
+    ROLE_FORWARD: "форвард канала",
+    ROLE_FORWARD_USER: "форвард пользователя",
+}
+_NO_ENTRY = -1
+
+
+class ProvenanceIndex:
+    """Какие сообщения и в какой роли породили профиль.
+
+    Записи хранятся в общих плоских массивах (id сообщения, роль, ссылка на
+    предыдущую запись того же профиля), на профиль — голова списка и счётчик.
+    Сохраняется не больше ``cap`` первых записей на профиль; общее число
+    вхождений считается всегда. Нечисловые id сообщений интернируются.
+    """
+
+    def __init__(self, cap: int = 20) -> None:
+        self._cap = cap
+        self._slots: Dict[ProfileId, int] = {}
+        self._heads = array("l")
+        self._stored = array("l")
+        self._totals = array("l")
+        self._message_ids = array("q")
+        self._roles = array("b")
+        self._previous = array("l")
+        self._external_ids: List[str] = []
+        self._external_lookup: Dict[str, int] = {}
+
+    @property
+    def cap(self) -> int:
+        return self._cap
+
+    def record(self, profile_id: ProfileId, role: str, message_id: Optional[str]) -> None:
+        slot = self._slot(profile_id)
+        self._totals[slot] += 1
+        if message_id is None or self._stored[slot] >= self._cap:
+            return
+        self._message_ids.append(self._encode_message_id(message_id))
+        self._roles.append(_ROLE_CODES.get(role, 0))
+        self._previous.append(self._heads[slot])
+        self._heads[slot] = len(self._roles) - 1
+        self._stored[slot] += 1
+
+    def lookup(self, profile_id: ProfileId) -> List[Tuple[str, str]]:
+        """Пары (id сообщения, роль) в порядке появления."""
+        slot = self._slots.get(profile_id)
+        if slot is None:
+            return []
+        entries = []
+        entry = self._heads[slot]
+        while entry != _NO_ENTRY:
+            entries.append((self._decode_message_id(self._message_ids[entry]), _ROLES[self._roles[entry]]))
+            entry = self._previous[entry]
+        entries.reverse()
+        return entries
+
+    def total(self, profile_id: ProfileId) -> int:
+        slot = self._slots.get(profile_id)
+        return self._totals[slot] if slot is not None else 0
+
+    def describe(self, profile_id: ProfileId, limit: int = 5) -> str:
+        """Краткое пояснение для отчёта: «упоминание #790, автор #812 (+3)»."""
+        entries = self.lookup(profile_id)
+        if not entries:
+            return ""
+        parts = [f"{_ROLE_TITLES[role]} #{message_id}" for message_id, role in entries[:limit]]
+        text = ", ".join(parts)
+        rest = self.total(profile_id) - min(limit, len(entries))
+        return f"{text} (+{rest})" if rest > 0 else text
+
+    def absorb(self, other: "ProvenanceIndex", rekey: Callable[[ProfileId], ProfileId]) -> None:
+        """Добавить записи другого индекса (например, частичного результата файла) под новыми ключами."""
+        for profile_id, total, entries in other.export():
+            self._extend(rekey(profile_id), total, entries)
+
+    def export(self) -> Iterator[Tuple[ProfileId, int, List[Tuple[str, str]]]]:
+        """(профиль, всего вхождений, сохранённые пары) — для хранения между прогонами."""
+        for profile_id in self._slots:
+            yield profile_id, self.total(profile_id), self.lookup(profile_id)
+
+    @classmethod
+    def restore(cls, cap: int, rows: Iterable[Tuple[ProfileId, int, List[Tuple[str, str]]]]) -> "ProvenanceIndex":
+        index = cls(cap)
+        for profile_id, total, entries in rows:
+            index._extend(profile_id, total, entries)
+        return index
+
+    def _extend(self, profile_id: ProfileId, total: int, entries: List[Tuple[str, str]]) -> None:
+        for message_id, role in entries:
+            self.record(profile_id, role, message_id)
+        extra = total - len(entries)
+        if extra > 0:
+            self._totals[self._slot(profile_id)] += extra
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def _slot(self, profile_id: ProfileId) -> int:
+        slot = self._slots.get(profile_id)
+        if slot is None:
+            slot = len(self._heads)
+            self._slots[profile_id] = slot
+            self._heads.append(_NO_ENTRY)
+            self._stored.append(0)
+            self._totals.append(0)
+        return slot
+
+    def _encode_message_id(self, message_id: str) -> int:
+        if message_id.isascii() and message_id.isdigit() and len(message_id) < 19:
+            return int(message_id)
+        code = self._external_lookup.get(message_id)
+        if code is None:
+            self._external_ids.append(message_id)
+            code = -len(self._external_ids)
+            self._external_lookup[message_id] = code
+        return code
+
+    def _decode_message_id(self, code: int) -> str:
+        if code >= 0:
+            return str(code)
+        return self._external_ids[-code - 1]
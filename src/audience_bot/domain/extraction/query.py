@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from .core import AudienceProfile, ExtractionResult, ProfileType
+from .provenance import ProvenanceIndex
+
+# Глубина дерева по первым символам ключа; глубже ключи лежат в отсортированных корзинах.
+_TRIE_DEPTH = 2
+
+AudienceEntry = Tuple[ProfileType, AudienceProfile]
+
+
+def _normalize(value: Optional[str]) -> str:
+    return (value or "").strip().lstrip("@").casefold()
+
+
+class _TrieNode:
+    __slots__ = ("children", "keys", "entries")
+
+    def __init__(self) -> None:
+        self.children: Dict[str, _TrieNode] = {}
+        self.keys: List[str] = []
+        self.entries: List[int] = []
+
+    def freeze(self) -> None:
+        if self.keys:
+            pairs = sorted(zip(self.keys, self.entries))
+            self.keys = [key for key, _ in pairs]
+            self.entries = [entry for _, entry in pairs]
+        self.children = {char: self.children[char] for char in sorted(self.children)}
+        for child in self.children.values():
+            child.freeze()
+
+    def walk(self) -> Iterator[int]:
+        yield from self.entries
+        for child in self.children.values():
+            yield from child.walk()
+
+
+class AudienceIndex:
+    """Индекс последнего результата извлечения для быстрых запросов.
+
+    Префиксное дерево (burst trie) по username и словам отображаемого имени
+    в нижнем регистре: узлы — только для первых ``_TRIE_DEPTH`` символов,
+    дальше ключи лежат в отсортированных корзинах и ищутся бисекцией. Так
+    память не растёт на узел за каждый символ, а поиск остаётся O(глубина +
+    log корзины + ответ). Для точного user_id и username — обычные словари.
+    """
+
+    def __init__(self, entries: List[AudienceEntry], provenance: Optional[ProvenanceIndex] = None) -> None:
+        self._entries = entries
+        self.provenance = provenance
+        self._root = _TrieNode()
+        self._by_user_id: Dict[int, int] = {}
+        self._by_username: Dict[str, int] = {}
+        for index, (_, profile) in enumerate(entries):
+            if profile.profile_id.user_id is not None:
+                self._by_user_id.setdefault(profile.profile_id.user_id, index)
+            if profile.username:
+                self._by_username.setdefault(_normalize(profile.username), index)
+            for key in self._keys(profile):
+                self._insert(key, index)
+        self._root.freeze()
+
+    @classmethod
+    def build(cls, result: ExtractionResult) -> "AudienceIndex":
+        return cls(list(result.iter_entries()), provenance=result.provenance)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def find(self, prefix: str, limit: int = 20) -> List[AudienceEntry]:
+        """Профили, у которых username или слово имени начинается с ``prefix``."""
+        needle = _normalize(prefix)
+        if not needle:
+            return []
+        node: Optional[_TrieNode] = self._root
+        for char in needle[:_TRIE_DEPTH]:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if len(needle) > _TRIE_DEPTH:
+            candidates = self._scan_bucket(node, needle)
+        else:
+            candidates = node.walk()
+        found: List[AudienceEntry] = []
+        seen: Set[int] = set()
+        for index in candidates:
+            if index in seen:
+                continue
+            seen.add(index)
+            found.append(self._entries[index])
+            if len(found) >= limit:
+                break
+        return found
+
+    def by_user_id(self, user_id: int) -> Optional[AudienceEntry]:
+        index = self._by_user_id.get(user_id)
+        return self._entries[index] if index is not None else None
+
+    def by_username(self, username: str) -> Optional[AudienceEntry]:
+        index = self._by_username.get(_normalize(username))
+        return self._entries[index] if index is not None else None
+
+    @staticmethod
+    def _keys(profile: AudienceProfile) -> Set[str]:
+        keys = set()
+        username = _normalize(profile.username)
+        if username:
+            keys.add(username)
+        name = _normalize(profile.display_name)
+        if name:
+            keys.add(name)
+            keys.update(name.split())
+        return keys
+
+    def _insert(self, key: str, index: int) -> None:
+        node = self._root
+        for char in key[:_TRIE_DEPTH]:
+            child = node.children.get(char)
+            if child is None:
+                child = node.children[char] = _TrieNode()
+            node = child
+        node.keys.append(key)
+        node.entries.append(index)
+
+    @staticmethod
+    def _scan_bucket(node: _TrieNode, needle: str) -> Iterator[int]:
+        position = bisect_left(node.keys, needle)
+        while position < len(node.keys) and node.keys[position].startswith(needle):
+            yield node.entries[position]
+            position += 1
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Tuple
+
+from ..messages import ProfileId
+
+if TYPE_CHECKING:
+    from .core import AudienceProfile
+
+
+class ProfileTable:
+    """Плотная нумерация профилей: ProfileId → целый индекс 0..n-1.
+
+    Индекс служит суррогатным ключом: по нему ExtractionResult хранит категорию
+    в компактном массиве, а AudienceOverlap — номер бита в битовых множествах.
+    """
+
+    def __init__(self) -> None:
+        self._ids: Dict[ProfileId, int] = {}
+        # Ключ не хранится отдельно: это profile_id профиля под тем же индексом.
+        self._profiles: List["AudienceProfile"] = []
+
+    def intern(self, profile: "AudienceProfile") -> int:
+        """Индекс профиля; новый профиль добавляется, существующий не заменяется."""
+        index = self._ids.get(profile.profile_id)
+        if index is None:
+            index = self._append(profile)
+        return index
+
+    def assign(self, profile: "AudienceProfile") -> int:
+        """Индекс профиля; данные существующего профиля заменяются последними."""
+        index = self._ids.get(profile.profile_id)
+        if index is None:
+            return self._append(profile)
+        self._profiles[index] = profile
+        return index
+
+    def index_of(self, profile_id: ProfileId) -> Optional[int]:
+        return self._ids.get(profile_id)
+
+    def key(self, index: int) -> ProfileId:
+        return self._profiles[index].profile_id
+
+    def profile(self, index: int) -> "AudienceProfile":
+        return self._profiles[index]
+
+    def items(self) -> Iterator[Tuple[int, ProfileId, "AudienceProfile"]]:
+        for index, profile in enumerate(self._profiles):
+            yield index, profile.profile_id, profile
+
+    def __len__(self) -> int:
+        return len(self._profiles)
+
+    def _append(self, profile: "AudienceProfile") -> int:
+        index = len(self._profiles)
+        self._ids[profile.profile_id] = index
+        self._profiles.append(profile)
+        return index
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 from .models import ChatMessage, ProfileContext, ProfileId, RawUserRef, non_deleted_users
+from .timeline import TimeWindow, Watermark, WatermarkLookup, message_number, time_range
 
 __all__ = [
     "ChatMessage",
@@ -8,4 +9,9 @@ __all__ = [
     "ProfileId",
     "ProfileContext",
     "non_deleted_users",
+    "TimeWindow",
+    "time_range",
+    "Watermark",
+    "WatermarkLookup",
+    "message_number",
 ]
@@ -128,6 +128,15 @@ class ChatMessage:
             is_channel=payload.get("is_channel", False),
         )
 
+    @classmethod
+    def peek_message_id(cls, data: dict[str, Any]) -> Optional[str]:
+        return cls._parse_message_id(data)
+
+    @classmethod
+    def peek_timestamp(cls, data: dict[str, Any]) -> Optional[datetime]:
+        """Дата сообщения из сырой записи без построения модели — для раннего отсева по периоду."""
+        return cls._parse_timestamp(data)
+
     @staticmethod
     def _parse_timestamp(data: dict[str, Any]) -> Optional[datetime]:
         timestamp = data.get("date")
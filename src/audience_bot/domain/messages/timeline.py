@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, Optional, Tuple
+
+_LAST_DAYS_RE = re.compile(r"^(\d+)d$")
+_MESSAGE_NUMBER_RE = re.compile(r"(\d+)$")
+
+
+def _naive(value: datetime) -> datetime:
+    """Приводим время к наивному локальному: экспорты Telegram хранят даты без часового пояса."""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+def _parse_day(value: str) -> datetime:
+    try:
+        return datetime.combine(date.fromisoformat(value), datetime.min.time())
+    except ValueError as exc:
+        raise ValueError(f"Некорректная дата '{value}', ожидается ГГГГ-ММ-ДД.") from exc
+
+
+@dataclass(frozen=True)
+class TimeWindow:
+    """Полуинтервал [since, until); None на любой границе — без ограничения."""
+
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+    def __post_init__(self) -> None:
+        if self.since is not None:
+            object.__setattr__(self, "since", _naive(self.since))
+        if self.until is not None:
+            object.__setattr__(self, "until", _naive(self.until))
+        if self.since is not None and self.until is not None and self.since >= self.until:
+            raise ValueError("Начало периода должно быть раньше конца.")
+
+    @classmethod
+    def last_days(cls, days: int, now: Optional[datetime] = None) -> "TimeWindow":
+        if days <= 0:
+            raise ValueError("Число дней должно быть положительным.")
+        current = _naive(now or datetime.now())
+        return cls(since=current - timedelta(days=days))
+
+    @classmethod
+    def from_days(cls, since: Optional[str], until: Optional[str]) -> "TimeWindow":
+        """Границы в днях включительно: until=2025-03-31 захватывает весь 31 марта."""
+        return cls(
+            since=_parse_day(since) if since else None,
+            until=_parse_day(until) + timedelta(days=1) if until else None,
+        )
+
+    @classmethod
+    def from_spec(cls, spec: str, now: Optional[datetime] = None) -> "TimeWindow":
+        """Разбор периода из команды: ``30d``, ``2025-01-01..2025-03-31``, ``2025-01-01..``, ``..2025-03-31``."""
+        spec = spec.strip()
+        match = _LAST_DAYS_RE.match(spec)
+        if match:
+            return cls.last_days(int(match.group(1)), now=now)
+        if ".." not in spec:
+            raise ValueError(f"Некорректный период '{spec}'.")
+        since, until = spec.split("..", 1)
+        return cls.from_days(since.strip() or None, until.strip() or None)
+
+    @property
+    def is_bounded(self) -> bool:
+        return self.since is not None or self.until is not None
+
+    def contains(self, timestamp: Optional[datetime]) -> bool:
+        # Сообщения без даты не отбрасываем: доказать, что они вне периода, нельзя.
+        if timestamp is None:
+            return True
+        timestamp = _naive(timestamp)
+        if self.since is not None and timestamp < self.since:
+            return False
+        if self.until is not None and timestamp >= self.until:
+            return False
+        return True
+
+    def overlaps(self, start: datetime, end: datetime) -> bool:
+        """Пересекается ли период с отрезком [start, end] (границы дат файла)."""
+        if self.since is not None and _naive(end) < self.since:
+            return False
+        if self.until is not None and _naive(start) >= self.until:
+            return False
+        return True
+
+    def describe(self) -> str:
+        since = self.since.strftime("%Y-%m-%d") if self.since else "…"
+        until = (self.until - timedelta(days=1)).strftime("%Y-%m-%d") if self.until else "…"
+        return f"{since} – {until}"
+
+
+def time_range(timestamps: Iterable[Optional[datetime]]) -> Optional[Tuple[datetime, datetime]]:
+    """Минимальная и максимальная дата среди известных меток времени."""
+    lowest: Optional[datetime] = None
+    highest: Optional[datetime] = None
+    for value in timestamps:
+        if value is None:
+            continue
+        value = _naive(value)
+        if lowest is None or value < lowest:
+            lowest = value
+        if highest is None or value > highest:
+            highest = value
+    if lowest is None or highest is None:
+        return None
+    return lowest, highest
+
+
+def message_number(message_id: Optional[str]) -> Optional[int]:
+    """Порядковый номер сообщения: ``"812"`` в JSON, ``"message812"`` в HTML."""
+    if not message_id:
+        return None
+    match = _MESSAGE_NUMBER_RE.search(str(message_id))
+    return int(match.group(1)) if match else None
+
+
+@dataclass(frozen=True)
+class Watermark:
+    """Граница уже обработанной истории чата: наибольший номер сообщения и дата.
+
+    Экспорты Telegram накопительные, номера сообщений в чате растут, поэтому
+    сообщение «покрыто», если его номер не больше сохранённого. Дата — запасной
+    признак для записей без номера.
+    """
+
+    message_id: Optional[int] = None
+    timestamp: Optional[datetime] = None
+
+    def __post_init__(self) -> None:
+        if self.timestamp is not None:
+            object.__setattr__(self, "timestamp", _naive(self.timestamp))
+
+    def covers(self, number: Optional[int], timestamp: Optional[datetime]) -> bool:
+        if number is not None and self.message_id is not None:
+            return number <= self.message_id
+        if timestamp is not None and self.timestamp is not None:
+            return _naive(timestamp) <= self.timestamp
+        return False
+
+    def advance(self, number: Optional[int], timestamp: Optional[datetime]) -> "Watermark":
+        message_id = self.message_id
+        if number is not None and (message_id is None or number > message_id):
+            message_id = number
+        latest = self.timestamp
+        if timestamp is not None and (latest is None or _naive(timestamp) > latest):
+            latest = _naive(timestamp)
+        return Watermark(message_id, latest)
+
+
+# Поиск границы по id чата из экспорта (None — id неизвестен, например в HTML).
+WatermarkLookup = Callable[[Optional[str]], Optional[Watermark]]
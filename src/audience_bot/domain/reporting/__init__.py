@@ -2,24 +2,44 @@ from __future__ import annotations
 
 from .models import (
     AudienceReport,
+    DeltaReportBuilder,
     ExcelReport,
     ExcelReportBuilder,
+    OverlapReportBuilder,
     ReportFormat,
     ReportMetadata,
     ReportPolicy,
+    RowSource,
     SheetModel,
     TextList,
     TextListBuilder,
 )
+from .packaging import (
+    TELEGRAM_MESSAGE_LIMIT,
+    TELEGRAM_UPLOAD_LIMIT,
+    XLSX_MAX_ROWS,
+    ReportPackager,
+    SizeEstimate,
+    paginate,
+)
 
 __all__ = [
     "AudienceReport",
+    "DeltaReportBuilder",
     "ExcelReport",
     "ExcelReportBuilder",
+    "OverlapReportBuilder",
+    "paginate",
+    "ReportPackager",
     "ReportPolicy",
     "ReportFormat",
     "ReportMetadata",
+    "RowSource",
     "TextList",
     "SheetModel",
+    "SizeEstimate",
+    "TELEGRAM_MESSAGE_LIMIT",
+    "TELEGRAM_UPLOAD_LIMIT",
     "TextListBuilder",
+    "XLSX_MAX_ROWS",
 ]
@@ -1,16 +1,31 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 from enum import Enum
-from typing import Dict, List, Optional
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
 
-from ..extraction import AudienceProfile, ExtractionResult
+from ..extraction import (
+    ActivityHistogram,
+    AudienceOverlap,
+    AudienceProfile,
+    ExtractionResult,
+    ProfileType,
+    ProvenanceIndex,
+)
+from ..extraction.delta import CHANGE_CATEGORY, CHANGE_GONE, CHANGE_NEW, AudienceDelta
 
 
 class ReportFormat(str, Enum):
     PLAIN_TEXT = "plain_text"
     EXCEL = "excel"
+    CSV = "csv"
+    JSONL = "jsonl"
+    # Листы отчёта отдельными CSV в zip — когда xlsx не поместился бы в лимит отправки.
+    CSV_ZIP = "csv_zip"
+    # База SQLite: профили, категории, метаданные и активность — для запросов аналитиков.
+    SQLITE = "sqlite"
 
 
 @dataclass(frozen=True)
@@ -25,16 +40,74 @@ class TextList:
     lines: List[str]
 
 
-@dataclass
+RowSource = Callable[[], Iterable[Sequence[str]]]
+
+
+@dataclass(init=False)
 class SheetModel:
+    """Лист отчёта: строки словарями ``rows`` или ленивым источником кортежей ``source``.
+
+    ``source`` вызывается при каждом обходе и отдаёт значения в порядке
+    ``columns`` — так большие листы строятся прямо во время рендеринга.
+    ``size`` — число строк источника, известное заранее (без обхода).
+    """
+
     name: str
     columns: List[str]
-    rows: List[Dict[str, str]]
+    source: Optional[RowSource] = None
+    size: Optional[int] = None
+    _rows: List[Dict[str, str]] = field(default_factory=list, repr=False)
+
+    def __init__(
+        self,
+        name: str,
+        columns: List[str],
+        rows: Optional[List[Dict[str, str]]] = None,
+        source: Optional[RowSource] = None,
+        size: Optional[int] = None,
+    ) -> None:
+        if rows is not None and source is not None:
+            raise ValueError("Лист задаётся либо строками, либо источником.")
+        self.name = name
+        self.columns = columns
+        self.source = source
+        self.size = size
+        self._rows = rows if rows is not None else []
+
+    @property
+    def rows(self) -> List[Dict[str, str]]:
+        """Строки словарями; у ленивого листа собираются из ``source`` при каждом обращении."""
+        if self.source is None:
+            return self._rows
+        return [dict(zip(self.columns, values)) for values in self.source()]
+
+    def row_count(self) -> int:
+        if self.size is not None:
+            return self.size
+        if self.source is None:
+            return len(self._rows)
+        return sum(1 for _ in self.source())
+
+    def slice(self, start: int, stop: int, name: Optional[str] = None) -> "SheetModel":
+        """Строки [start, stop) тем же ленивым источником."""
+        return SheetModel(
+            name=name or self.name,
+            columns=self.columns,
+            source=lambda: islice(self.iter_values(), start, stop),
+            size=max(min(stop, self.row_count()) - start, 0),
+        )
+
+    def iter_values(self) -> Iterator[Sequence[str]]:
+        if self.source is not None:
+            return iter(self.source())
+        columns = self.columns
+        return (tuple(row.get(column, "") for column in columns) for row in self._rows)
 
 
 @dataclass
 class ExcelReport:
     sheets: List[SheetModel]
+    metadata: Optional[ReportMetadata] = None
 
 
 @dataclass
@@ -50,8 +123,11 @@ class AudienceReport:
         self.text_list = text_list
         self.excel_report = None
 
-    def set_excel(self, metadata: ReportMetadata, excel_report: ExcelReport) -> None:
-        self.report_format = ReportFormat.EXCEL
+    def set_excel(
+        self, metadata: ReportMetadata, excel_report: ExcelReport, report_format: ReportFormat = ReportFormat.EXCEL
+    ) -> None:
+        """Табличный отчёт: Excel или потоковая выгрузка (CSV, JSONL) той же модели листов."""
+        self.report_format = report_format
         self.metadata = metadata
         self.excel_report = excel_report
         self.text_list = None
@@ -61,7 +137,7 @@ class AudienceReport:
             raise ValueError("Report is incomplete.")
         if self.report_format == ReportFormat.PLAIN_TEXT and not self.text_list:
             raise ValueError("Text list missing for plain-text report.")
-        if self.report_format == ReportFormat.EXCEL and not self.excel_report:
+        if self.report_format != ReportFormat.PLAIN_TEXT and not self.excel_report:
             raise ValueError("Excel document missing for excel report.")
 
 
@@ -108,29 +184,151 @@ class ExcelReportBuilder:
         ("channels", "Каналы"),
     ]
 
+    PROVENANCE_COLUMN = "Основание"
+    ACTIVITY_SHEET = "Активность"
+    ACTIVITY_COLUMNS = ["Дата", "Сообщений", "Уникальных авторов"]
+
     def build(self, result: ExtractionResult, metadata: ReportMetadata) -> ExcelReport:
+        provenance = result.provenance
+        columns = self.COLUMN_HEADERS if provenance is None else [*self.COLUMN_HEADERS, self.PROVENANCE_COLUMN]
         sheets = []
         for key, title in self.SHEET_ORDER:
-            rows = self._build_rows(getattr(result, key).values(), metadata)
-            sheets.append(SheetModel(name=title, columns=self.COLUMN_HEADERS, rows=rows))
-        return ExcelReport(sheets=sheets)
+            profiles = getattr(result, key)
+            source = self._row_source(profiles.values(), metadata, provenance)
+            sheets.append(SheetModel(name=title, columns=columns, source=source, size=len(profiles)))
+        if result.activity is not None and len(result.activity):
+            sheets.append(self._build_activity(result.activity))
+        return ExcelReport(sheets=sheets, metadata=metadata)
+
+    def _build_activity(self, activity: ActivityHistogram) -> SheetModel:
+        """Гистограмма по дням считается при извлечении; здесь только форматирование."""
+        rows = [
+            {
+                "Дата": day.day.isoformat(),
+                "Сообщений": str(day.messages),
+                "Уникальных авторов": str(day.unique_authors),
+            }
+            for day in activity.days()
+        ]
+        return SheetModel(name=self.ACTIVITY_SHEET, columns=self.ACTIVITY_COLUMNS, rows=rows)
+
+    def _row_source(
+        self,
+        profiles: Iterable[AudienceProfile],
+        metadata: ReportMetadata,
+        provenance: Optional[ProvenanceIndex] = None,
+    ) -> RowSource:
+        """Строки в порядке COLUMN_HEADERS; дата экспорта форматируется один раз на лист."""
+        exported_at = metadata.exported_at.strftime("%Y-%m-%d %H:%M:%S")
+
+        def rows() -> Iterator[Sequence[str]]:
+            for profile in sorted(profiles, key=lambda profile: (profile.username or "", profile.display_name or "")):
+                user_id = profile.profile_id.user_id
+                values = (
+                    exported_at,
+                    str(user_id) if user_id is not None else "",
+                    profile.username or "",
+                    profile.display_name or "",
+                    profile.first_name or "",
+                    profile.last_name or "",
+                    profile.description or "",
+                    profile.registered_at or "",
+                    "да" if profile.has_channel else "",
+                )
+                if provenance is not None:
+                    values += (provenance.describe(profile.profile_id),)
+                yield values
+
+        return rows
+
+
+class OverlapReportBuilder:
+    """Дополнительные листы для сравнения аудиторий нескольких чатов."""
 
-    def _build_rows(
-        self, profiles: List[AudienceProfile], metadata: ReportMetadata
-    ) -> List[Dict[str, str]]:
+    SUMMARY_COLUMNS = ["Чат", "Участников", "Только в этом чате", "Есть в других чатах"]
+    PAIR_COLUMNS = ["Чат A", "Чат B", "Общих участников", "Индекс Жаккара"]
+    PROFILE_COLUMNS = ["user_id", "Username", "Отображаемое имя"]
+
+    def build(self, overlap: AudienceOverlap) -> List[SheetModel]:
+        return [self._summary(overlap), self._pairs(overlap), self._presence(overlap)]
+
+    def _summary(self, overlap: AudienceOverlap) -> SheetModel:
         rows = []
-        for profile in sorted(profiles, key=lambda profile: (profile.username or "", profile.display_name or "")):
+        for chat in overlap.chats:
+            only = overlap.difference(chat.name).bit_count()
             rows.append(
                 {
-                    "Дата экспорта": metadata.exported_at.strftime("%Y-%m-%d %H:%M:%S"),
-                    "user_id": str(profile.profile_id.user_id) if profile.profile_id.user_id is not None else "",
-                    "Username": profile.username or "",
-                    "Отображаемое имя": profile.display_name or "",
-                    "Имя": profile.first_name or "",
-                    "Фамилия": profile.last_name or "",
-                    "Описание": profile.description or "",
-                    "Дата регистрации": profile.registered_at or "",
-                    "Наличие канала": "да" if profile.has_channel else "",
+                    "Чат": chat.name,
+                    "Участников": str(chat.size()),
+                    "Только в этом чате": str(only),
+                    "Есть в других чатах": str(chat.size() - only),
                 }
             )
-        return rows
+        rows.append({"Чат": "Все чаты (объединение)", "Участников": str(overlap.union().bit_count())})
+        rows.append({"Чат": "Во всех чатах (пересечение)", "Участников": str(overlap.intersection().bit_count())})
+        return SheetModel(name="Сводка по чатам", columns=self.SUMMARY_COLUMNS, rows=rows)
+
+    def _pairs(self, overlap: AudienceOverlap) -> SheetModel:
+        rows = []
+        for left, right, common in overlap.pairwise():
+            union = (left.members | right.members).bit_count()
+            shared = common.bit_count()
+            rows.append(
+                {
+                    "Чат A": left.name,
+                    "Чат B": right.name,
+                    "Общих участников": str(shared),
+                    "Индекс Жаккара": f"{shared / union:.3f}" if union else "0.000",
+                }
+            )
+        return SheetModel(name="Пары чатов", columns=self.PAIR_COLUMNS, rows=rows)
+
+    def _presence(self, overlap: AudienceOverlap) -> SheetModel:
+        chat_names = [chat.name for chat in overlap.chats]
+        columns = [*self.PROFILE_COLUMNS, *chat_names, "Число чатов"]
+        entries = []
+        for index, flags in overlap.iter_membership():
+            profile = overlap.table.profile(index)
+            entries.append((-sum(flags), profile.username or "", profile.display_name or "", profile, flags))
+        entries.sort(key=lambda entry: entry[:3])
+        rows = []
+        for negative_count, _, _, profile, flags in entries:
+            row = {
+                "user_id": str(profile.profile_id.user_id) if profile.profile_id.user_id is not None else "",
+                "Username": profile.username or "",
+                "Отображаемое имя": profile.display_name or "",
+                "Число чатов": str(-negative_count),
+            }
+            for name, present in zip(chat_names, flags):
+                row[name] = "да" if present else ""
+            rows.append(row)
+        return SheetModel(name="Присутствие", columns=columns, rows=rows)
+
+
+class DeltaReportBuilder:
+    """Лист изменений аудитории с прошлого сохранённого прогона по чату."""
+
+    COLUMNS = ["Изменение", "user_id", "Username", "Отображаемое имя", "Было", "Стало", "Впервые замечен"]
+    CHANGE_TITLES = {CHANGE_NEW: "новый", CHANGE_GONE: "ушёл", CHANGE_CATEGORY: "сменил категорию"}
+    CATEGORY_TITLES = {
+        ProfileType.PARTICIPANT: "участник",
+        ProfileType.MENTIONED_ONLY: "упомянут",
+        ProfileType.CHANNEL: "канал",
+        ProfileType.BOT: "бот",
+    }
+
+    def build(self, delta: AudienceDelta) -> SheetModel:
+        rows = [{"Изменение": delta.summary()}]
+        for entry in delta.entries:
+            rows.append(
+                {
+                    "Изменение": self.CHANGE_TITLES[entry.change],
+                    "user_id": str(entry.user_id) if entry.user_id is not None else "",
+                    "Username": entry.username or "",
+                    "Отображаемое имя": entry.display_name or "",
+                    "Было": self.CATEGORY_TITLES.get(entry.previous, "") if entry.previous else "",
+                    "Стало": self.CATEGORY_TITLES.get(entry.current, "") if entry.current else "",
+                    "Впервые замечен": entry.first_seen or "",
+                }
+            )
+        return SheetModel(name="Изменения", columns=self.COLUMNS, rows=rows)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from itertools import islice
+from typing import Iterable, Iterator, List, Sequence, Tuple
+
+from .models import ExcelReport, SheetModel
+
+# Лист xlsx вмещает 1 048 576 строк, одна из них — заголовок.
+XLSX_MAX_ROWS = 1_048_576
+# Лимит Telegram на документ, отправляемый ботом.
+TELEGRAM_UPLOAD_LIMIT = 50 * 1024 * 1024
+# Лимит Telegram на текст сообщения — в единицах UTF-16, как считает Bot API.
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Оценка по выборке строк: XML ячейки xlsx добавляет ~24 байта к тексту, deflate
+# сжимает XML примерно в 5 раз, CSV — примерно в 3. Оценки нарочно с запасом.
+_SAMPLE_ROWS = 256
+_XLSX_CELL_OVERHEAD = 24
+_XLSX_COMPRESSION = 0.2
+_CSV_COMPRESSION = 0.35
+
+
+@dataclass(frozen=True)
+class SizeEstimate:
+    rows: int
+    xlsx_bytes: int
+    csv_zip_bytes: int
+
+
+def _row_bytes(sheet: SheetModel) -> float:
+    """Средний размер строки листа в байтах UTF-8 по первым строкам."""
+    total = 0
+    sampled = 0
+    for values in islice(sheet.iter_values(), _SAMPLE_ROWS):
+        total += sum(len(value.encode("utf-8")) for value in values if value)
+        sampled += 1
+    return total / sampled if sampled else 0.0
+
+
+def _utf16_len(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def _split_line(line: str, limit: int) -> Iterator[str]:
+    """Строка длиннее лимита — кусками по ``limit`` единиц UTF-16, не разрывая суррогатные пары."""
+    chunk: List[str] = []
+    size = 0
+    for char in line:
+        width = 2 if ord(char) > 0xFFFF else 1
+        if size + width > limit:
+            yield "".join(chunk)
+            chunk, size = [], 0
+        chunk.append(char)
+        size += width
+    if chunk:
+        yield "".join(chunk)
+
+
+def paginate(lines: Iterable[str], limit: int = TELEGRAM_MESSAGE_LIMIT) -> Iterator[str]:
+    """Страницы текста не длиннее ``limit``, разбитые по границам строк.
+
+    Генератор: страница отдаётся, как только набрана, остальные строки к
+    этому моменту ещё не прочитаны.
+    """
+    page: List[str] = []
+    size = 0
+    for line in lines:
+        for piece in _split_line(line, limit) if _utf16_len(line) > limit else (line,):
+            width = _utf16_len(piece)
+            # +1 — перевод строки перед строкой, если страница уже не пустая.
+            if page and size + 1 + width > limit:
+                yield "\n".join(page)
+                page, size = [], 0
+            size += width + (1 if page else 0)
+            page.append(piece)
+    if page:
+        yield "\n".join(page)
+
+
+class ReportPackager:
+    """Раскладка табличного отчёта под лимиты доставки до рендеринга.
+
+    Размер оценивается по числу строк и выборке первых строк каждого листа,
+    поэтому заведомо неотправляемый xlsx не рендерится. Листы длиннее лимита
+    строк xlsx делятся на несколько листов, а выгрузка CSV, не помещающаяся
+    в один файл, — на несколько архивов.
+    """
+
+    def __init__(self, max_file_bytes: int = TELEGRAM_UPLOAD_LIMIT, max_sheet_rows: int = XLSX_MAX_ROWS - 1) -> None:
+        self._max_file_bytes = max_file_bytes
+        self._max_sheet_rows = max_sheet_rows
+
+    @property
+    def max_file_bytes(self) -> int:
+        return self._max_file_bytes
+
+    def fit_rows(self, report: ExcelReport) -> ExcelReport:
+        """Листы длиннее лимита строк xlsx — несколькими листами «Имя (2)», «Имя (3)»…"""
+        sheets: List[SheetModel] = []
+        for sheet in report.sheets:
+            count = sheet.row_count()
+            if count <= self._max_sheet_rows:
+                sheets.append(sheet)
+                continue
+            for part, start in enumerate(range(0, count, self._max_sheet_rows), start=1):
+                name = sheet.name if part == 1 else f"{sheet.name} ({part})"
+                sheets.append(sheet.slice(start, min(start + self._max_sheet_rows, count), name=name))
+        return ExcelReport(sheets=sheets, metadata=report.metadata)
+
+    def estimate(self, report: ExcelReport) -> SizeEstimate:
+        rows = xlsx = csv = 0.0
+        for sheet, row_bytes in self._sheet_costs(report):
+            count = sheet.row_count()
+            cells = len(sheet.columns)
+            rows += count
+            xlsx += count * (row_bytes + cells * _XLSX_CELL_OVERHEAD) * _XLSX_COMPRESSION
+            csv += count * (row_bytes + cells) * _CSV_COMPRESSION
+        return SizeEstimate(rows=int(rows), xlsx_bytes=int(xlsx), csv_zip_bytes=int(csv))
+
+    def fits_xlsx(self, estimate: SizeEstimate) -> bool:
+        return estimate.xlsx_bytes <= self._max_file_bytes
+
+    def partition(self, report: ExcelReport) -> List[ExcelReport]:
+        """Отчёт частями, каждая из которых по оценке сжатого CSV не больше лимита файла."""
+        parts: List[List[SheetModel]] = [[]]
+        budget = float(self._max_file_bytes)
+        for sheet, row_bytes in self._sheet_costs(report):
+            per_row = max((row_bytes + len(sheet.columns)) * _CSV_COMPRESSION, 1.0)
+            count = sheet.row_count()
+            if count == 0:
+                parts[-1].append(sheet)
+                continue
+            start = 0
+            while start < count:
+                fits = int(budget // per_row)
+                if fits == 0 and parts[-1]:
+                    parts.append([])
+                    budget = float(self._max_file_bytes)
+                    continue
+                # Строка больше лимита целиком всё равно уходит отдельной частью.
+                stop = min(count, start + max(fits, 1))
+                parts[-1].append(sheet if start == 0 and stop == count else sheet.slice(start, stop))
+                budget -= (stop - start) * per_row
+                start = stop
+        return [ExcelReport(sheets=sheets, metadata=report.metadata) for sheets in parts if sheets]
+
+    @staticmethod
+    def _sheet_costs(report: ExcelReport) -> Sequence[Tuple[SheetModel, float]]:
+        return [(sheet, _row_bytes(sheet)) for sheet in report.sheets]
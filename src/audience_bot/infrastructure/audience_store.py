@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import zlib
+from array import array
+from contextlib import closing, contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from ..domain.extraction import ActivityHistogram, ExtractionResult, ProfileType, ProvenanceIndex
+from ..domain.extraction.delta import (
+    CHANGE_CATEGORY,
+    CHANGE_GONE,
+    CHANGE_NEW,
+    AudienceDelta,
+    DeltaEntry,
+    storage_key,
+)
+from ..domain.extraction.ingestion import IngestionState, decode_entry, encode_entry
+from ..domain.messages import ProfileId, Watermark
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    chat TEXT NOT NULL,
+    run_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_by_chat ON runs (chat, id);
+CREATE TABLE IF NOT EXISTS profiles (
+    chat TEXT NOT NULL,
+    identity_key TEXT NOT NULL,
+    user_id INTEGER,
+    username TEXT,
+    display_name TEXT,
+    category TEXT NOT NULL,
+    first_seen TEXT NOT NULL,
+    last_seen TEXT NOT NULL,
+    active INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (chat, identity_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS profiles_active ON profiles (chat, active);
+CREATE TABLE IF NOT EXISTS ingestion (
+    chat TEXT PRIMARY KEY,
+    message_id INTEGER,
+    message_at TEXT,
+    message_count INTEGER NOT NULL,
+    snapshot BLOB NOT NULL,
+    activity BLOB,
+    provenance BLOB
+);
+"""
+# Колонки, добавленные в ingestion после первой версии схемы, — для уже созданных файлов.
+_INGESTION_COLUMNS = ("activity", "provenance")
+
+_Row = Tuple[str, Optional[int], Optional[str], Optional[str], str]
+
+
+class AudienceStoreError(Exception):
+    pass
+
+
+class SqliteAudienceStore:
+    """Аудитории чатов между прогонами в SQLite.
+
+    Текущий прогон заливается во временную таблицу с первичным ключом по
+    ключу идентичности; новые, ушедшие и сменившие категорию профили
+    выбираются соединениями по индексам (chat, identity_key), после чего
+    таблица профилей обновляется одним upsert.
+
+    Для инкрементальной обработки здесь же хранится граница уже разобранных
+    сообщений и накопленный результат (сжатые строки JSON, по строке на профиль)
+    вместе с гистограммой активности и индексом источников профилей.
+    Запись идёт в ``BEGIN IMMEDIATE``: чтение и обновление строки чата не
+    перемежаются с другими потоками и процессами, работающими с тем же файлом.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        self._path = str(path)
+        self._lock = threading.Lock()
+        with closing(self._connect()) as connection:
+            connection.executescript(_SCHEMA)
+            present = {row[1] for row in connection.execute("PRAGMA table_info(ingestion)")}
+            for column in _INGESTION_COLUMNS:
+                if column not in present:
+                    connection.execute(f"ALTER TABLE ingestion ADD COLUMN {column} BLOB")
+
+    def record(self, chat: str, result: ExtractionResult, run_at: Optional[datetime] = None) -> AudienceDelta:
+        stamp = (run_at or datetime.now(timezone.utc)).strftime("%Y-%m-%d %H:%M")
+        try:
+            with self._transaction() as connection:
+                return self._record(connection, chat, result, stamp)
+        except sqlite3.Error as exc:
+            raise AudienceStoreError("Не удалось обновить хранилище аудитории.") from exc
+
+    def load_watermark(self, chat: str) -> Optional[Watermark]:
+        """Только граница — без распаковки накопленного результата."""
+        try:
+            with closing(self._connect()) as connection:
+                row = connection.execute(
+                    "SELECT message_id, message_at FROM ingestion WHERE chat = ?", (chat,)
+                ).fetchone()
+        except sqlite3.Error as exc:
+            raise AudienceStoreError("Не удалось прочитать накопленную аудиторию.") from exc
+        if row is None:
+            return None
+        return Watermark(row[0], datetime.fromisoformat(row[1]) if row[1] else None)
+
+    def load_ingestion(self, chat: str) -> Optional[IngestionState]:
+        try:
+            with closing(self._connect()) as connection:
+                row = connection.execute(
+                    "SELECT message_id, message_at, message_count, snapshot, activity, provenance "
+                    "FROM ingestion WHERE chat = ?",
+                    (chat,),
+                ).fetchone()
+        except sqlite3.Error as exc:
+            raise AudienceStoreError("Не удалось прочитать накопленную аудиторию.") from exc
+        if row is None:
+            return None
+        message_id, message_at, message_count, snapshot, activity, provenance = row
+        result = ExtractionResult()
+        for line in zlib.decompress(snapshot).decode("utf-8").splitlines():
+            _, category, profile = decode_entry(line)
+            result.add(profile, category)
+        result.activity = _decode_activity(activity) if activity is not None else None
+        result.provenance = _decode_provenance(provenance) if provenance is not None else None
+        watermark = Watermark(message_id, datetime.fromisoformat(message_at) if message_at else None)
+        return IngestionState(watermark=watermark, result=result, message_count=message_count)
+
+    def save_ingestion(self, chat: str, state: IngestionState, previous: Optional[IngestionState] = None) -> bool:
+        """Сохранить, если в хранилище всё ещё ``previous`` (None — записи не было).
+
+        False — чат успел сохранить другой прогон; ничего не записано, состояние
+        нужно перечитать и слить заново.
+        """
+        result = state.result
+        payload = "\n".join(encode_entry(category, profile) for category, profile in result.iter_entries())
+        activity = _encode_activity(result.activity) if result.activity is not None else None
+        provenance = _encode_provenance(result.provenance) if result.provenance is not None else None
+        try:
+            with self._transaction() as connection:
+                row = connection.execute(
+                    "SELECT message_id, message_at, message_count FROM ingestion WHERE chat = ?", (chat,)
+                ).fetchone()
+                if row != (self._marker(previous) if previous is not None else None):
+                    return False
+                connection.execute(
+                    "INSERT OR REPLACE INTO ingestion "
+                    "(chat, message_id, message_at, message_count, snapshot, activity, provenance) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (chat, *self._marker(state), zlib.compress(payload.encode()), activity, provenance),
+                )
+                return True
+        except sqlite3.Error as exc:
+            raise AudienceStoreError("Не удалось сохранить накопленную аудиторию.") from exc
+
+    @staticmethod
+    def _marker(state: IngestionState) -> Tuple[Optional[int], Optional[str], int]:
+        timestamp = state.watermark.timestamp.isoformat() if state.watermark.timestamp else None
+        return state.watermark.message_id, timestamp, state.message_count
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock, closing(self._connect()) as connection:
+            # Блокировка на запись берётся сразу, а не при первом UPDATE после чтения.
+            connection.isolation_level = None
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    def _record(self, connection: sqlite3.Connection, chat: str, result: ExtractionResult, stamp: str) -> AudienceDelta:
+        previous = connection.execute(
+            "SELECT run_at FROM runs WHERE chat = ? ORDER BY id DESC LIMIT 1", (chat,)
+        ).fetchone()
+        connection.execute(
+            "CREATE TEMP TABLE IF NOT EXISTS current_run ("
+            "identity_key TEXT PRIMARY KEY, user_id INTEGER, username TEXT, display_name TEXT, category TEXT NOT NULL"
+            ") WITHOUT ROWID"
+        )
+        connection.execute("DELETE FROM current_run")
+        connection.executemany("INSERT OR IGNORE INTO current_run VALUES (?, ?, ?, ?, ?)", self._rows(result))
+
+        delta = AudienceDelta(chat=chat, previous_run_at=previous[0] if previous else None)
+        if previous is not None:
+            for key, user_id, username, display_name, category in connection.execute(
+                "SELECT c.identity_key, c.user_id, c.username, c.display_name, c.category FROM current_run c "
+                "LEFT JOIN profiles p ON p.chat = ? AND p.identity_key = c.identity_key "
+                "WHERE p.identity_key IS NULL OR p.active = 0 ORDER BY c.identity_key",
+                (chat,),
+            ):
+                delta.entries.append(
+                    DeltaEntry(CHANGE_NEW, user_id, username, display_name, current=ProfileType(category))
+                )
+            for user_id, username, display_name, category, first_seen in connection.execute(
+                "SELECT p.user_id, p.username, p.display_name, p.category, p.first_seen FROM profiles p "
+                "WHERE p.chat = ? AND p.active = 1 "
+                "AND NOT EXISTS (SELECT 1 FROM current_run c WHERE c.identity_key = p.identity_key) "
+                "ORDER BY p.identity_key",
+                (chat,),
+            ):
+                delta.entries.append(
+                    DeltaEntry(
+                        CHANGE_GONE,
+                        user_id,
+                        username,
+                        display_name,
+                        previous=ProfileType(category),
+                        first_seen=first_seen,
+                    )
+                )
+            for user_id, username, display_name, old, new, first_seen in connection.execute(
+                "SELECT c.user_id, c.username, c.display_name, p.category, c.category, p.first_seen "
+                "FROM current_run c JOIN profiles p ON p.chat = ? AND p.identity_key = c.identity_key "
+                "WHERE p.active = 1 AND p.category != c.category ORDER BY c.identity_key",
+                (chat,),
+            ):
+                delta.entries.append(
+                    DeltaEntry(
+                        CHANGE_CATEGORY,
+                        user_id,
+                        username,
+                        display_name,
+                        previous=ProfileType(old),
+                        current=ProfileType(new),
+                        first_seen=first_seen,
+                    )
+                )
+
+        connection.execute(
+            "UPDATE profiles SET active = 0 WHERE chat = ? AND active = 1 "
+            "AND identity_key NOT IN (SELECT identity_key FROM current_run)",
+            (chat,),
+        )
+        connection.execute(
+            "INSERT INTO profiles (chat, identity_key, user_id, username, display_name, category, first_seen, last_seen) "
+            "SELECT ?, identity_key, user_id, username, display_name, category, ?, ? FROM current_run WHERE true "
+            "ON CONFLICT (chat, identity_key) DO UPDATE SET "
+            "user_id = COALESCE(excluded.user_id, user_id), username = COALESCE(excluded.username, username), "
+            "display_name = COALESCE(excluded.display_name, display_name), category = excluded.category, "
+            "last_seen = excluded.last_seen, active = 1",
+            (chat, stamp, stamp),
+        )
+        connection.execute("INSERT INTO runs (chat, run_at) VALUES (?, ?)", (chat, stamp))
+        return delta
+
+    @staticmethod
+    def _rows(result: ExtractionResult) -> Iterator[_Row]:
+        for category, profile in result.iter_entries():
+            key = storage_key(profile.profile_id)
+            if key is None:
+                continue
+            yield key, profile.profile_id.user_id, profile.username, profile.display_name, category.value
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self._path)
+
+
+def _encode_profile_id(profile_id: ProfileId) -> List[object]:
+    return [profile_id.user_id, profile_id.username, profile_id.display_name]
+
+
+def _decode_profile_id(value: List[object]) -> ProfileId:
+    return ProfileId(user_id=value[0], username=value[1], display_name=value[2])  # type: ignore[arg-type]
+
+
+def _encode_activity(activity: ActivityHistogram) -> bytes:
+    """Строка JSON с авторами, затем записи (день, автор) двумя массивами int64."""
+    authors, days, author_ids = activity.export()
+    header = json.dumps([_encode_profile_id(author) for author in authors], ensure_ascii=False).encode()
+    return zlib.compress(header + b"\n" + array("q", days).tobytes() + array("q", author_ids).tobytes())
+
+
+def _decode_activity(blob: bytes) -> ActivityHistogram:
+    header, _, records = zlib.decompress(blob).partition(b"\n")
+    values = array("q")
+    values.frombytes(records)
+    half = len(values) // 2
+    authors = [_decode_profile_id(author) for author in json.loads(header)]
+    return ActivityHistogram.restore(authors, values[:half], values[half:])
+
+
+def _encode_provenance(provenance: ProvenanceIndex) -> bytes:
+    rows = [
+        [_encode_profile_id(profile_id), total, entries] for profile_id, total, entries in provenance.export()
+    ]
+    return zlib.compress(json.dumps({"cap": provenance.cap, "profiles": rows}, ensure_ascii=False).encode())
+
+
+def _decode_provenance(blob: bytes) -> ProvenanceIndex:
+    data = json.loads(zlib.decompress(blob))
+    rows = (
+        (_decode_profile_id(profile_id), total, [(message_id, role) for message_id, role in entries])
+        for profile_id, total, entries in data["profiles"]
+    )
+    return ProvenanceIndex.restore(data["cap"], rows)
@@ -0,0 +1,220 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Protocol, Tuple
+
+from ..domain.extraction import AudienceProfile, ExtractionResult
+from .telegram import TelegramAPIError
+
+logger = logging.getLogger(__name__)
+
+# Ответ Telegram «чат не найден / нет доступа»: запоминаем как отсутствие данных.
+_NOT_FOUND_STATUSES = {400, 403}
+_MAX_RETRIES = 2
+# Запрос не выполнен: дедлайн обогащения наступил раньше. В кэш не пишется.
+_EXPIRED = object()
+
+
+class ChatLookup(Protocol):
+    def get_chat(self, chat_id: str) -> Dict[str, Any]:
+        ...
+
+
+class TokenBucket:
+    """Ограничитель частоты: не больше ``rate`` запросов в секунду, всплеск до ``burst``."""
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self._rate = rate
+        self._capacity = max(burst, 1)
+        self._tokens = float(self._capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: Optional[float] = None) -> bool:
+        """Дождаться разрешения; False — если ждать пришлось бы дольше ``deadline`` (time.monotonic)."""
+        if self._rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self._rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def bucket_for_token(token: str, rate: float) -> TokenBucket:
+    """Общий лимит на токен бота: все обогатители с одним токеном делят одну корзину."""
+    with _buckets_lock:
+        bucket = _buckets.get(token)
+        if bucket is None:
+            bucket = _buckets[token] = TokenBucket(rate, burst=max(int(rate), 1))
+        return bucket
+
+
+class TTLDiskCache:
+    """JSON-файл ``{ключ: [время записи, значение]}``; значение None — «данных нет» (тоже кэшируется)."""
+
+    def __init__(self, path: str | Path, ttl_seconds: float, clock: Callable[[], float] = time.time) -> None:
+        self._path = Path(path)
+        self._ttl = ttl_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple[float, Optional[Dict[str, Any]]]] = {}
+        self._dirty = False
+        self._load()
+
+    def get(self, key: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """(найдено, значение); просроченные записи считаются отсутствующими."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or self._clock() - entry[0] > self._ttl:
+            return False, None
+        return True, entry[1]
+
+    def put(self, key: str, value: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._dirty = True
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._dirty:
+                return
+            now = self._clock()
+            fresh = {key: list(entry) for key, entry in self._entries.items() if now - entry[0] <= self._ttl}
+            self._dirty = False
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = self._path.with_suffix(self._path.suffix + ".tmp")
+        temporary.write_text(json.dumps(fresh, ensure_ascii=False), encoding="utf-8")
+        os.replace(temporary, self._path)
+
+    def _load(self) -> None:
+        try:
+            raw = json.loads(self._path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError):
+            logger.warning("enrichment_cache_unreadable", extra={"path": str(self._path)})
+            return
+        self._entries = {key: (float(entry[0]), entry[1]) for key, entry in raw.items()}
+
+
+class ProfileEnricher:
+    """Заполняет description (bio) профилей через getChat.
+
+    Запросы идут пачками в пуле из ``max_workers`` потоков, каждый — через
+    общий ограничитель частоты токена; ответы (и «не найдено») кэшируются на
+    диске с TTL. После ``timeout`` новые запросы не отправляются — профили
+    без ответа остаются без описания. Дату регистрации Bot API не отдаёт,
+    поэтому registered_at остаётся пустым.
+    """
+
+    def __init__(
+        self,
+        api: ChatLookup,
+        cache: TTLDiskCache,
+        limiter: TokenBucket,
+        max_workers: int = 4,
+        max_profiles: int = 500,
+    ) -> None:
+        self._api = api
+        self._cache = cache
+        self._limiter = limiter
+        self._max_workers = max(max_workers, 1)
+        self._max_profiles = max_profiles
+
+    def enrich(self, result: ExtractionResult, timeout: Optional[float] = None) -> int:
+        """Число профилей, у которых появилось описание."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        pending: Dict[str, None] = {}
+        details: Dict[str, Optional[Dict[str, Any]]] = {}
+        for _, profile in result.iter_entries():
+            key = self._lookup_key(profile)
+            if key is None or key in details or key in pending:
+                continue
+            found, value = self._cache.get(key)
+            if found:
+                details[key] = value
+            elif len(pending) < self._max_profiles:
+                pending[key] = None
+        cached = len(details)
+        expired = 0
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self._max_workers, len(pending))) as pool:
+                for key, value in zip(pending, pool.map(partial(self._fetch, deadline=deadline), pending)):
+                    if value is _EXPIRED:
+                        expired += 1
+                    else:
+                        details[key] = value
+            self._cache.flush()
+        updated = 0
+        for _, profile in list(result.iter_entries()):
+            key = self._lookup_key(profile)
+            value = details.get(key) if key is not None else None
+            description = self._description(value)
+            if description and description != profile.description:
+                result.update_profile(replace(profile, description=description))
+                updated += 1
+        logger.info(
+            "profiles_enriched",
+            extra={"requested": len(details) - cached, "cached": cached, "updated": updated, "expired": expired},
+        )
+        return updated
+
+    def _fetch(self, key: str, deadline: Optional[float] = None) -> Any:
+        for _ in range(_MAX_RETRIES + 1):
+            if deadline is not None and time.monotonic() >= deadline:
+                return _EXPIRED
+            if not self._limiter.acquire(deadline):
+                return _EXPIRED
+            try:
+                chat = self._api.get_chat(key)
+            except TelegramAPIError as exc:
+                if exc.status in _NOT_FOUND_STATUSES:
+                    self._cache.put(key, None)
+                    return None
+                if exc.status == 429:
+                    delay = exc.retry_after or 1.0
+                    if deadline is not None and time.monotonic() + delay > deadline:
+                        return _EXPIRED
+                    time.sleep(delay)
+                    continue
+                logger.warning("enrichment_lookup_failed", extra={"key": key, "error": str(exc)})
+                return None
+            # В кэш — только нужные поля, а не весь объект Chat.
+            value = {field: chat[field] for field in ("bio", "description") if chat.get(field)}
+            self._cache.put(key, value)
+            return value
+        return None
+
+    @staticmethod
+    def _lookup_key(profile: AudienceProfile) -> Optional[str]:
+        if profile.profile_id.user_id is not None:
+            return str(profile.profile_id.user_id)
+        username = (profile.username or "").strip().lstrip("@")
+        return f"@{username}" if username else None
+
+    @staticmethod
+    def _description(chat: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not chat:
+            return None
+        # У пользователей — bio, у каналов и групп — description.
+        return chat.get("bio") or chat.get("description") or None
@@ -42,8 +42,8 @@ class ExcelRendererAdapter:
                 ws.freeze_panes = "A2"
 
             # Данные
-            for row in sheet.rows:
-                ws.append([row.get(col, "") for col in sheet.columns])
+            for values in sheet.iter_values():
+                ws.append(list(values))
 
             if sheet.columns:
                 # Включаем автофильтр по всей таблице
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import List
+
 from ..application.usecases.dto import ExtractionResultDTO, ParsedMessagesDTO
 from ..application.usecases.ports import IExtractor
 from ..domain.extraction import AudienceExtractor
@@ -12,3 +14,7 @@ class ExtractionAdapter(IExtractor):
     def extract(self, parsed: ParsedMessagesDTO) -> ExtractionResultDTO:
         result = self._extractor.extract(parsed.messages)
         return ExtractionResultDTO(result=result)
+
+    def merge(self, partials: List[ExtractionResultDTO]) -> ExtractionResultDTO:
+        result = self._extractor.merge(partial.result for partial in partials)
+        return ExtractionResultDTO(result=result)
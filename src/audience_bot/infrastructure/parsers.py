@@ -3,11 +3,12 @@ from __future__ import annotations
 import io
 import json
 import zipfile
+from datetime import datetime
 from html.parser import HTMLParser
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Tuple
 
 from ..application.usecases.dto import RawFileDTO, ParsedMessagesDTO
-from ..domain.messages import ChatMessage
+from ..domain.messages import ChatMessage, TimeWindow, Watermark, WatermarkLookup, message_number, time_range
 
 
 class _HTMLMessageParser(HTMLParser):
@@ -114,42 +115,147 @@ class _HTMLMessageParser(HTMLParser):
 
 
 class ParserAdapter:
-    def parse(self, files: List[RawFileDTO]) -> ParsedMessagesDTO:
+    def parse(
+        self,
+        files: List[RawFileDTO],
+        window: Optional[TimeWindow] = None,
+        watermarks: Optional[WatermarkLookup] = None,
+    ) -> ParsedMessagesDTO:
+        """``watermarks`` — граница уже обработанной истории по id чата; записи до неё отбрасываются."""
+        if window is not None and not window.is_bounded:
+            window = None
         messages = []
+        # Адаптер общий для фоновых потоков, поэтому названия и id чатов собираем в локальные списки.
+        chat_names: List[str] = []
+        chats: List[Tuple[Optional[str], int]] = []
         for raw in files:
-            messages.extend(self._parse_file(raw))
-        if not messages:
+            messages.extend(self._parse_file(raw, window, chat_names, watermarks, chats))
+        if not messages and window is None and watermarks is None:
             raise ValueError("Парсер вернул пустой список сообщений.")
-        return ParsedMessagesDTO(messages=messages)
+        return ParsedMessagesDTO(messages=messages, chat_name=chat_names[0] if chat_names else None, chats=chats)
 
-    def _parse_file(self, file: RawFileDTO) -> List[ChatMessage]:
+    def _parse_file(
+        self,
+        file: RawFileDTO,
+        window: Optional[TimeWindow] = None,
+        chat_names: Optional[List[str]] = None,
+        watermarks: Optional[WatermarkLookup] = None,
+        chats: Optional[List[Tuple[Optional[str], int]]] = None,
+    ) -> List[ChatMessage]:
         if zipfile.is_zipfile(io.BytesIO(file.content)):
-            return self._parse_zip(file.content)
+            return self._parse_zip(file.content, window, chat_names, watermarks, chats)
         text = self._decode(file.content)
         if text.lstrip().startswith("{"):
-            return self._parse_json(text)
+            return self._parse_json(text, window, chat_names, watermarks, chats)
         if text.lstrip().startswith("<"):
-            return self._parse_html(text)
+            messages = self._parse_html(text, window, watermarks(None) if watermarks else None)
+            if chats is not None:
+                chats.append((None, len(messages)))
+            return messages
         raise ValueError(f"Неподдерживаемый формат файла {file.filename}")
 
-    def _parse_zip(self, blob: bytes) -> List[ChatMessage]:
+    def _parse_zip(
+        self,
+        blob: bytes,
+        window: Optional[TimeWindow] = None,
+        chat_names: Optional[List[str]] = None,
+        watermarks: Optional[WatermarkLookup] = None,
+        chats: Optional[List[Tuple[Optional[str], int]]] = None,
+    ) -> List[ChatMessage]:
         messages: List[ChatMessage] = []
         with zipfile.ZipFile(io.BytesIO(blob)) as archive:
             for member in archive.namelist():
                 with archive.open(member) as stream:
                     data = stream.read()
-                    messages.extend(self._parse_file(RawFileDTO(path=member, filename=member, content=data)))
+                    messages.extend(
+                        self._parse_file(
+                            RawFileDTO(path=member, filename=member, content=data),
+                            window,
+                            chat_names,
+                            watermarks,
+                            chats,
+                        )
+                    )
         return messages
 
     def _decode(self, data: bytes) -> str:
         return data.decode("utf-8", errors="ignore")
 
-    def _parse_json(self, text: str) -> List[ChatMessage]:
+    def _parse_json(
+        self,
+        text: str,
+        window: Optional[TimeWindow] = None,
+        chat_names: Optional[List[str]] = None,
+        watermarks: Optional[WatermarkLookup] = None,
+        chats: Optional[List[Tuple[Optional[str], int]]] = None,
+    ) -> List[ChatMessage]:
         payload = json.loads(text)
+        name = payload.get("name") if isinstance(payload.get("name"), str) else None
+        if chat_names is not None and name is not None:
+            chat_names.append(name)
+        chat_id = self._chat_id(payload)
+        watermark = watermarks(chat_id) if watermarks else None
         entries = payload.get("messages") or payload.get("chat_history") or []
-        return [ChatMessage.from_dict(entry) for entry in entries if isinstance(entry, dict)]
+        entries = [entry for entry in entries if isinstance(entry, dict)]
+        messages = [ChatMessage.from_dict(entry) for entry in self._select_entries(entries, window, watermark)]
+        if chats is not None:
+            chats.append((chat_id, len(messages)))
+        return messages
+
+    @staticmethod
+    def _chat_id(payload: Dict[str, Any]) -> Optional[str]:
+        """Id чата из экспорта: в отличие от названия, не совпадает у разных чатов."""
+        chat_id = payload.get("id")
+        if isinstance(chat_id, bool) or not isinstance(chat_id, (int, str)) or chat_id == "":
+            return None
+        return str(chat_id)
 
-    def _parse_html(self, text: str) -> List[ChatMessage]:
+    def _parse_html(
+        self, text: str, window: Optional[TimeWindow] = None, watermark: Optional[Watermark] = None
+    ) -> List[ChatMessage]:
         parser = _HTMLMessageParser()
         parser.feed(text)
-        return [ChatMessage.from_dict(entry) for entry in parser.get_messages()]
+        return [
+            ChatMessage.from_dict(entry) for entry in self._select_entries(parser.get_messages(), window, watermark)
+        ]
+
+    @staticmethod
+    def _ingested(entry: Dict[str, Any], watermark: Watermark) -> bool:
+        number = message_number(ChatMessage.peek_message_id(entry))
+        if number is not None and watermark.message_id is not None:
+            return number <= watermark.message_id
+        # Дату разбираем только для записей без номера — это дороже.
+        return watermark.covers(None, ChatMessage.peek_timestamp(entry))
+
+    @staticmethod
+    def _select_entries(
+        entries: List[Dict[str, Any]], window: Optional[TimeWindow], watermark: Optional[Watermark] = None
+    ) -> List[Dict[str, Any]]:
+        """Отсекаем записи вне периода и уже обработанные до построения ChatMessage.
+
+        Экспорты Telegram идут по времени, поэтому границы файла — даты первой и
+        последней датированной записи. Если период с ними не пересекается, даты
+        остальных записей не разбираются: остаются только записи без полей даты —
+        доказать, что они вне периода, нельзя (см. ``TimeWindow.contains``).
+        """
+        if watermark is not None:
+            entries = [entry for entry in entries if not ParserAdapter._ingested(entry, watermark)]
+        if window is None:
+            return entries
+        bounds = ParserAdapter._file_bounds(entries)
+        if bounds is not None and not window.overlaps(*bounds):
+            return [entry for entry in entries if ParserAdapter._undated(entry)]
+        return [entry for entry in entries if window.contains(ChatMessage.peek_timestamp(entry))]
+
+    @staticmethod
+    def _file_bounds(entries: List[Dict[str, Any]]) -> Optional[Tuple[datetime, datetime]]:
+        """Даты первой и последней датированной записи; разбираются только записи с краёв."""
+        first = next((stamp for stamp in map(ChatMessage.peek_timestamp, entries) if stamp is not None), None)
+        if first is None:
+            return None
+        last = next(stamp for stamp in map(ChatMessage.peek_timestamp, reversed(entries)) if stamp is not None)
+        return time_range((first, last))
+
+    @staticmethod
+    def _undated(entry: Dict[str, Any]) -> bool:
+        return entry.get("date") is None and entry.get("date_unixtime") is None
@@ -1,25 +1,48 @@
 from __future__ import annotations
 
 import logging
+from functools import partial
+from typing import BinaryIO
 
+from ..application.metrics import observe_stage
 from ..application.usecases.dto import ExtractionResultDTO, ReportDTO, ReportMetadataDTO
-from ..application.usecases.ports import IExcelRenderer, IReportBuilder
+from ..application.usecases.ports import IExcelRenderer, IReportBuilder, ITableWriter
 from ..domain.reporting import (
     AudienceReport,
+    DeltaReportBuilder,
     ExcelReportBuilder,
+    ExcelReport,
+    OverlapReportBuilder,
     ReportFormat,
     ReportMetadata,
+    ReportPackager,
     ReportPolicy,
+    SizeEstimate,
     TextListBuilder,
+    paginate,
 )
+from .table_export import TableReportWriter
 
 logger = logging.getLogger(__name__)
 
 
 class ReportingAdapter(IReportBuilder):
-    def __init__(self, renderer: IExcelRenderer, report_policy: ReportPolicy | None = None, force_excel: bool = False):
+    def __init__(
+        self,
+        renderer: IExcelRenderer,
+        report_policy: ReportPolicy | None = None,
+        force_excel: bool = False,
+        table_writer: ITableWriter | None = None,
+        force_format: ReportFormat | None = None,
+        packager: ReportPackager | None = None,
+    ):
         self._renderer = renderer
+        self._packager = packager or ReportPackager()
+        self._table_writer = table_writer or TableReportWriter()
+        self._force_format = force_format
         self._excel_builder = ExcelReportBuilder()
+        self._overlap_builder = OverlapReportBuilder()
+        self._delta_builder = DeltaReportBuilder()
         self._report_policy = report_policy or ReportPolicy()
         self._force_excel = force_excel
 
@@ -31,21 +54,83 @@ class ReportingAdapter(IReportBuilder):
             chat_name=metadata.chat_name,
             participant_count=extraction.result.participant_count(),
         )
-        format_choice = ReportFormat.EXCEL if self._force_excel else self._report_policy.choose(extraction.result)
+        format_choice = self._choose_format(extraction, metadata)
         report_model = AudienceReport()
         if format_choice == ReportFormat.PLAIN_TEXT:
             text_list = TextListBuilder.build(extraction.result)
             report_model.set_text(metadata_model, text_list)
             report_model.finalize()
-            joined_text = "\n".join(text_list.lines)
-            return ReportDTO(format=format_choice, text=joined_text)
+            lines = text_list.lines if extraction.delta is None else [*text_list.lines, "", extraction.delta.summary()]
+            # Страницы собираются по мере отправки: первая уходит, пока набираются следующие.
+            return ReportDTO(format=format_choice, pages=partial(paginate, lines))
         excel_model = self._excel_builder.build(extraction.result, metadata_model)
-        report_model.set_excel(metadata_model, excel_model)
+        if extraction.overlap is not None:
+            excel_model.sheets.extend(self._overlap_builder.build(extraction.overlap))
+        if extraction.delta is not None:
+            excel_model.sheets.append(self._delta_builder.build(extraction.delta))
+        report_model.set_excel(metadata_model, excel_model, format_choice)
         report_model.finalize()
 
         logger.info(
             "report_format_choice",
             extra={"report_format": format_choice.value, "participant_count": metadata_model.participant_count},
         )
-        excel_bytes = self._renderer.render(excel_model)
-        return ReportDTO(format=format_choice, excel_bytes=excel_bytes)
+        if format_choice != ReportFormat.EXCEL:
+            # Строки листов ленивые: выгрузка произойдёт при записи в приёмник.
+            return ReportDTO(
+                format=format_choice,
+                writer=partial(self._write_table, excel_model, format_choice),
+                filename=self._table_writer.filename(format_choice),
+            )
+        # Размер оценивается до рендеринга: xlsx, который нельзя отправить, не строим вовсе.
+        fitted = self._packager.fit_rows(excel_model)
+        estimate = self._packager.estimate(fitted)
+        if not self._packager.fits_xlsx(estimate):
+            return self._csv_bundle(excel_model, estimate)
+        with observe_stage("render", format_choice.value) as stage:
+            excel_bytes = self._renderer.render(fitted)
+            stage.bytes = len(excel_bytes)
+        return ReportDTO(format=format_choice, excel_bytes=excel_bytes, filename="audience-report.xlsx")
+
+    def _csv_bundle(self, excel_model: ExcelReport, estimate: SizeEstimate) -> ReportDTO:
+        """Листы отдельными CSV в zip; если и так не влезает — несколько архивов."""
+        parts = self._packager.partition(excel_model)
+        numbered = len(parts) > 1
+        files = [
+            ReportDTO(
+                format=ReportFormat.CSV_ZIP,
+                writer=partial(self._write_table, part, ReportFormat.CSV_ZIP),
+                filename=self._table_writer.filename(ReportFormat.CSV_ZIP, number if numbered else 0),
+            )
+            for number, part in enumerate(parts, start=1)
+        ]
+        limit_mb = self._packager.max_file_bytes / (1024 * 1024)
+        note = (
+            f"Отчёт слишком большой для Excel (≈{estimate.xlsx_bytes / (1024 * 1024):.0f} МБ при лимите "
+            f"{limit_mb:.0f} МБ), поэтому листы выгружены в CSV внутри zip"
+        )
+        note += f", частей: {len(files)}." if numbered else "."
+        logger.warning(
+            "report_packaged_as_csv",
+            extra={"rows": estimate.rows, "estimated_xlsx_bytes": estimate.xlsx_bytes, "files": len(files)},
+        )
+        first = files[0]
+        first.parts = files[1:]
+        first.note = note
+        return first
+
+    def _write_table(self, report: ExcelReport, report_format: ReportFormat, sink: BinaryIO) -> None:
+        """Потоковые выгрузки рендерятся при записи в приёмник — там и замеряются."""
+        with observe_stage("render", report_format.value):
+            self._table_writer.write(report, report_format, sink)
+
+    def _choose_format(self, extraction: ExtractionResultDTO, metadata: ReportMetadataDTO) -> ReportFormat:
+        """Явный запрос пользователя, затем REPORT_FORCE_*, затем порог участников."""
+        if metadata.requested_format is not None:
+            return metadata.requested_format
+        if self._force_format is not None:
+            return self._force_format
+        # Сравнение чатов выводится только дополнительными листами Excel.
+        if self._force_excel or extraction.overlap is not None:
+            return ReportFormat.EXCEL
+        return self._report_policy.choose(extraction.result)
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from contextlib import closing
+from typing import BinaryIO, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from ..domain.reporting import ExcelReport, ExcelReportBuilder, SheetModel
+
+# Колонки листов профилей → колонки таблицы profiles. Дата экспорта одна на
+# отчёт и хранится в metadata, а не в каждой строке.
+_PROFILE_FIELDS: Dict[str, str] = {
+    "user_id": "user_id",
+    "Username": "username",
+    "Отображаемое имя": "display_name",
+    "Имя": "first_name",
+    "Фамилия": "last_name",
+    "Описание": "description",
+    "Дата регистрации": "registered_at",
+    "Наличие канала": "has_channel",
+    ExcelReportBuilder.PROVENANCE_COLUMN: "provenance",
+}
+_EXPORTED_AT = "Дата экспорта"
+
+_SCHEMA = """
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE categories (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+CREATE TABLE profiles (
+    id INTEGER PRIMARY KEY,
+    category_id INTEGER NOT NULL REFERENCES categories (id),
+    user_id INTEGER,
+    username TEXT,
+    display_name TEXT,
+    first_name TEXT,
+    last_name TEXT,
+    description TEXT,
+    registered_at TEXT,
+    has_channel INTEGER NOT NULL DEFAULT 0,
+    provenance TEXT
+);
+"""
+_ACTIVITY_SCHEMA = """
+CREATE TABLE activity (
+    day TEXT PRIMARY KEY,
+    messages INTEGER NOT NULL,
+    unique_authors INTEGER NOT NULL
+);
+"""
+_EXTRA_SCHEMA = """
+CREATE TABLE sheet_rows (
+    sheet TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (sheet, position)
+);
+"""
+# Индексы строятся после загрузки: одна сортировка вместо обновления B-дерева на каждую вставку.
+_INDEXES = """
+CREATE INDEX profiles_by_user_id ON profiles (user_id);
+CREATE INDEX profiles_by_username ON profiles (username);
+CREATE INDEX profiles_by_category ON profiles (category_id);
+"""
+
+
+def _profile_sheets(report: ExcelReport) -> List[SheetModel]:
+    return [sheet for sheet in report.sheets if sheet.columns and sheet.columns[0] == _EXPORTED_AT]
+
+
+_INSERT_PROFILE = "INSERT INTO profiles (category_id, {}) VALUES (?, {})".format(
+    ", ".join(_PROFILE_FIELDS.values()), ", ".join("?" * len(_PROFILE_FIELDS))
+)
+_USER_ID = 0
+_HAS_CHANNEL = list(_PROFILE_FIELDS.values()).index("has_channel")
+
+
+def _profile_rows(category_id: int, sheet: SheetModel) -> Iterator[Tuple[object, ...]]:
+    """Кортежи для executemany в порядке _PROFILE_FIELDS; пустые строки → NULL."""
+    columns = sheet.columns
+    positions = [columns.index(header) if header in columns else None for header in _PROFILE_FIELDS]
+    for values in sheet.iter_values():
+        row: List[object] = [values[index] or None if index is not None else None for index in positions]
+        row[_USER_ID] = int(row[_USER_ID]) if row[_USER_ID] else None  # type: ignore[arg-type]
+        row[_HAS_CHANNEL] = 1 if row[_HAS_CHANNEL] else 0
+        yield (category_id, *row)
+
+
+class SqliteReportWriter:
+    """Отчёт файлом SQLite для аналитиков.
+
+    Таблицы: ``profiles`` (по строке на профиль, ``category_id`` → ``categories``),
+    ``metadata`` (ключ–значение), ``activity`` (если в отчёте есть гистограмма)
+    и ``sheet_rows`` (остальные листы строками JSON). Строки вставляются
+    ``executemany`` из ленивых источников листов в одной транзакции, без
+    журнала, индексы по user_id и username строятся после загрузки. База
+    собирается во временном файле и копируется в приёмник.
+    """
+
+    def write(self, report: ExcelReport, sink: BinaryIO) -> None:
+        with tempfile.TemporaryDirectory(prefix="audience-report-") as directory:
+            path = os.path.join(directory, "report.sqlite")
+            self.build(report, path)
+            with open(path, "rb") as database:
+                shutil.copyfileobj(database, sink)
+
+    def build(self, report: ExcelReport, path: str) -> None:
+        profile_sheets = _profile_sheets(report)
+        activity = next(
+            (sheet for sheet in report.sheets if sheet.name == ExcelReportBuilder.ACTIVITY_SHEET), None
+        )
+        tabular = {id(sheet) for sheet in profile_sheets} | {id(activity)}
+        extra = [sheet for sheet in report.sheets if id(sheet) not in tabular]
+        with closing(sqlite3.connect(path, isolation_level=None)) as connection:
+            # Временный файл: при сбое он всё равно удаляется, журнал и fsync не нужны.
+            connection.execute("PRAGMA journal_mode = OFF")
+            connection.execute("PRAGMA synchronous = OFF")
+            # executescript сам фиксирует открытую транзакцию, поэтому схема — до BEGIN.
+            connection.executescript(
+                _SCHEMA + (_ACTIVITY_SCHEMA if activity is not None else "") + (_EXTRA_SCHEMA if extra else "")
+            )
+            connection.execute("BEGIN")
+            connection.executemany(
+                "INSERT INTO metadata (key, value) VALUES (?, ?)", self._metadata(report, profile_sheets)
+            )
+            for category_id, sheet in enumerate(profile_sheets, start=1):
+                connection.execute("INSERT INTO categories (id, name) VALUES (?, ?)", (category_id, sheet.name))
+                connection.executemany(_INSERT_PROFILE, _profile_rows(category_id, sheet))
+            if activity is not None:
+                connection.executemany(
+                    "INSERT INTO activity (day, messages, unique_authors) VALUES (?, ?, ?)",
+                    ((day, int(messages), int(authors)) for day, messages, authors in activity.iter_values()),
+                )
+            if extra:
+                connection.executemany(
+                    "INSERT INTO sheet_rows (sheet, position, data) VALUES (?, ?, ?)",
+                    (
+                        (sheet.name, position, json.dumps(dict(zip(sheet.columns, values)), ensure_ascii=False))
+                        for sheet in extra
+                        for position, values in enumerate(sheet.iter_values())
+                    ),
+                )
+            connection.execute("COMMIT")
+            connection.executescript(_INDEXES)
+
+    @staticmethod
+    def _metadata(report: ExcelReport, profile_sheets: Sequence[SheetModel]) -> List[Tuple[str, Optional[str]]]:
+        items: List[Tuple[str, Optional[str]]] = [
+            ("profile_count", str(sum(sheet.row_count() for sheet in profile_sheets))),
+        ]
+        metadata = report.metadata
+        if metadata is not None:
+            items.append(("exported_at", metadata.exported_at.strftime("%Y-%m-%d %H:%M:%S")))
+            items.append(("chat_name", metadata.chat_name))
+            items.append(("participant_count", str(metadata.participant_count)))
+        return items
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+import re
+from typing import BinaryIO, Dict, Iterator, List
+from zipfile import ZIP_DEFLATED, ZipFile
+
+from ..domain.reporting import ExcelReport, ReportFormat, SheetModel
+from .sqlite_export import SqliteReportWriter
+
+SHEET_COLUMN = "Лист"
+
+_EXTENSIONS = {
+    ReportFormat.CSV: "csv",
+    ReportFormat.JSONL: "jsonl",
+    ReportFormat.CSV_ZIP: "zip",
+    ReportFormat.SQLITE: "sqlite",
+}
+_UNSAFE_FILENAME = re.compile(r"[\\/:*?\"<>|]+")
+
+
+def csv_sheets(report: ExcelReport) -> List[SheetModel]:
+    """Листы, попадающие в CSV: с теми же колонками, что и первый (таблица профилей)."""
+    if not report.sheets:
+        return []
+    columns = report.sheets[0].columns
+    return [sheet for sheet in report.sheets if sheet.columns == columns]
+
+
+def iter_jsonl(report: ExcelReport) -> Iterator[str]:
+    """По строке JSON на строку листа; имя листа — в поле «Лист»."""
+    for sheet in report.sheets:
+        columns = sheet.columns
+        for values in sheet.iter_values():
+            record = {SHEET_COLUMN: sheet.name}
+            record.update(zip(columns, values))
+            yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+class TableReportWriter:
+    """Потоковая запись отчёта в CSV, JSON Lines или SQLite, по желанию со сжатием gzip.
+
+    Строки берутся из ленивых источников листов и сразу уходят в приёмник
+    (буфер, файл, тело HTTP-загрузки) через небольшой буфер текстовой
+    обёртки — весь отчёт в памяти не собирается. В CSV — таблица профилей
+    всех категорий с колонкой «Лист»; дополнительные листы (активность,
+    сравнение чатов, изменения) с другими колонками выводятся только в JSONL
+    и в архиве CSV_ZIP, где у каждого листа свой файл. База SQLite собирается
+    во временном файле (см. ``SqliteReportWriter``) и копируется в приёмник.
+    """
+
+    def __init__(self, compress: bool = False) -> None:
+        self._compress = compress
+
+    def filename(self, report_format: ReportFormat, part: int = 0) -> str:
+        """Имя файла; ``part`` > 0 — номер части отчёта, разбитого на несколько файлов."""
+        stem = f"audience-report-{part}" if part else "audience-report"
+        name = f"{stem}.{_EXTENSIONS[report_format]}"
+        # Архив сжат сам по себе, gzip поверх zip не нужен.
+        return f"{name}.gz" if self._compress and report_format != ReportFormat.CSV_ZIP else name
+
+    def write(self, report: ExcelReport, report_format: ReportFormat, sink: BinaryIO) -> None:
+        if report_format not in _EXTENSIONS:
+            raise ValueError(f"Формат {report_format.value} не поддерживается потоковой выгрузкой.")
+        if report_format == ReportFormat.CSV_ZIP:
+            self._write_bundle(report, sink)
+            return
+        # mtime=0 — одинаковый отчёт даёт одинаковые байты и в сжатом виде.
+        target: BinaryIO = gzip.GzipFile(fileobj=sink, mode="wb", mtime=0) if self._compress else sink
+        if report_format == ReportFormat.SQLITE:
+            try:
+                SqliteReportWriter().write(report, target)
+            finally:
+                if target is not sink:
+                    target.close()
+            return
+        text = io.TextIOWrapper(target, encoding="utf-8", newline="", write_through=False)
+        try:
+            if report_format == ReportFormat.CSV:
+                self._write_csv(report, text)
+            else:
+                text.writelines(iter_jsonl(report))
+            text.flush()
+        finally:
+            # Отсоединяем обёртку, чтобы она не закрыла чужой приёмник.
+            text.detach()
+            if target is not sink:
+                target.close()
+
+    @staticmethod
+    def _write_bundle(report: ExcelReport, sink: BinaryIO) -> None:
+        """Каждый лист — отдельный CSV в zip; записи архива пишутся потоком, приёмнику не нужен seek."""
+        used: Dict[str, int] = {}
+        with ZipFile(sink, "w", ZIP_DEFLATED) as archive:
+            for sheet in report.sheets:
+                stem = _UNSAFE_FILENAME.sub("_", sheet.name) or "sheet"
+                used[stem] = used.get(stem, 0) + 1
+                name = f"{stem}.csv" if used[stem] == 1 else f"{stem} ({used[stem]}).csv"
+                with archive.open(name, "w", force_zip64=True) as entry:
+                    text = io.TextIOWrapper(entry, encoding="utf-8", newline="")
+                    writer = csv.writer(text)
+                    writer.writerow(sheet.columns)
+                    writer.writerows(sheet.iter_values())
+                    text.flush()
+                    text.detach()
+
+    @staticmethod
+    def _write_csv(report: ExcelReport, text: io.TextIOWrapper) -> None:
+        sheets = csv_sheets(report)
+        if not sheets:
+            return
+        writer = csv.writer(text)
+        writer.writerow([SHEET_COLUMN, *sheets[0].columns])
+        for sheet in sheets:
+            name = sheet.name
+            writer.writerows((name, *values) for values in sheet.iter_values())
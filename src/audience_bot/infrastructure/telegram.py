@@ -1,23 +1,36 @@
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict, deque
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 import io
 import json
 import logging
 import mimetypes
+import threading
 import time
 import urllib.error
 import urllib.parse
 import urllib.request
 import uuid
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Deque, Dict, Iterable, List, Optional, Tuple
 
 from ..application.services.conversation import BotResponse, ConversationService
 from ..application.usecases.dto import RawFileDTO
+from ..application.usecases.files import content_hash
 from ..application.config import TelegramConfig
+from ..application.metrics import StageObservation, file_format, observe_stage
+from ..application.tracing import start_span, traced
+from ..domain.messages import TimeWindow
+from ..domain.reporting import ReportFormat, paginate
 
 LOGGER = logging.getLogger(__name__)
 
+# Сколько страниц может ждать отправки, пока набираются следующие.
+_PAGES_IN_FLIGHT = 2
+
 
 @dataclass
 class TelegramDocument:
@@ -41,11 +54,35 @@ class BotController:
         self._api = api_adapter
 
     def handle_update(self, update: TelegramUpdateDTO) -> None:
-        response = self._route(update)
-        self._send_response(update.chat_id, response)
+        command = (update.command or "").split(maxsplit=1)[0].lower() if update.command else ""
+        with start_span("bot.route", command=command, document=update.document is not None):
+            response = self._route(update)
+        with start_span("bot.send_response", has_file=bool(response.file_bytes), is_error=response.is_error):
+            self._send_response(update.chat_id, response)
+
+    async def handle_update_async(self, update: TelegramUpdateDTO) -> None:
+        """То же для цикла событий: /process — через ``process_async``, остальное и отправка — в потоках."""
+        command = (update.command or "").split(maxsplit=1)[0].lower() if update.command else ""
+        with start_span("bot.route", command=command, document=update.document is not None):
+            cmd = (update.command or "").strip().lower()
+            if cmd.startswith("/process"):
+                try:
+                    options = self._process_options(cmd)
+                except ValueError as exc:
+                    response = BotResponse(text=str(exc), is_error=True)
+                else:
+                    response = await self._conversation.process_async(update.user_id, chat_name=None, **options)
+            else:
+                response = await asyncio.to_thread(self._route, update)
+        with start_span("bot.send_response", has_file=bool(response.file_bytes), is_error=response.is_error):
+            await asyncio.to_thread(self._send_response, update.chat_id, response)
 
     def _route(self, update: TelegramUpdateDTO) -> BotResponse:
         cmd = (update.command or "").strip().lower()
+        if cmd == "/find" or cmd.startswith("/find "):
+            return self._conversation.find(update.user_id, (update.command or "").strip()[len("/find"):])
+        if cmd == "/who" or cmd.startswith("/who "):
+            return self._conversation.who(update.user_id, (update.command or "").strip()[len("/who"):])
         if cmd == "/start":
             return self._conversation.start(update.user_id)
         if cmd in {"/help", "/?", "?"}:
@@ -55,16 +92,18 @@ class BotController:
         if cmd == "/status":
             return self._conversation.status(update.user_id)
         if cmd.startswith("/process"):
-            parts = cmd.split()
-            target = "auto"
-            if len(parts) > 1 and parts[1] in {"chat", "file"}:
-                target = parts[1]
-            return self._conversation.process(update.user_id, chat_name=None, target=target)
+            try:
+                options = self._process_options(cmd)
+            except ValueError as exc:
+                return BotResponse(text=str(exc), is_error=True)
+            return self._conversation.process(update.user_id, chat_name=None, **options)
         if update.document:
             document = update.document
             if document.content is None and document.file_id:
                 try:
-                    document.content = self._api.download_file(document.file_id)
+                    with observe_stage("download", file_format(document.filename)) as stage:
+                        document.content = self._api.download_file(document.file_id)
+                        stage.bytes = len(document.content)
                 except TelegramAPIError as exc:
                     LOGGER.exception("Не удалось загрузить файл по file_id=%s", document.file_id, exc_info=exc)
                     return BotResponse(text="Ошибка загрузки файла.", is_error=True)
@@ -77,17 +116,74 @@ class BotController:
             return self._conversation.upload_file(update.user_id, raw)
         return BotResponse(text="Неизвестная команда.", is_error=True)
 
+    @staticmethod
+    def _process_options(cmd: str) -> Dict[str, Any]:
+        """Аргументы /process; ValueError — если период указан неверно."""
+        options: Dict[str, Any] = {"target": "auto", "window": None, "compare": False, "report_format": None}
+        for part in cmd.split()[1:]:
+            if part in {"chat", "file"}:
+                options["target"] = part
+            elif part in {"csv", "jsonl", "sqlite"}:
+                options["report_format"] = ReportFormat(part)
+            elif part == "compare":
+                options["compare"] = True
+            else:
+                options["window"] = TimeWindow.from_spec(part)
+        return options
+
     def _send_response(self, chat_id: str, response: BotResponse) -> None:
         try:
             if response.file_bytes:
                 self._api.send_file(chat_id, response.file_bytes, response.filename or "audience-report.xlsx")
-            self._api.send_text(chat_id, response.text or "Готово.")
+            for filename, file_bytes in response.extra_files:
+                self._api.send_file(chat_id, file_bytes, filename)
+            text = response.text or "Готово."
+            # Любой ответ длиннее лимита сообщения уходит страницами, а не отказом Telegram.
+            if not self._send_pages(chat_id, response.pages if response.pages is not None else paginate([text])):
+                self._api.send_text(chat_id, text)
         except TelegramAPIError:
             LOGGER.exception("Ошибка отправки ответа Telegram.")
 
+    def _send_pages(self, chat_id: str, pages: Iterable[str]) -> int:
+        """Страницы по порядку, конвейером: пока одна уходит в Telegram, следующая уже набирается.
+
+        Отправляет один поток — порядок сообщений сохраняется; при ошибке
+        отправки оставшиеся страницы не отправляются. Возвращает число страниц.
+        """
+        pending: Deque["Future[None]"] = deque()
+        sent = 0
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="telegram-pages") as sender:
+            try:
+                for page in pages:
+                    # Копия контекста — чтобы отправка страницы попала в трассу апдейта.
+                    context = contextvars.copy_context()
+                    pending.append(sender.submit(context.run, self._send_page, chat_id, page))
+                    sent += 1
+                    if len(pending) > _PAGES_IN_FLIGHT:
+                        pending.popleft().result()
+                while pending:
+                    pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+        return sent
+
+    def _send_page(self, chat_id: str, page: str) -> None:
+        try:
+            self._api.send_text(chat_id, page)
+        except TelegramAPIError as exc:
+            # Серия сообщений подряд может упереться в лимит частоты — повторяем один раз.
+            if exc.status != 429:
+                raise
+            time.sleep(exc.retry_after or 1.0)
+            self._api.send_text(chat_id, page)
+
 
 class TelegramAPIError(Exception):
-    pass
+    def __init__(self, message: str = "", status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
 
 
 class TelegramAPIAdapter:
@@ -95,15 +191,64 @@ class TelegramAPIAdapter:
         self._config = config
         self._base_url = f"{self._config.base_url}/bot{self._config.token}"
         self._file_base = f"{self._config.file_base_url}/bot{self._config.token}"
+        # (хэш содержимого, имя файла) → file_id уже загруженного документа, LRU.
+        self._file_ids: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._file_ids_lock = threading.Lock()
 
+    @traced("telegram.send_text")
     def send_text(self, chat_id: str, text: str) -> None:
         self._post("sendMessage", {"chat_id": chat_id, "text": text})
 
     def send_file(self, chat_id: str, file_bytes: bytes, filename: str) -> None:
+        """Документ, уже загруженный ботом, отправляется по file_id — без повторной загрузки байтов."""
+        with observe_stage("upload", file_format(filename)) as stage:
+            self._send_document(chat_id, file_bytes, filename, stage)
+
+    def _send_document(self, chat_id: str, file_bytes: bytes, filename: str, stage: StageObservation) -> None:
+        key = (content_hash(file_bytes), filename)
+        file_id = self._cached_file_id(key)
+        if file_id is not None:
+            try:
+                self._post("sendDocument", {"chat_id": chat_id, "document": file_id})
+                return
+            except TelegramAPIError as exc:
+                # file_id мог устареть — забываем его и загружаем файл заново.
+                if exc.status != 400:
+                    raise
+                self._forget_file_id(key)
         content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
         fields = {"chat_id": chat_id}
         files = [("document", filename, file_bytes, content_type)]
-        self._multipart_post("sendDocument", fields, files)
+        payload = self._multipart_post("sendDocument", fields, files)
+        stage.bytes = len(file_bytes)
+        document = (payload.get("result") or {}).get("document") or {}
+        if document.get("file_id"):
+            self._remember_file_id(key, document["file_id"])
+
+    def _cached_file_id(self, key: Tuple[str, str]) -> Optional[str]:
+        with self._file_ids_lock:
+            file_id = self._file_ids.get(key)
+            if file_id is not None:
+                self._file_ids.move_to_end(key)
+            return file_id
+
+    def _remember_file_id(self, key: Tuple[str, str], file_id: str) -> None:
+        with self._file_ids_lock:
+            self._file_ids[key] = file_id
+            self._file_ids.move_to_end(key)
+            while len(self._file_ids) > self._config.file_id_cache_size:
+                self._file_ids.popitem(last=False)
+
+    def _forget_file_id(self, key: Tuple[str, str]) -> None:
+        with self._file_ids_lock:
+            self._file_ids.pop(key, None)
+
+    def get_chat(self, chat_id: str) -> Dict[str, Any]:
+        """Объект Chat из getChat: ``chat_id`` — числовой id или ``@username``."""
+        payload = self._post("getChat", {"chat_id": chat_id})
+        if not payload.get("ok"):
+            raise TelegramAPIError(payload.get("description") or "getChat вернул ошибку.")
+        return payload.get("result") or {}
 
     def download_file(self, file_id: str) -> bytes:
         payload = self._post("getFile", {"file_id": file_id})
@@ -158,7 +303,7 @@ class TelegramAPIAdapter:
             with urllib.request.urlopen(req, timeout=30) as response:
                 body = response.read()
         except urllib.error.HTTPError as exc:
-            raise TelegramAPIError(f"HTTP {exc.code}") from exc
+            raise TelegramAPIError(f"HTTP {exc.code}", status=exc.code, retry_after=self._retry_after(exc)) from exc
         except Exception as exc:
             raise TelegramAPIError("Не удалось выполнить вызов Telegram API.") from exc
         try:
@@ -166,6 +311,16 @@ class TelegramAPIAdapter:
         except json.JSONDecodeError as exc:
             raise TelegramAPIError("Некорректный JSON от Telegram.") from exc
 
+    @staticmethod
+    def _retry_after(error: urllib.error.HTTPError) -> Optional[float]:
+        """Telegram сообщает паузу для 429 в ``parameters.retry_after``."""
+        try:
+            payload = json.loads(error.read() or b"{}")
+        except (OSError, ValueError):
+            return None
+        retry_after = (payload.get("parameters") or {}).get("retry_after")
+        return float(retry_after) if isinstance(retry_after, (int, float)) else None
+
 
 class ConsoleTelegramAPIAdapter:
     def send_text(self, chat_id: str, text: str) -> None:
@@ -188,8 +343,27 @@ class TelegramWebhookAdapter:
         self._controller = controller
 
     def handle_request(self, payload: Dict[str, Any]) -> None:
-        update = self._normalize(payload)
-        self._controller.handle_update(update)
+        """Корневой спан апдейта: его trace_id связывает все этапы обработки и ответа."""
+        with start_span("telegram.update", update_id=payload.get("update_id", "")) as span:
+            message = payload.get("message") or payload.get("edited_message") or {}
+            if isinstance(message.get("date"), (int, float)):
+                # Сколько апдейт ждал в очереди Telegram и в цикле long polling до начала обработки.
+                span.set_attribute("queue_delay_seconds", round(max(time.time() - message["date"], 0.0), 3))
+            update = self._normalize(payload)
+            self._controller.handle_update(update)
+
+    async def handle_request_async(self, payload: Dict[str, Any]) -> None:
+        with start_span("telegram.update", update_id=payload.get("update_id", "")) as span:
+            message = payload.get("message") or payload.get("edited_message") or {}
+            if isinstance(message.get("date"), (int, float)):
+                span.set_attribute("queue_delay_seconds", round(max(time.time() - message["date"], 0.0), 3))
+            await self._controller.handle_update_async(self._normalize(payload))
+
+    @staticmethod
+    def sender_key(payload: Dict[str, Any]) -> str:
+        """Чей это апдейт: апдейты одного пользователя обрабатываются строго по порядку."""
+        message = payload.get("message") or payload.get("edited_message") or payload
+        return str(message.get("from", {}).get("id") or message.get("chat", {}).get("id", ""))
 
     def _normalize(self, payload: Dict[str, Any]) -> TelegramUpdateDTO:
         message = payload.get("message") or payload.get("edited_message") or payload
@@ -219,25 +393,64 @@ class TelegramPollingService:
 
     def run(self) -> None:
         LOGGER.info("Запуск long polling (token=%s)", self._config.token[:8])
-        offset: Optional[int] = None
-        self._running = True
         try:
-            while self._running:
-                params = {"timeout": self._config.poll_timeout}
-                if offset:
-                    params["offset"] = offset
-                url = f"{self._base_url}/getUpdates?{urllib.parse.urlencode(params)}"
-                try:
-                    with urllib.request.urlopen(url, timeout=self._config.poll_timeout + 5) as response:
-                        payload = json.load(response)
-                except Exception as exc:
-                    LOGGER.exception("Polling error")
-                    time.sleep(self._config.poll_interval)
-                    continue
-                for update in payload.get("result", []):
-                    offset = update.get("update_id", offset)
-                    if offset is not None:
-                        offset += 1
-                    self._adapter.handle_request(update)
+            asyncio.run(self.run_async())
         except KeyboardInterrupt:
             LOGGER.info("Long polling остановлен пользователем.")
+
+    def stop(self) -> None:
+        self._running = False
+
+    async def run_async(self) -> None:
+        """Апдейты разных пользователей обрабатываются параллельно, одного пользователя — по порядку.
+
+        Пока строится чей-то отчёт, бот отвечает остальным: getUpdates и
+        блокирующие вызовы идут в потоках, этапы пайплайна — в его пуле.
+        """
+        offset: Optional[int] = None
+        # Последняя задача каждого пользователя: следующая ждёт её завершения.
+        tails: Dict[str, "asyncio.Task[None]"] = {}
+        self._running = True
+        while self._running:
+            try:
+                with start_span("telegram.poll") as span:
+                    payload = await asyncio.to_thread(self._get_updates, offset)
+                    span.set_attribute("updates", len(payload.get("result", [])))
+            except Exception:
+                LOGGER.exception("Polling error")
+                await asyncio.sleep(self._config.poll_interval)
+                continue
+            for update in payload.get("result", []):
+                offset = update.get("update_id", offset)
+                if offset is not None:
+                    offset += 1
+                self._dispatch(update, tails)
+        if tails:
+            await asyncio.gather(*tails.values(), return_exceptions=True)
+
+    def _get_updates(self, offset: Optional[int]) -> Dict[str, Any]:
+        params = {"timeout": self._config.poll_timeout}
+        if offset:
+            params["offset"] = offset
+        url = f"{self._base_url}/getUpdates?{urllib.parse.urlencode(params)}"
+        with urllib.request.urlopen(url, timeout=self._config.poll_timeout + 5) as response:
+            return json.load(response)
+
+    def _dispatch(self, update: Dict[str, Any], tails: Dict[str, "asyncio.Task[None]"]) -> None:
+        key = TelegramWebhookAdapter.sender_key(update)
+        task = asyncio.create_task(self._handle_in_order(tails.get(key), update))
+        tails[key] = task
+
+        def forget(done: "asyncio.Task[None]") -> None:
+            if tails.get(key) is done:
+                del tails[key]
+
+        task.add_done_callback(forget)
+
+    async def _handle_in_order(self, previous: Optional["asyncio.Task[None]"], update: Dict[str, Any]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await self._adapter.handle_request_async(update)
+        except Exception:
+            LOGGER.exception("Ошибка обработки апдейта %s", update.get("update_id"))
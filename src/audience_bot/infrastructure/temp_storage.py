@@ -7,7 +7,7 @@ from pathlib import Path
 from typing import Dict, List, Optional
 import uuid
 
-from ..application.usecases.files import TempFileRef
+from ..application.usecases.files import TempFileRef, content_hash
 
 
 class TempFileStorageError(Exception):
@@ -30,6 +30,7 @@ class TempFileStorageAdapter:
             filename=filename,
             mime_type=mime_type,
             size_bytes=len(content),
+            content_hash=content_hash(content),
         )
 
     def read(self, ref: TempFileRef) -> bytes:
@@ -41,6 +42,15 @@ class TempFileStorageAdapter:
     def delete(self, ref: TempFileRef) -> None:
         self._delete_path(ref.path)
 
+    def total_bytes(self) -> int:
+        total = 0
+        for entry in self._base_dir.iterdir():
+            try:
+                total += entry.stat().st_size
+            except OSError:
+                continue
+        return total
+
     def _delete_path(self, path: Path) -> None:
         try:
             path.unlink()
@@ -78,6 +88,7 @@ class InMemoryTempStorageAdapter:
             size_bytes=len(content),
             mime_type=mime_type,
             created_at=datetime.now(timezone.utc),
+            content_hash=content_hash(content),
         )
 
     def read(self, ref: TempFileRef) -> bytes:
@@ -88,3 +99,6 @@ class InMemoryTempStorageAdapter:
 
     def delete(self, ref: TempFileRef) -> None:
         self._storage.pop(ref.id, None)
+
+    def total_bytes(self) -> int:
+        return sum(len(content) for content in list(self._storage.values()))
@@ -0,0 +1,253 @@
+"""Детерминированные синтетические экспорты Telegram для тестов и бенчмарков.
+
+Один и тот же ``SyntheticExportSpec`` (вместе с ``seed``) всегда даёт побайтно
+одинаковый файл. Формы записей повторяют экспорт Telegram Desktop: ``from``/``from_id``,
+упоминания в ``text_entities``, ``forwarded_from``/``forwarded_from_id``, сервисные
+сообщения с ``actor``; удалённые аккаунты — ``"from": null``. HTML размечен
+data-атрибутами, которые понимает ``ParserAdapter``.
+
+Запуск из консоли::
+
+    python tests/synthetic_export.py --messages 100000 --format zip -o big.zip
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import random
+import zipfile
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from html import escape
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+_FIRST_NAMES = ("Алексей", "Мария", "Иван", "Ольга", "Дмитрий", "Анна", "Сергей", "Елена", "Павел", "Ксения",
+                "John", "Emma", "Liam", "Sofia", "Noah", "Mia")
+_LAST_NAMES = ("Иванов", "Смирнова", "Кузнецов", "Попова", "Соколов", "Лебедева", "Novak", "Smith", "Garcia", "Kim")
+_WORDS = ("привет", "всем", "кто", "знает", "как", "настроить", "бот", "отчёт", "спасибо", "завтра", "встреча",
+          "ссылка", "чат", "вопрос", "ответ", "update", "release", "ok", "да", "нет")
+_DELETED_NAME = "Deleted Account"
+_START = datetime(2024, 1, 1, 9, 0, 0)
+
+
+@dataclass(frozen=True)
+class SyntheticExportSpec:
+    """Параметры экспорта; доли — вероятности на сообщение (или на автора для ``deleted_ratio``)."""
+
+    messages: int = 1_000
+    authors: int = 100
+    # Люди, которых только упоминают: отдельный пул, не пересекается с авторами.
+    mentioned_only: int = 50
+    mention_density: float = 0.2
+    forward_ratio: float = 0.05
+    channel_forward_ratio: float = 0.5
+    channels: int = 10
+    deleted_ratio: float = 0.02
+    service_ratio: float = 0.02
+    username_ratio: float = 0.7
+    chat_name: str = "Synthetic chat"
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class _Person:
+    user_id: int
+    first_name: str
+    last_name: Optional[str]
+    username: Optional[str]
+    deleted: bool = False
+
+    @property
+    def name(self) -> str:
+        return f"{self.first_name} {self.last_name}" if self.last_name else self.first_name
+
+
+def _people(rng: random.Random, count: int, first_id: int, spec: SyntheticExportSpec, deletable: bool) -> List[_Person]:
+    people = []
+    for offset in range(count):
+        user_id = first_id + offset
+        people.append(
+            _Person(
+                user_id=user_id,
+                first_name=rng.choice(_FIRST_NAMES),
+                last_name=rng.choice(_LAST_NAMES) if rng.random() < 0.8 else None,
+                # Username по id, чтобы он был уникален и без учёта регистра.
+                username=f"user{user_id}" if rng.random() < spec.username_ratio else None,
+                deleted=deletable and rng.random() < spec.deleted_ratio,
+            )
+        )
+    return people
+
+
+def _mentionable(people: List[_Person]) -> List[_Person]:
+    return [person for person in people if person.username and not person.deleted]
+
+
+def generate_entries(spec: SyntheticExportSpec) -> Iterator[Dict[str, object]]:
+    """Записи ``messages`` в формате JSON-экспорта, по одной, без списка в памяти."""
+    rng = random.Random(spec.seed)
+    authors = _people(rng, max(spec.authors, 1), 1_000_000, spec, deletable=True)
+    mentioned = _people(rng, spec.mentioned_only, 5_000_000, spec, deletable=False)
+    targets = _mentionable(authors) + _mentionable(mentioned)
+    channels = [(9_000_000 + idx, f"Канал {idx}") for idx in range(max(spec.channels, 1))]
+    moment = _START
+    for message_id in range(1, spec.messages + 1):
+        moment += timedelta(seconds=rng.randint(1, 600))
+        author = rng.choice(authors)
+        entry: Dict[str, object] = {
+            "id": message_id,
+            "type": "message",
+            "date": moment.isoformat(),
+            "date_unixtime": str(int(moment.timestamp())),
+        }
+        if rng.random() < spec.service_ratio:
+            entry.update(
+                type="service",
+                actor=author.name,
+                actor_id=f"user{author.user_id}",
+                action="invite_members",
+                members=[rng.choice(authors).name],
+                text="",
+                text_entities=[],
+            )
+            yield entry
+            continue
+        entry["from"] = None if author.deleted else author.name
+        entry["from_id"] = f"user{author.user_id}"
+        if author.username and not author.deleted:
+            entry["from_username"] = author.username
+        words = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(2, 12)))
+        entities: List[Dict[str, object]] = [{"type": "plain", "text": words}]
+        text = words
+        if targets and rng.random() < spec.mention_density:
+            for target in rng.sample(targets, k=min(rng.randint(1, 3), len(targets))):
+                handle = f"@{target.username}"
+                text += f" {handle}"
+                entities += [{"type": "plain", "text": " "}, {"type": "mention", "text": handle}]
+        entry["text"] = text
+        entry["text_entities"] = entities
+        if rng.random() < spec.forward_ratio:
+            if rng.random() < spec.channel_forward_ratio:
+                channel_id, channel_name = rng.choice(channels)
+                entry["forwarded_from"] = channel_name
+                entry["forwarded_from_id"] = f"channel{channel_id}"
+            else:
+                source = rng.choice(authors)
+                entry["forwarded_from"] = source.name
+                entry["forwarded_from_id"] = f"user{source.user_id}"
+        yield entry
+
+
+def write_json(spec: SyntheticExportSpec, stream: BinaryIO) -> None:
+    """Потоковая запись ``result.json``: память не растёт с числом сообщений."""
+    head = {"name": spec.chat_name, "type": "private_supergroup", "id": 1_000_000_000 + spec.seed}
+    stream.write(json.dumps(head, ensure_ascii=False)[:-1].encode("utf-8"))
+    stream.write(b', "messages": [\n')
+    for index, entry in enumerate(generate_entries(spec)):
+        if index:
+            stream.write(b",\n")
+        stream.write(json.dumps(entry, ensure_ascii=False).encode("utf-8"))
+    stream.write(b"\n]}\n")
+
+
+def _html_message(entry: Dict[str, object]) -> str:
+    message_id = entry["id"]
+    stamp = escape(str(entry["date"]))
+    if entry["type"] == "service":
+        return (
+            f'<div class="message service" id="message{message_id}" data-id="{message_id}" data-date="{stamp}">'
+            f'<div class="body details">{escape(str(entry["actor"]))} invited members</div></div>\n'
+        )
+    attributes = [f'data-id="{message_id}"', f'data-date="{stamp}"']
+    author_name = entry["from"]
+    attributes.append(f'data-author-id="{str(entry["from_id"]).removeprefix("user")}"')
+    if author_name is None:
+        author_name = _DELETED_NAME
+        attributes.append('data-author-deleted="1"')
+    first_name, _, last_name = str(author_name).partition(" ")
+    attributes.append(f'data-author-first-name="{escape(first_name)}"')
+    if last_name:
+        attributes.append(f'data-author-last-name="{escape(last_name)}"')
+    if entry.get("from_username"):
+        attributes.append(f'data-author-username="{escape(str(entry["from_username"]))}"')
+    handles = [entity["text"] for entity in entry["text_entities"] if entity["type"] == "mention"]  # type: ignore[index, union-attr]
+    if handles:
+        usernames = ",".join(escape(str(handle)) for handle in handles)
+        attributes.append(f'data-mention-usernames="{usernames}"')
+    forwarded = ""
+    if "forwarded_from" in entry:
+        forwarded = f'<div class="forwarded body">{escape(str(entry["forwarded_from"]))}</div>'
+    return (
+        f'<div class="message default clearfix" id="message{message_id}" {" ".join(attributes)}>'
+        f'<div class="body"><div class="pull_right date details" title="{stamp}">{stamp[11:16]}</div>'
+        f'<div class="from_name">{escape(str(author_name))}</div>{forwarded}'
+        f'<div class="text">{escape(str(entry["text"]))}</div></div></div>\n'
+    )
+
+
+def write_html(spec: SyntheticExportSpec, stream: BinaryIO) -> None:
+    stream.write(
+        (
+            '<!DOCTYPE html>\n<html><head><meta charset="utf-8"/><title>Exported Data</title></head>\n'
+            '<body><div class="page_wrap"><div class="page_header"><div class="content">'
+            f'<div class="text bold">{escape(spec.chat_name)}</div></div></div>\n'
+            '<div class="page_body chat_page"><div class="history">\n'
+        ).encode("utf-8")
+    )
+    for entry in generate_entries(spec):
+        stream.write(_html_message(entry).encode("utf-8"))
+    stream.write(b"</div></div></div></body></html>\n")
+
+
+def export_bytes(spec: SyntheticExportSpec, fmt: str = "json") -> bytes:
+    """Экспорт целиком: ``json``, ``html`` или ``zip`` (``result.json`` внутри архива, как у Telegram Desktop)."""
+    buffer = io.BytesIO()
+    if fmt == "json":
+        write_json(spec, buffer)
+    elif fmt == "html":
+        write_html(spec, buffer)
+    elif fmt == "zip":
+        with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open("result.json", "w") as member:
+                write_json(spec, member)  # type: ignore[arg-type]
+    else:
+        raise ValueError(f"Неизвестный формат синтетического экспорта: {fmt}")
+    return buffer.getvalue()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Сгенерировать синтетический экспорт Telegram-чата.")
+    parser.add_argument("--messages", type=int, default=SyntheticExportSpec.messages)
+    parser.add_argument("--authors", type=int, default=SyntheticExportSpec.authors)
+    parser.add_argument("--mentioned-only", type=int, default=SyntheticExportSpec.mentioned_only)
+    parser.add_argument("--mention-density", type=float, default=SyntheticExportSpec.mention_density)
+    parser.add_argument("--forward-ratio", type=float, default=SyntheticExportSpec.forward_ratio)
+    parser.add_argument("--channels", type=int, default=SyntheticExportSpec.channels)
+    parser.add_argument("--deleted-ratio", type=float, default=SyntheticExportSpec.deleted_ratio)
+    parser.add_argument("--seed", type=int, default=SyntheticExportSpec.seed)
+    parser.add_argument("--format", choices=("json", "html", "zip"), default="json")
+    parser.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+    spec = SyntheticExportSpec(
+        messages=args.messages,
+        authors=args.authors,
+        mentioned_only=args.mentioned_only,
+        mention_density=args.mention_density,
+        forward_ratio=args.forward_ratio,
+        channels=args.channels,
+        deleted_ratio=args.deleted_ratio,
+        seed=args.seed,
+    )
+    with open(args.output, "wb") as stream:
+        if args.format == "json":
+            write_json(spec, stream)
+        elif args.format == "html":
+            write_html(spec, stream)
+        else:
+            stream.write(export_bytes(spec, "zip"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import asyncio
+import csv
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+from dependency_injector import providers
+
+from audience_bot.application.config import PipelineConfig, TelegramConfig
+from audience_bot.application.container import AppContainer
+from audience_bot.application.services.conversation import NO_AUDIENCE_TEXT, ConversationService
+from audience_bot.application.services.report_cache import ReportCache
+from audience_bot.application.services.sessions import InMemorySessionStore
+from audience_bot.application.usecases.dto import ExtractionResultDTO, ParsedMessagesDTO, RawFileDTO, ReportDTO
+from audience_bot.application.usecases.exceptions import PipelineCancelledError
+from audience_bot.application.usecases.pipeline import (
+    BuildAudienceReportUC,
+    ExtractAudienceUC,
+    ParseChatExportUC,
+    RunFullPipelineUC,
+)
+from audience_bot.cli import create_pipeline
+from audience_bot.domain.reporting import ReportFormat
+from audience_bot.infrastructure.telegram import TelegramPollingService
+from audience_bot.infrastructure.temp_storage import InMemoryTempStorageAdapter
+
+
+def _sample() -> RawFileDTO:
+    return RawFileDTO(path="<sample>", filename="sample.json", content=Path("tests/data/sample.json").read_bytes())
+
+
+def _csv_rows(report: ReportDTO) -> list:
+    """Строки CSV-отчёта без «Даты экспорта»: она зависит от секунды, в которую собран отчёт."""
+    rows = list(csv.DictReader(io.StringIO(report.file_bytes().decode("utf-8-sig"))))
+    for row in rows:
+        row.pop("Дата экспорта", None)
+    return rows
+
+
+def test_execute_async_matches_execute():
+    pipeline = create_pipeline()
+
+    report = asyncio.run(pipeline.execute_async([_sample()], chat_name=None, user_id="u", report_format=ReportFormat.CSV))
+
+    expected = pipeline.execute([_sample()], chat_name=None, user_id="u", report_format=ReportFormat.CSV)
+    assert _csv_rows(report) == _csv_rows(expected)
+
+
+def test_execute_async_in_process_pool():
+    container = AppContainer()
+    container.pipeline_config.override(providers.Object(PipelineConfig(pipeline_executor="process", pipeline_workers=1)))
+    try:
+        report = asyncio.run(
+            container.pipeline().execute_async([_sample()], chat_name=None, user_id="u", report_format=ReportFormat.CSV)
+        )
+    finally:
+        container.pipeline_executor().shutdown()
+
+    expected = create_pipeline().execute([_sample()], chat_name=None, user_id="u", report_format=ReportFormat.CSV)
+    # Отчёт из другого процесса уже отрендерен; аудитория доступна для /find и /who.
+    assert report.file_bytes().splitlines()[0] == expected.file_bytes().splitlines()[0]
+    assert len(report.file_bytes().splitlines()) == len(expected.file_bytes().splitlines())
+    assert report.audience.participant_count() == expected.audience.participant_count()
+
+
+class BlockingParser:
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def parse(self, files, window=None, watermarks=None):
+        self.entered.set()
+        self.release.wait(5)
+        return ParsedMessagesDTO(messages=[object()])
+
+
+class RecordingExtractor:
+    def __init__(self):
+        self.calls = 0
+
+    def extract(self, parsed):
+        self.calls += 1
+        return ExtractionResultDTO(result=object())
+
+
+def test_cancelled_execute_async_stops_at_next_stage():
+    parser, extractor = BlockingParser(), RecordingExtractor()
+    executor = ThreadPoolExecutor(max_workers=1)
+    pipeline = RunFullPipelineUC(
+        parser_uci=ParseChatExportUC(parser),
+        extractor_uc=ExtractAudienceUC(extractor),
+        reporting_uc=BuildAudienceReportUC(None),
+        config=PipelineConfig(),
+        executor=executor,
+    )
+
+    async def scenario():
+        task = asyncio.create_task(pipeline.execute_async([_sample()], chat_name=None, user_id="u"))
+        await asyncio.to_thread(parser.entered.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(scenario())
+    parser.release.set()
+    executor.shutdown(wait=True)
+
+    assert extractor.calls == 0
+
+
+def test_async_cache_computes_once_for_concurrent_requests():
+    cache = ReportCache(max_bytes=1024, ttl_seconds=60)
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return ReportDTO(format=ReportFormat.PLAIN_TEXT, text="report")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_or_compute_async("k", compute) for _ in range(3)))
+
+    reports = asyncio.run(scenario())
+
+    assert len(calls) == 1
+    assert [report.text for report in reports] == ["report"] * 3
+
+
+def test_async_cache_reports_cancellation_to_waiters():
+    cache = ReportCache(max_bytes=1024, ttl_seconds=60)
+
+    async def compute():
+        await asyncio.sleep(10)
+
+    async def scenario():
+        owner = asyncio.create_task(cache.get_or_compute_async("k", compute))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_compute_async("k", compute))
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        with pytest.raises(PipelineCancelledError):
+            await waiter
+
+    asyncio.run(scenario())
+
+
+def test_process_async_builds_report_and_clears_session():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        service = ConversationService(
+            InMemorySessionStore(),
+            create_pipeline(),
+            InMemoryTempStorageAdapter(),
+            PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024),
+            executor=executor,
+        )
+        service.upload_file("u", _sample())
+
+        response = asyncio.run(service.process_async("u", chat_name=None, report_format=ReportFormat.CSV))
+
+    assert not response.is_error
+    assert response.filename == "audience-report.csv"
+    assert service.status("u").text == "Файлы не загружены."
+    assert service.find("u", "a").text != NO_AUDIENCE_TEXT
+
+
+class RecordingAdapter:
+    def __init__(self):
+        self.events = []
+        self.other_user_done = None
+
+    async def handle_request_async(self, update):
+        number = update["update_id"]
+        self.events.append(("start", number))
+        if number == 1:
+            # Долгий отчёт первого пользователя ждёт, пока ответят второму.
+            await asyncio.wait_for(self.other_user_done.wait(), 5)
+        if number == 3:
+            self.other_user_done.set()
+        self.events.append(("end", number))
+
+
+def test_polling_serves_other_users_while_keeping_per_user_order():
+    adapter = RecordingAdapter()
+    config = TelegramConfig(token="t", poll_interval=1, poll_timeout=1, base_url="http://x", file_base_url="http://x")
+    service = TelegramPollingService(adapter, config)
+
+    async def scenario():
+        adapter.other_user_done = asyncio.Event()
+        tails = {}
+        for number, user in [(1, "a"), (2, "a"), (3, "b")]:
+            service._dispatch({"update_id": number, "message": {"from": {"id": user}, "chat": {"id": user}}}, tails)
+        await asyncio.wait_for(asyncio.gather(*tails.values()), 5)
+
+    asyncio.run(scenario())
+
+    events = adapter.events
+    assert events.index(("end", 3)) < events.index(("end", 1))
+    assert events.index(("end", 1)) < events.index(("start", 2))
@@ -0,0 +1,116 @@
+from datetime import datetime
+
+from audience_bot.domain.extraction import AudienceProfile, ExtractionResult, ProfileId, ProfileType
+from audience_bot.domain.extraction.delta import CHANGE_CATEGORY, CHANGE_GONE, CHANGE_NEW
+from audience_bot.domain.reporting import DeltaReportBuilder
+from audience_bot.infrastructure.audience_store import SqliteAudienceStore
+
+
+def _result(*entries):
+    result = ExtractionResult()
+    for user_id, category in entries:
+        profile_id = ProfileId(user_id=user_id, username=f"@u{user_id}", display_name=f"User {user_id}")
+        profile = AudienceProfile(
+            profile_id=profile_id, profile_type=category, username=f"@u{user_id}", display_name=f"User {user_id}"
+        )
+        result.add(profile, category)
+    return result
+
+
+def test_store_reports_new_gone_and_changed_between_runs(tmp_path):
+    store = SqliteAudienceStore(tmp_path / "audience.sqlite")
+    first = store.record(
+        "Chat",
+        _result((1, ProfileType.PARTICIPANT), (2, ProfileType.PARTICIPANT), (3, ProfileType.MENTIONED_ONLY)),
+        run_at=datetime(2025, 1, 1, 12),
+    )
+    assert first.is_first_run and first.entries == []
+
+    second = store.record(
+        "Chat",
+        _result((1, ProfileType.PARTICIPANT), (3, ProfileType.PARTICIPANT), (4, ProfileType.PARTICIPANT)),
+        run_at=datetime(2025, 2, 1, 12),
+    )
+    assert second.previous_run_at == "2025-01-01 12:00"
+    assert [entry.user_id for entry in second.of(CHANGE_NEW)] == [4]
+    assert [entry.user_id for entry in second.of(CHANGE_GONE)] == [2]
+    changed = second.of(CHANGE_CATEGORY)
+    assert [(entry.user_id, entry.previous, entry.current) for entry in changed] == [
+        (3, ProfileType.MENTIONED_ONLY, ProfileType.PARTICIPANT)
+    ]
+    assert changed[0].first_seen == "2025-01-01 12:00"
+
+    # Вернувшийся профиль снова считается новым, другой чат не затрагивается.
+    third = store.record("Chat", _result((2, ProfileType.PARTICIPANT)), run_at=datetime(2025, 3, 1))
+    assert [entry.user_id for entry in third.of(CHANGE_NEW)] == [2]
+    assert store.record("Other", _result((1, ProfileType.PARTICIPANT))).is_first_run
+
+
+def test_delta_sheet_lists_changes(tmp_path):
+    store = SqliteAudienceStore(tmp_path / "audience.sqlite")
+    store.record("Chat", _result((1, ProfileType.PARTICIPANT)), run_at=datetime(2025, 1, 1))
+    delta = store.record("Chat", _result((2, ProfileType.CHANNEL)), run_at=datetime(2025, 1, 2))
+
+    sheet = DeltaReportBuilder().build(delta)
+
+    assert sheet.name == "Изменения"
+    assert "новых 1, ушли 1" in sheet.rows[0]["Изменение"]
+    assert [(row["Изменение"], row["Username"]) for row in sheet.rows[1:]] == [("новый", "@u2"), ("ушёл", "@u1")]
+
+
+def test_save_ingestion_refuses_state_saved_by_another_run(tmp_path):
+    from audience_bot.domain.extraction.ingestion import IngestionState
+    from audience_bot.domain.messages import Watermark
+
+    store = SqliteAudienceStore(tmp_path / "audience.sqlite")
+    first = IngestionState(watermark=Watermark(2), result=_result((1, ProfileType.PARTICIPANT)), message_count=2)
+    assert store.save_ingestion("u:1", first)
+    loaded = store.load_ingestion("u:1")
+
+    # Оба прогона начали с одного состояния; второй сохраняет поверх уже обновлённого.
+    winner = IngestionState(watermark=Watermark(4), result=_result((2, ProfileType.PARTICIPANT)), message_count=4)
+    stale = IngestionState(watermark=Watermark(3), result=_result((3, ProfileType.PARTICIPANT)), message_count=3)
+    assert store.save_ingestion("u:1", winner, loaded)
+    assert not store.save_ingestion("u:1", stale, loaded)
+    assert not store.save_ingestion("u:1", stale)
+
+    current = store.load_ingestion("u:1")
+    assert current.watermark.message_id == 4 and current.message_count == 4
+    assert store.save_ingestion("u:1", stale, current)
+
+
+def test_ingestion_keeps_activity_and_provenance_and_upgrades_old_files(tmp_path):
+    import sqlite3
+    from datetime import date
+
+    from audience_bot.domain.extraction import ActivityHistogram, ProvenanceIndex
+    from audience_bot.domain.extraction.ingestion import IngestionState
+    from audience_bot.domain.messages import Watermark
+
+    path = tmp_path / "audience.sqlite"
+    with sqlite3.connect(path) as connection:
+        # Таблица ingestion первой версии — без колонок активности и источников.
+        connection.execute(
+            "CREATE TABLE ingestion (chat TEXT PRIMARY KEY, message_id INTEGER, message_at TEXT, "
+            "message_count INTEGER NOT NULL, snapshot BLOB NOT NULL)"
+        )
+    store = SqliteAudienceStore(path)
+
+    result = _result((1, ProfileType.PARTICIPANT), (2, ProfileType.MENTIONED_ONLY))
+    authors = [profile.profile_id for _, profile in result.iter_entries()]
+    result.activity = ActivityHistogram()
+    result.activity.record(datetime(2025, 1, 1, 10), authors[0])
+    result.activity.record(datetime(2025, 1, 1, 11), authors[1])
+    result.activity.record(datetime(2025, 1, 3, 9), authors[0])
+    result.provenance = ProvenanceIndex(cap=1)
+    result.provenance.record(authors[0], "author", "10")
+    result.provenance.record(authors[0], "author", "12")
+    assert store.save_ingestion("u:1", IngestionState(watermark=Watermark(12), result=result, message_count=3))
+
+    loaded = store.load_ingestion("u:1").result
+    assert [(day.day, day.messages, day.unique_authors) for day in loaded.activity.days()] == [
+        (date(2025, 1, 1), 2, 2),
+        (date(2025, 1, 3), 1, 1),
+    ]
+    assert loaded.provenance.cap == 1
+    assert loaded.provenance.describe(authors[0]) == "автор #10 (+1)"
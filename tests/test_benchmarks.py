@@ -0,0 +1,152 @@
+"""Бенчмарки пайплайна на синтетических экспортах (``-m slow``).
+
+В обычном прогоне pytest пропускаются: запуск — ``BENCH=1`` или явный ``BENCH_MESSAGES``.
+Размеры и форматы — ``BENCH_MESSAGES`` (по умолчанию ``1000,10000``) и ``BENCH_FORMATS``
+(``json``); полный прогон — ``BENCH_MESSAGES=1000,10000,100000,1000000``. Каждый этап
+замеряется дважды: время без tracemalloc и пик памяти с ним. Результат сравнивается
+с ``tests/data/benchmark_baseline.json`` (допуск ``BENCH_TIME_TOLERANCE``, ``BENCH_MEMORY_TOLERANCE``);
+``BENCH_UPDATE_BASELINE=1`` перезаписывает базовую линию текущими замерами. Замеры пишутся
+в лог (``--log-cli-level=INFO`` или ``-rP --log-level=INFO``) и в сообщение о регрессии.
+"""
+
+import gc
+import io
+import json
+import logging
+import os
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+import pytest
+from dependency_injector import providers
+from synthetic_export import SyntheticExportSpec, export_bytes
+
+from audience_bot.application.config import PipelineConfig
+from audience_bot.application.container import AppContainer
+from audience_bot.application.usecases.dto import RawFileDTO, ReportMetadataDTO
+from audience_bot.domain.reporting import ReportFormat
+
+BASELINE_PATH = Path(__file__).parent / "data" / "benchmark_baseline.json"
+SIZES = [int(size) for size in os.environ.get("BENCH_MESSAGES", "1000,10000").split(",") if size.strip()]
+FORMATS = [fmt.strip() for fmt in os.environ.get("BENCH_FORMATS", "json").split(",") if fmt.strip()]
+TIME_TOLERANCE = float(os.environ.get("BENCH_TIME_TOLERANCE", "2.0"))
+MEMORY_TOLERANCE = float(os.environ.get("BENCH_MEMORY_TOLERANCE", "1.25"))
+# Маленькие этапы шумят сильнее, чем отличаются: сравниваем только то, что дольше порога.
+MIN_COMPARED_SECONDS = 0.05
+MIN_COMPARED_MIB = 1.0
+
+logger = logging.getLogger(__name__)
+
+pytestmark = pytest.mark.skipif(
+    os.environ.get("BENCH") != "1" and "BENCH_MESSAGES" not in os.environ,
+    reason="бенчмарк: BENCH=1 или BENCH_MESSAGES",
+)
+
+
+def _spec(messages: int) -> SyntheticExportSpec:
+    authors = max(100, messages // 20)
+    return SyntheticExportSpec(messages=messages, authors=authors, mentioned_only=authors // 2, seed=messages)
+
+
+def _container() -> AppContainer:
+    container = AppContainer()
+    container.pipeline_config.override(
+        providers.Object(
+            PipelineConfig(
+                max_messages=10_000_000,
+                max_total_bytes=2 * 1024**3,
+                max_processing_seconds=3600,
+                eager_processing=False,
+                report_max_file_bytes=2 * 1024**3,
+            )
+        )
+    )
+    return container
+
+
+def _timed(function):
+    gc.collect()
+    started = time.perf_counter()
+    result = function()
+    return time.perf_counter() - started, result
+
+
+def _peak_mib(function) -> float:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        function()
+        return (tracemalloc.get_traced_memory()[1] - baseline) / 1024**2
+    finally:
+        tracemalloc.stop()
+
+
+def _run_stages(container: AppContainer, files):
+    """Этапы по отдельности и пайплайн целиком; возвращает {этап: функция без аргументов}."""
+    parse_uc, extract_uc, report_uc = container.parse_uc(), container.extract_uc(), container.report_uc()
+    parsed = parse_uc.execute(files, chat_id=None, user_id="bench")
+    extracted = extract_uc.execute(parsed)
+    metadata = ReportMetadataDTO(
+        export_time=datetime.now(timezone.utc), chat_name=None, requested_format=ReportFormat.CSV
+    )
+    report = report_uc.execute(extracted, metadata)
+
+    def full_pipeline():
+        result = container.pipeline().execute(files, chat_name=None, user_id="bench", report_format=ReportFormat.CSV)
+        result.write_to(io.BytesIO())
+
+    return {
+        "parse": lambda: parse_uc.execute(files, chat_id=None, user_id="bench"),
+        "extract": lambda: extract_uc.execute(parsed),
+        "build": lambda: report_uc.execute(extracted, metadata),
+        "render": lambda: report.write_to(io.BytesIO()),
+        "pipeline": full_pipeline,
+    }
+
+
+def _compare(key: str, measured: dict) -> list:
+    if not BASELINE_PATH.exists():
+        return []
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8")).get(key, {})
+    regressions = []
+    for stage, result in measured.items():
+        expected = baseline.get(stage)
+        if expected is None:
+            continue
+        if result["seconds"] >= MIN_COMPARED_SECONDS and result["seconds"] > expected["seconds"] * TIME_TOLERANCE:
+            regressions.append(f"{key}/{stage}: {result['seconds']:.3f}s против {expected['seconds']:.3f}s")
+        if result["peak_mib"] >= MIN_COMPARED_MIB and result["peak_mib"] > expected["peak_mib"] * MEMORY_TOLERANCE:
+            regressions.append(f"{key}/{stage}: {result['peak_mib']:.1f} MiB против {expected['peak_mib']:.1f} MiB")
+    return regressions
+
+
+def _update_baseline(key: str, measured: dict) -> None:
+    data = json.loads(BASELINE_PATH.read_text(encoding="utf-8")) if BASELINE_PATH.exists() else {}
+    data[key] = measured
+    BASELINE_PATH.write_text(json.dumps(data, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("fmt", FORMATS)
+@pytest.mark.parametrize("messages", SIZES)
+def test_pipeline_scaling_against_baseline(messages, fmt):
+    spec = _spec(messages)
+    files = [RawFileDTO(path=f"<synthetic-{messages}>", filename=f"result.{fmt}", content=export_bytes(spec, fmt))]
+    stages = _run_stages(_container(), files)
+
+    measured = {}
+    for stage, function in stages.items():
+        seconds, _ = _timed(function)
+        measured[stage] = {"seconds": round(seconds, 4), "peak_mib": round(_peak_mib(function), 2)}
+    key = f"{fmt}-{messages}"
+    summary = ", ".join(f"{stage} {m['seconds']:.3f}s/{m['peak_mib']:.1f}MiB" for stage, m in measured.items())
+    logger.info("%s: %s", key, summary)
+
+    if os.environ.get("BENCH_UPDATE_BASELINE") == "1":
+        _update_baseline(key, measured)
+        return
+    regressions = _compare(key, measured)
+    assert not regressions, f"Регрессия относительно базовой линии ({key}: {summary}):\n" + "\n".join(regressions)
@@ -19,7 +19,7 @@ class DummyExcelReport:
 
 def test_parser_contract_must_return_parsed_messages():
     class GoodParser:
-        def parse(self, files):
+        def parse(self, files, window=None, watermarks=None):
             return ParsedMessagesDTO(messages=[object()])
 
     uc = ParseChatExportUC(parser=GoodParser())
@@ -29,7 +29,7 @@ def test_parser_contract_must_return_parsed_messages():
 
 def test_parser_contract_invalid_returns_error():
     class BadParser:
-        def parse(self, files):
+        def parse(self, files, window=None, watermarks=None):
             return ParsedMessagesDTO(messages=[])
 
     uc = ParseChatExportUC(parser=BadParser())
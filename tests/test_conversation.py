@@ -6,7 +6,7 @@ from audience_bot.cli import create_pipeline
 from audience_bot.application.config import PipelineConfig
 from audience_bot.application.usecases.dto import RawFileDTO, ReportDTO
 from audience_bot.application.usecases.exceptions import PipelineError
-from audience_bot.application.services.conversation import ConversationService
+from audience_bot.application.services.conversation import BotResponse, ConversationService
 from audience_bot.application.services.sessions import InMemorySessionStore
 from audience_bot.domain.reporting import ReportFormat
 from audience_bot.infrastructure.temp_storage import InMemoryTempStorageAdapter
@@ -71,7 +71,7 @@ def test_process_command_passes_target(raw_json_file: RawFileDTO):
                 excel_bytes=b"excel" if report_format == ReportFormat.EXCEL else None,
             )
 
-        def execute(self, files, chat_name, user_id):
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
             return self.report
 
     pipeline = StubPipeline(ReportFormat.EXCEL)
@@ -103,7 +103,7 @@ def test_process_command_passes_target(raw_json_file: RawFileDTO):
 
 def test_process_chat_target_adds_note(raw_json_file: RawFileDTO):
     class StubPipeline:
-        def execute(self, files, chat_name, user_id):
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
             return ReportDTO(format=ReportFormat.EXCEL, excel_bytes=b"x")
 
     pipeline = StubPipeline()
@@ -133,9 +133,38 @@ def test_process_chat_target_adds_note(raw_json_file: RawFileDTO):
     assert any("слишком много участников" in entry[1].lower() for entry in api.sent if entry[0] == "text")
 
 
+def test_process_csv_sends_streamed_attachment(raw_json_file: RawFileDTO):
+    class RecordingPipeline:
+        def __init__(self):
+            self.formats = []
+
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
+            self.formats.append(report_format)
+            return ReportDTO(
+                format=ReportFormat.CSV, writer=lambda sink: sink.write(b"a,b\n"), filename="audience-report.csv"
+            )
+
+    pipeline = RecordingPipeline()
+    session_store = InMemorySessionStore()
+    temp_storage = InMemoryTempStorageAdapter()
+    config = PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024)
+    service = ConversationService(session_store, pipeline, temp_storage, config)
+    api = type("StubAPI", (), {"sent": [], "send_text": lambda self, chat, text: self.sent.append(("text", text)), "send_file": lambda self, chat, data, name: self.sent.append(("file", name, data)), "download_file": lambda self, fid: b""})()
+    adapter = TelegramWebhookAdapter(BotController(service, api))
+
+    session = session_store.get("u")
+    session.add_file(temp_storage.save("sample.json", raw_json_file.content, None))
+    session_store.save(session)
+
+    adapter.handle_request({"message": {"chat": {"id": "c"}, "from": {"id": "u"}, "text": "/process csv"}})
+
+    assert pipeline.formats == [ReportFormat.CSV]
+    assert ("file", "audience-report.csv", b"a,b\n") in api.sent
+
+
 def test_process_file_target_with_plain_text_returns_notice(raw_json_file: RawFileDTO):
     class StubPipeline:
-        def execute(self, files, chat_name, user_id):
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
             return ReportDTO(format=ReportFormat.PLAIN_TEXT, text="data")
 
     pipeline = StubPipeline()
@@ -167,7 +196,7 @@ def test_process_file_target_with_plain_text_returns_notice(raw_json_file: RawFi
 
 def test_process_reports_pipeline_error_to_user(raw_json_file: RawFileDTO):
     class FailingPipeline:
-        def execute(self, files, chat_name, user_id):
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
             raise PipelineError("превышен лимит сообщений")
 
     pipeline = FailingPipeline()
@@ -195,3 +224,157 @@ def test_upload_rejects_too_large_file(conversation_service: ConversationService
 
     assert response.is_error
     assert "превышает" in response.text.lower()
+
+
+def test_process_command_parses_time_window(raw_json_file: RawFileDTO):
+    class RecordingPipeline:
+        def __init__(self):
+            self.windows = []
+
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
+            self.windows.append(window)
+            return ReportDTO(format=ReportFormat.PLAIN_TEXT, text="data")
+
+    pipeline = RecordingPipeline()
+    session_store = InMemorySessionStore()
+    temp_storage = InMemoryTempStorageAdapter()
+    config = PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024)
+    service = ConversationService(session_store, pipeline, temp_storage, config)
+    api = type("StubAPI", (), {"sent": [], "send_text": lambda self, chat, text: self.sent.append(("text", text)), "send_file": lambda self, chat, data, name: self.sent.append(("file", name)), "download_file": lambda self, fid: b""})()
+    adapter = TelegramWebhookAdapter(BotController(service, api))
+
+    session = session_store.get("user")
+    session.add_file(temp_storage.save("sample.json", raw_json_file.content, None))
+    session_store.save(session)
+
+    adapter.handle_request({"message": {"chat": {"id": "c"}, "from": {"id": "user"}, "text": "/process chat 2025-01-01..2025-01-31"}})
+    adapter.handle_request({"message": {"chat": {"id": "c"}, "from": {"id": "user"}, "text": "/process last-week"}})
+
+    assert len(pipeline.windows) == 1
+    assert pipeline.windows[0].describe() == "2025-01-01 – 2025-01-31"
+    assert any("некорректный период" in entry[1].lower() for entry in api.sent if entry[0] == "text")
+
+
+def test_eager_upload_prepares_partials_for_process(raw_json_file: RawFileDTO):
+    from concurrent.futures import ThreadPoolExecutor
+
+    class SpyPipeline:
+        def __init__(self, inner):
+            self.inner = inner
+            self.prepared_runs = 0
+
+        def prepare(self, file, user_id):
+            return self.inner.prepare(file, user_id)
+
+        def execute_prepared(self, partials, chat_name, user_id, report_format=None):
+            self.prepared_runs += 1
+            return self.inner.execute_prepared(partials, chat_name=chat_name, user_id=user_id)
+
+        def execute(self, files, chat_name, user_id, window=None, report_format=None):
+            raise AssertionError("полный прогон не ожидается")
+
+    pipeline = SpyPipeline(create_pipeline())
+    config = PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024, report_text_threshold=1000)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        service = ConversationService(InMemorySessionStore(), pipeline, InMemoryTempStorageAdapter(), config, executor)
+        service.upload_file("user", raw_json_file)
+        response = service.process("user", chat_name="Chat")
+
+    assert not response.is_error
+    assert pipeline.prepared_runs == 1
+    assert service._sessions.get("user").partials == {}  # type: ignore[attr-defined]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+@pytest.mark.parametrize(
+    ("window", "compare", "expected"),
+    [(None, False, "prepared"), ("window", False, "full"), (None, True, "overlap")],
+)
+def test_sync_and_async_process_use_partials_under_same_rule(
+    raw_json_file: RawFileDTO, asynchronous, window, compare, expected
+):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from datetime import datetime
+
+    from audience_bot.domain.messages import TimeWindow
+
+    calls = []
+
+    class SpyPipeline:
+        def prepare(self, file, user_id):
+            return "partial"
+
+        def _run(self, name):
+            calls.append(name)
+            raise PipelineError("стоп")
+
+        def execute_prepared(self, *args, **kwargs):
+            return self._run("prepared")
+
+        def execute(self, *args, **kwargs):
+            return self._run("full")
+
+        def execute_overlap(self, *args, **kwargs):
+            return self._run("overlap")
+
+        async def execute_prepared_async(self, *args, **kwargs):
+            return self._run("prepared")
+
+        async def execute_async(self, *args, **kwargs):
+            return self._run("full")
+
+        async def execute_overlap_async(self, *args, **kwargs):
+            return self._run("overlap")
+
+    period = TimeWindow(since=datetime(2025, 1, 1)) if window else None
+    config = PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        pipeline, storage = SpyPipeline(), InMemoryTempStorageAdapter()
+        service = ConversationService(InMemorySessionStore(), pipeline, storage, config, executor)
+        service.upload_file("user", raw_json_file)
+        if asynchronous:
+            asyncio.run(service.process_async("user", chat_name=None, window=period, compare=compare))
+        else:
+            service.process("user", chat_name=None, window=period, compare=compare)
+
+    assert calls == [expected]
+
+
+def test_find_and_who_use_last_processed_audience(conversation_service: ConversationService, raw_json_file: RawFileDTO):
+    assert conversation_service.find("user-9", "user").is_error
+
+    conversation_service.upload_file("user-9", raw_json_file)
+    conversation_service.process("user-9", chat_name="Test chat")
+
+    found = conversation_service.find("user-9", "useron")
+    assert "UserOne" in found.text and "UserAdmin" not in found.text
+    assert "UserOne" in conversation_service.who("user-9", "1001").text
+    assert "не найден" in conversation_service.who("user-9", "424242").text
+
+    conversation_service.reset("user-9")
+    assert conversation_service.find("user-9", "user").is_error
+
+
+def test_controller_sends_pages_in_order_before_generator_is_exhausted():
+    events = []
+
+    class StubAPI:
+        def send_text(self, chat_id, text):
+            events.append(("sent", text))
+
+        def send_file(self, chat_id, file_bytes, filename):
+            raise AssertionError("файлов быть не должно")
+
+    def pages():
+        for number in range(5):
+            events.append(("formatted", number))
+            yield f"page-{number}"
+
+    controller = BotController(conversation=None, api_adapter=StubAPI())  # type: ignore[arg-type]
+    controller._send_response("c", BotResponse(text="Отчёт пуст.", pages=pages()))
+
+    sent = [text for kind, text in events if kind == "sent"]
+    assert sent == [f"page-{number}" for number in range(5)]
+    # Первая страница отправлена раньше, чем набрана последняя.
+    assert events.index(("sent", "page-0")) < events.index(("formatted", 4))
@@ -1,7 +1,13 @@
 import unittest
 from datetime import datetime, timezone
 
-from audience_bot.domain.extraction import AudienceExtractor
+from audience_bot.domain.extraction import (
+    AudienceExtractor,
+    AudienceProfile,
+    ExtractionResult,
+    ProfileId,
+    ProfileType,
+)
 from audience_bot.domain.messages import ChatMessage, RawUserRef
 
 
@@ -119,3 +125,316 @@ class AudienceExtractorTests(unittest.TestCase):
         result = extractor.extract([msg1, msg2])
 
         self.assertEqual(result.participant_count(), 1)
+
+    def test_identity_resolver_links_keys_across_sources(self):
+        extractor = AudienceExtractor()
+        # JSON: автор с id и username
+        json_msg = ChatMessage(
+            message_id="j1",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Алиса", user_id=7, username="@alice", first_name="Алиса", last_name=None),
+            text="hi",
+        )
+        # HTML: тот же человек только с username и именем
+        html_msg = ChatMessage(
+            message_id="h1",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alice L.", user_id=None, username="alice", first_name=None, last_name=None),
+            text="hi",
+        )
+        # HTML: только отображаемое имя, связанное с username в предыдущем сообщении
+        name_only = ChatMessage(
+            message_id="h2",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alice L.", user_id=None, username=None, first_name=None, last_name=None),
+            text="again",
+        )
+        result = extractor.extract([json_msg, html_msg, name_only])
+
+        self.assertEqual(result.participant_count(), 1)
+        only_profile = next(iter(result.participants.values()))
+        self.assertEqual(only_profile.profile_id.user_id, 7)
+
+    def test_identity_resolver_does_not_merge_namesakes(self):
+        extractor = AudienceExtractor()
+        first = ChatMessage(
+            message_id="m1",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alex", user_id=1, username=None, first_name=None, last_name=None),
+            text="hi",
+        )
+        second = ChatMessage(
+            message_id="m2",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alex", user_id=2, username=None, first_name=None, last_name=None),
+            text="hi",
+        )
+        name_only = ChatMessage(
+            message_id="m3",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alex", user_id=None, username=None, first_name=None, last_name=None),
+            text="hi",
+        )
+        result = extractor.extract([first, second, name_only])
+
+        self.assertEqual(result.participant_count(), 3)
+
+    def test_identity_resolver_keeps_distinct_usernames_with_shared_name(self):
+        extractor = AudienceExtractor()
+        with_id = ChatMessage(
+            message_id="m1",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alex", user_id=1, username="alex1", first_name=None, last_name=None),
+            text="hi",
+        )
+        without_id = ChatMessage(
+            message_id="m2",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alex", user_id=None, username="alex2", first_name=None, last_name=None),
+            text="hi",
+        )
+        only_id = ChatMessage(
+            message_id="m3",
+            timestamp=datetime.now(timezone.utc),
+            author=RawUserRef(display_name="Alex", user_id=3, username=None, first_name=None, last_name=None),
+            text="hi",
+        )
+        result = extractor.extract([with_id, without_id, only_id])
+
+        usernames = {profile.profile_id.username for profile in result.participants.values()}
+        self.assertEqual(result.participant_count(), 3)
+        self.assertEqual(usernames, {"alex1", "alex2", None})
+
+    def test_extract_skips_messages_outside_window(self):
+        from audience_bot.domain.messages import TimeWindow
+
+        extractor = AudienceExtractor()
+        old = ChatMessage(
+            message_id="m1",
+            timestamp=datetime(2024, 5, 1, 12, 0),
+            author=RawUserRef(display_name="Old", user_id=1, username=None, first_name=None, last_name=None),
+            text="old",
+        )
+        recent = ChatMessage(
+            message_id="m2",
+            timestamp=datetime(2025, 5, 1, 12, 0),
+            author=RawUserRef(display_name="Recent", user_id=2, username=None, first_name=None, last_name=None),
+            text="recent",
+        )
+        result = extractor.extract([old, recent], window=TimeWindow.from_days("2025-01-01", None))
+
+        self.assertEqual(result.participant_count(), 1)
+        self.assertEqual(next(iter(result.participants.values())).profile_id.user_id, 2)
+
+    def test_merge_partials_relinks_identities_between_files(self):
+        extractor = AudienceExtractor()
+        json_part = extractor.extract(
+            [
+                ChatMessage(
+                    message_id="j1",
+                    timestamp=datetime.now(timezone.utc),
+                    author=RawUserRef(display_name="Bob", user_id=5, username="@bob", first_name=None, last_name=None),
+                    text="hi",
+                )
+            ]
+        )
+        html_part = extractor.extract(
+            [
+                ChatMessage(
+                    message_id="h1",
+                    timestamp=datetime.now(timezone.utc),
+                    author=RawUserRef(display_name="Bob B.", user_id=None, username="bob", first_name=None, last_name=None),
+                    text="hi",
+                )
+            ]
+        )
+
+        merged = extractor.merge([json_part, html_part])
+
+        self.assertEqual(merged.participant_count(), 1)
+        self.assertEqual(next(iter(merged.participants.values())).profile_id.user_id, 5)
+
+
+class ExtractionResultTests(unittest.TestCase):
+    @staticmethod
+    def _profile(user_id: int, profile_type: ProfileType) -> AudienceProfile:
+        return AudienceProfile(
+            profile_id=ProfileId(user_id=user_id, username=None, display_name=f"User {user_id}"),
+            profile_type=profile_type,
+            username=None,
+            display_name=f"User {user_id}",
+        )
+
+    def test_category_priorities(self):
+        result = ExtractionResult()
+        result.add_mentioned(self._profile(1, ProfileType.MENTIONED_ONLY))
+        result.add_participant(self._profile(1, ProfileType.PARTICIPANT))
+        result.add_mentioned(self._profile(1, ProfileType.MENTIONED_ONLY))
+        result.add_channel(self._profile(2, ProfileType.CHANNEL))
+        result.add_mentioned(self._profile(2, ProfileType.MENTIONED_ONLY))
+        result.add_mentioned(self._profile(3, ProfileType.MENTIONED_ONLY))
+        result.finalize()
+
+        self.assertEqual(result.participant_count(), 1)
+        self.assertEqual(result.channel_count(), 1)
+        self.assertEqual(result.mentioned_count(), 1)
+        self.assertEqual(next(iter(result.participants.values())).profile_type, ProfileType.PARTICIPANT)
+        self.assertEqual([pid.user_id for pid in result.mentioned_only], [3])
+
+    def test_views_follow_changes_without_copies(self):
+        result = ExtractionResult()
+        participants = result.participants
+        result.add_participant(self._profile(1, ProfileType.PARTICIPANT))
+        self.assertEqual(len(participants), 1)
+
+        # Чтения между добавлениями не пересобирают словари: представление то же и сразу видит перенос.
+        for user_id in range(2, 50):
+            result.add_participant(self._profile(user_id, ProfileType.PARTICIPANT))
+            self.assertIn(self._profile(user_id, ProfileType.PARTICIPANT).profile_id, participants)
+        result.add_channel(self._profile(1, ProfileType.CHANNEL))
+
+        self.assertEqual(len(participants), 48)
+        self.assertEqual([profile_id.user_id for profile_id in result.channels], [1])
+        self.assertNotIn(self._profile(1, ProfileType.PARTICIPANT).profile_id, participants)
+        self.assertEqual(result.channels[self._profile(1, ProfileType.CHANNEL).profile_id].profile_type, ProfileType.CHANNEL)
+        with self.assertRaises(KeyError):
+            participants[self._profile(1, ProfileType.PARTICIPANT).profile_id]
+        with self.assertRaises(TypeError):
+            result.channels[ProfileId(user_id=9, username=None, display_name=None)] = None  # type: ignore[index]
+
+
+class ProvenanceIndexTests(unittest.TestCase):
+    def test_extractor_records_roles_in_order_and_caps_entries(self):
+        author = RawUserRef(display_name="Алиса", user_id=1, username="@alice", first_name=None, last_name=None)
+        bob = RawUserRef(display_name="Боб", user_id=2, username="@bob", first_name=None, last_name=None)
+        messages = [
+            ChatMessage(message_id=str(idx), timestamp=None, author=author, mentions=[bob] if idx == 2 else [])
+            for idx in range(1, 5)
+        ]
+        result = AudienceExtractor(provenance_cap=2).extract(messages)
+
+        alice_id = next(iter(result.participants))
+        bob_id = next(iter(result.mentioned_only))
+        self.assertEqual(result.provenance.lookup(alice_id), [("1", "author"), ("2", "author")])
+        self.assertEqual(result.provenance.total(alice_id), 4)
+        self.assertEqual(result.provenance.describe(alice_id), "автор #1, автор #2 (+2)")
+        self.assertEqual(result.provenance.lookup(bob_id), [("2", "mention")])
+
+    def test_index_is_disabled_by_default_and_interns_text_ids(self):
+        from audience_bot.domain.extraction import ProvenanceIndex
+
+        author = RawUserRef(display_name="Алиса", user_id=1, username=None, first_name=None, last_name=None)
+        message = ChatMessage(message_id="1", timestamp=None, author=author)
+        self.assertIsNone(AudienceExtractor().extract([message]).provenance)
+        index = ProvenanceIndex(cap=3)
+        profile_id = ProfileId(user_id=None, username="@x", display_name=None)
+        index.record(profile_id, "mention", "message12")
+        index.record(profile_id, "forward", "77")
+        self.assertEqual(index.lookup(profile_id), [("message12", "mention"), ("77", "forward")])
+
+
+class AudienceIndexTests(unittest.TestCase):
+    def _result(self, count):
+        result = ExtractionResult()
+        for idx in range(count):
+            result.add_participant(
+                AudienceProfile(
+                    profile_id=ProfileId(user_id=idx, username=f"@user{idx}", display_name=f"Имя Фамилия{idx}"),
+                    profile_type=ProfileType.PARTICIPANT,
+                    username=f"@user{idx}",
+                    display_name=f"Имя Фамилия{idx}",
+                )
+            )
+        return result
+
+    def test_prefix_search_by_username_and_name_words(self):
+        from audience_bot.domain.extraction import AudienceIndex
+
+        index = AudienceIndex.build(self._result(30))
+        self.assertEqual(
+            sorted(profile.username for _, profile in index.find("@USER2", limit=50)),
+            ["@user2"] + [f"@user{idx}" for idx in range(20, 30)],
+        )
+        self.assertEqual(len(index.find("фамилия1", limit=50)), 11)
+        self.assertEqual(len(index.find("u", limit=5)), 5)
+        self.assertEqual(index.find("zzz"), [])
+        self.assertEqual(index.by_user_id(7)[1].username, "@user7")
+        self.assertEqual(index.by_username("USER7")[1].profile_id.user_id, 7)
+
+    def test_queries_on_large_audience_are_fast(self):
+        import time
+
+        from audience_bot.domain.extraction import AudienceIndex
+
+        index = AudienceIndex.build(self._result(100_000))
+        start = time.perf_counter()
+        for _ in range(100):
+            index.find("user9999")
+            index.find("ф")
+            index.by_user_id(99_999)
+        self.assertLess((time.perf_counter() - start) / 100, 0.001)
+
+
+class ActivityHistogramTests(unittest.TestCase):
+    def _messages(self):
+        alice = RawUserRef(display_name="Алиса", user_id=1, username="@alice", first_name=None, last_name=None)
+        bob = RawUserRef(display_name="Боб", user_id=2, username="@bob", first_name=None, last_name=None)
+        return [
+            ChatMessage(message_id="1", timestamp=datetime(2025, 1, 3, 10), author=alice),
+            ChatMessage(message_id="2", timestamp=datetime(2025, 1, 1, 9), author=alice),
+            ChatMessage(message_id="3", timestamp=datetime(2025, 1, 1, 18), author=bob),
+            ChatMessage(message_id="4", timestamp=datetime(2025, 1, 1, 19), author=alice),
+            ChatMessage(message_id="5", timestamp=None, author=bob),
+        ]
+
+    def test_days_counts_and_unique_authors(self):
+        from datetime import date
+
+        activity = AudienceExtractor().extract(self._messages()).activity
+
+        self.assertEqual(
+            [(day.day, day.messages, day.unique_authors) for day in activity.days()],
+            [(date(2025, 1, 1), 3, 2), (date(2025, 1, 3), 1, 1)],
+        )
+        self.assertEqual(activity.authors_between(date(2025, 1, 1), date(2025, 1, 3)), 2)
+
+    def test_array_fallback_matches_numpy_path(self):
+        from unittest import mock
+
+        from audience_bot.domain.extraction import activity as activity_module
+
+        expected = AudienceExtractor().extract(self._messages()).activity.days()
+        with mock.patch.object(activity_module, "np", None):
+            fallback = AudienceExtractor().extract(self._messages()).activity.days()
+        self.assertEqual(fallback, expected)
+
+    def test_outlier_date_does_not_allocate_the_whole_gap(self):
+        from datetime import date
+        from unittest import mock
+
+        from audience_bot.domain.extraction import activity as activity_module
+
+        messages = self._messages() + [
+            ChatMessage(
+                message_id="6",
+                timestamp=datetime(1970, 1, 1),
+                author=RawUserRef(display_name="Эпоха", user_id=3, username=None, first_name=None, last_name=None),
+            )
+        ]
+        for numpy_module in (activity_module.np, None):
+            with mock.patch.object(activity_module, "np", numpy_module):
+                activity = AudienceExtractor().extract(messages).activity
+                self.assertEqual(activity.authors_between(date(1970, 1, 1), date(2025, 1, 3)), 3)
+                self.assertEqual(activity.authors_between(date(1970, 1, 2), date(2024, 12, 31)), 0)
+            # Корзины только на дни с сообщениями, а не на ~20 тысяч дней промежутка.
+            self.assertEqual(len(activity._bitsets), 3)
+            # И в отчёте — только дни с сообщениями, без пустых строк за полвека.
+            days = activity.days()
+            self.assertEqual([day.day for day in days], [date(1970, 1, 1), date(2025, 1, 1), date(2025, 1, 3)])
+            self.assertEqual((days[0].unique_authors, days[-1].messages), (1, 1))
+
+    def test_merge_relinks_authors_across_partials(self):
+        extractor = AudienceExtractor()
+        messages = self._messages()
+        merged = extractor.merge([extractor.extract(messages[:2]), extractor.extract(messages[2:])])
+        self.assertEqual([day.unique_authors for day in merged.activity.days()], [2, 1])
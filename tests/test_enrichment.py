@@ -0,0 +1,140 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from audience_bot.application.config import TelegramConfig
+from audience_bot.domain.extraction import AudienceProfile, ExtractionResult, ProfileId, ProfileType
+from audience_bot.infrastructure.enrichment import ProfileEnricher, TokenBucket, TTLDiskCache
+from audience_bot.infrastructure.telegram import TelegramAPIAdapter
+
+BIOS = {"1": "Люблю Python", "2": "Data engineer", "@carol": "Пишу ботов"}
+
+
+@pytest.fixture
+def telegram_server():
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = parse_qs(self.rfile.read(int(self.headers["Content-Length"])).decode())
+            chat_id = body["chat_id"][0]
+            hits.append(chat_id)
+            if chat_id in BIOS:
+                status, payload = 200, {"ok": True, "result": {"id": 1, "bio": BIOS[chat_id]}}
+            else:
+                status, payload = 400, {"ok": False, "description": "Bad Request: chat not found"}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield base_url, hits
+    server.shutdown()
+    server.server_close()
+
+
+def _result():
+    result = ExtractionResult()
+    for user_id, username in ((1, "@alice"), (2, "@bob"), (3, "@ghost"), (None, "@carol")):
+        profile_id = ProfileId(user_id=user_id, username=username, display_name=username.strip("@"))
+        profile = AudienceProfile(
+            profile_id=profile_id,
+            profile_type=ProfileType.PARTICIPANT,
+            username=username,
+            display_name=username.strip("@"),
+        )
+        result.add(profile, ProfileType.PARTICIPANT)
+    return result
+
+
+def _enricher(base_url, cache_path):
+    config = TelegramConfig(token="t", poll_interval=1, poll_timeout=1, base_url=base_url, file_base_url=base_url)
+    return ProfileEnricher(
+        TelegramAPIAdapter(config),
+        TTLDiskCache(cache_path, ttl_seconds=3600),
+        TokenBucket(rate=1000, burst=10),
+        max_workers=3,
+    )
+
+
+def test_enricher_fills_descriptions_and_reuses_disk_cache(telegram_server, tmp_path):
+    base_url, hits = telegram_server
+    cache_path = tmp_path / "enrichment.json"
+    result = _result()
+
+    assert _enricher(base_url, cache_path).enrich(result) == 3
+    descriptions = {profile.username: profile.description for _, profile in result.iter_entries()}
+    assert descriptions == {"@alice": "Люблю Python", "@bob": "Data engineer", "@ghost": None, "@carol": "Пишу ботов"}
+    assert sorted(hits) == ["1", "2", "3", "@carol"]
+
+    # Новый процесс с тем же файлом кэша: ни одного запроса, включая «не найден» для 3.
+    hits.clear()
+    fresh = _result()
+    assert _enricher(base_url, cache_path).enrich(fresh) == 3
+    assert hits == []
+
+
+def test_disk_cache_expires_entries(tmp_path):
+    now = [1000.0]
+    cache = TTLDiskCache(tmp_path / "cache.json", ttl_seconds=60, clock=lambda: now[0])
+    cache.put("1", {"bio": "x"})
+    cache.put("2", {"bio": "y"})
+    now[0] += 30
+    cache.put("2", {"bio": "z"})
+    assert cache.get("1") == (True, {"bio": "x"})
+
+    now[0] += 31
+    assert cache.get("1") == (False, None)
+    cache.flush()
+    # Просроченная запись не попадает в файл даже при большом TTL у читателя.
+    reloaded = TTLDiskCache(tmp_path / "cache.json", ttl_seconds=3600, clock=lambda: now[0])
+    assert reloaded.get("1") == (False, None)
+    assert reloaded.get("2") == (True, {"bio": "z"})
+
+
+class SlowLookup:
+    def __init__(self):
+        self.calls = []
+
+    def get_chat(self, chat_id):
+        self.calls.append(chat_id)
+        return {"bio": f"bio {chat_id}"}
+
+
+def test_enricher_stops_at_deadline_without_caching_skipped(tmp_path):
+    import time
+
+    api = SlowLookup()
+    cache = TTLDiskCache(tmp_path / "c.json", 3600)
+    # Один запрос в секунду: второй профиль в дедлайн 0.2 с уже не помещается.
+    enricher = ProfileEnricher(api, cache, TokenBucket(rate=1, burst=1), max_workers=1)
+
+    started = time.monotonic()
+    updated = enricher.enrich(_result(), timeout=0.2)
+
+    assert time.monotonic() - started < 0.5
+    assert updated == 1 and len(api.calls) == 1
+    assert cache.get(api.calls[0])[0]
+    assert not any(cache.get(key)[0] for key in ("1", "2", "3", "@carol") if key not in api.calls)
+
+
+def test_enricher_respects_profile_budget(telegram_server, tmp_path):
+    base_url, hits = telegram_server
+    config = TelegramConfig(token="t", poll_interval=1, poll_timeout=1, base_url=base_url, file_base_url=base_url)
+    enricher = ProfileEnricher(
+        TelegramAPIAdapter(config), TTLDiskCache(tmp_path / "c.json", 3600), TokenBucket(rate=0), max_profiles=2
+    )
+    enricher.enrich(_result())
+    assert len(hits) == 2
@@ -1,8 +1,11 @@
 import io
 from zipfile import ZipFile
 
+from openpyxl import load_workbook
+
 from audience_bot.domain.reporting import ExcelReport, SheetModel
 from audience_bot.infrastructure.excel_renderer import ExcelRendererAdapter
+from audience_bot.infrastructure.xlsx_stream import StreamingExcelRendererAdapter
 
 
 def make_excel_report() -> ExcelReport:
@@ -24,3 +27,49 @@ def test_excel_renderer_creates_workbook():
         assert "xl/workbook.xml" in names
         assert "xl/worksheets/sheet1.xml" in names
         assert any(name.endswith(".rels") for name in names)
+
+
+def _profiles_report(count: int) -> ExcelReport:
+    columns = ["Дата экспорта", "user_id", "Username", "Отображаемое имя", "Описание"]
+    rows = [
+        {
+            "Дата экспорта": "2025-01-01 10:00:00",
+            "user_id": str(index),
+            "Username": f"@user{index}",
+            "Отображаемое имя": f"Имя <{index}> & Ко",
+            "Описание": " с пробелом " if index % 3 == 0 else "",
+        }
+        for index in range(count)
+    ]
+    return ExcelReport(sheets=[SheetModel(name="Участники", columns=columns, rows=rows), SheetModel("Пусто", columns, [])])
+
+
+def test_streaming_renderer_matches_openpyxl_renderer():
+    report = _profiles_report(30)
+    streamed = load_workbook(io.BytesIO(StreamingExcelRendererAdapter().render(report)))
+    reference = load_workbook(io.BytesIO(ExcelRendererAdapter().render(report)))
+
+    assert streamed.sheetnames == reference.sheetnames
+    for name in reference.sheetnames:
+        ours, theirs = streamed[name], reference[name]
+        assert [[cell.value for cell in row] for row in ours.iter_rows()] == [
+            [cell.value for cell in row] for row in theirs.iter_rows()
+        ]
+        assert ours.freeze_panes == theirs.freeze_panes == "A2"
+        assert ours.auto_filter.ref == theirs.auto_filter.ref
+        for letter in "ABCDE":
+            assert ours.column_dimensions[letter].width == theirs.column_dimensions[letter].width
+    sheet = streamed["Участники"]
+    assert sheet["A1"].font.b and sheet["A1"].fill.fgColor.rgb == "FFEFEFEF"
+    assert sheet["E3"].border.left.style == "thin"
+
+
+def test_streaming_renderer_shares_repeated_values():
+    payload = StreamingExcelRendererAdapter().render(_profiles_report(100))
+    with ZipFile(io.BytesIO(payload)) as archive:
+        shared = archive.read("xl/sharedStrings.xml").decode("utf-8")
+        sheet = archive.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert shared.count("2025-01-01 10:00:00") == 1
+    assert "@user42" in sheet and "@user42" not in shared
+    # Одинаковый отчёт — одинаковые байты.
+    assert StreamingExcelRendererAdapter().render(_profiles_report(100)) == payload
@@ -0,0 +1,67 @@
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from audience_bot.application.metrics import REGISTRY, STAGE_SECONDS, STAGE_TOTAL, MetricsRegistry, observe_stage
+from audience_bot.application.usecases.dto import RawFileDTO
+from audience_bot.cli import create_pipeline
+from audience_bot.infrastructure.metrics_server import CONTENT_TYPE, MetricsServer
+
+
+def test_histogram_and_counter_render_prometheus_text():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("demo_seconds", "Демо.", ("stage",), buckets=(0.1, 1.0))
+    counter = registry.counter("demo_total", "Демо.", ("stage",))
+    gauge = registry.gauge("demo_sessions", "Демо.")
+    histogram.observe(0.05, stage='pa"rse')
+    histogram.observe(0.1, stage='pa"rse')
+    histogram.observe(3, stage='pa"rse')
+    counter.inc(stage="parse")
+    gauge.set_function(lambda: 7)
+
+    lines = registry.render().splitlines()
+
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="pa\\"rse",le="0.1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="pa\\"rse",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="pa\\"rse"} 3' in lines
+    assert 'demo_total{stage="parse"} 1' in lines
+    assert "demo_sessions 7" in lines
+    with pytest.raises(ValueError):
+        counter.inc(format="x")
+
+
+def test_observe_stage_records_errors_and_late_format():
+    errors_before = STAGE_TOTAL.value(stage="test-stage", format="", outcome="error")
+    with pytest.raises(RuntimeError):
+        with observe_stage("test-stage"):
+            raise RuntimeError("boom")
+    with observe_stage("test-stage") as stage:
+        stage.format = "csv"
+
+    assert STAGE_TOTAL.value(stage="test-stage", format="", outcome="error") == errors_before + 1
+    assert STAGE_SECONDS.count(stage="test-stage", format="csv") >= 1
+
+
+def test_pipeline_stages_are_exposed_over_http():
+    path = Path("tests/data/sample.json")
+    raw = RawFileDTO(path=str(path), filename=path.name, content=path.read_bytes())
+    parsed_before = STAGE_SECONDS.count(stage="parse", format="json")
+    create_pipeline().execute([raw], chat_name="Demo", user_id="u")
+    assert STAGE_SECONDS.count(stage="parse", format="json") == parsed_before + 1
+
+    server = MetricsServer(REGISTRY, port=0)
+    server.start()
+    try:
+        host, port = server.address
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as response:
+            body = response.read().decode("utf-8")
+            content_type = response.headers["Content-Type"]
+    finally:
+        server.stop()
+
+    assert content_type == CONTENT_TYPE
+    assert 'audience_bot_stage_duration_seconds_count{stage="extract",format=""}' in body
+    assert 'audience_bot_stage_total{stage="build",format="plain_text",outcome="ok"}' in body
+    assert "audience_bot_active_sessions" in body
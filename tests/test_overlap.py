@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from audience_bot.application.usecases.dto import RawFileDTO
+from audience_bot.cli import create_pipeline
+from audience_bot.domain.extraction import AudienceOverlap, AudienceProfile, ExtractionResult, ProfileId, ProfileType
+from audience_bot.domain.reporting import OverlapReportBuilder
+
+
+def make_result(user_ids) -> ExtractionResult:
+    result = ExtractionResult()
+    for user_id in user_ids:
+        result.add_participant(
+            AudienceProfile(
+                profile_id=ProfileId(user_id=user_id, username=None, display_name=f"User {user_id}"),
+                profile_type=ProfileType.PARTICIPANT,
+                username=None,
+                display_name=f"User {user_id}",
+            )
+        )
+    return result
+
+
+def test_overlap_set_operations():
+    overlap = AudienceOverlap.build(
+        [
+            ("A", make_result([1, 2, 3])),
+            ("B", make_result([2, 3, 4])),
+            ("C", make_result([3, 5])),
+        ]
+    )
+
+    assert len(overlap.table) == 5
+    assert {p.profile_id.user_id for p in overlap.profiles(overlap.intersection())} == {3}
+    assert overlap.union().bit_count() == 5
+    assert {p.profile_id.user_id for p in overlap.profiles(overlap.difference("A"))} == {1}
+    assert {p.profile_id.user_id for p in overlap.profiles(overlap.difference("B", others=["A"]))} == {4}
+    pairs = {(left.name, right.name): common.bit_count() for left, right, common in overlap.pairwise()}
+    assert pairs == {("A", "B"): 2, ("A", "C"): 1, ("B", "C"): 1}
+
+
+def test_overlap_report_sheets():
+    overlap = AudienceOverlap.build([("A", make_result([1, 2])), ("B", make_result([2]))])
+
+    sheets = OverlapReportBuilder().build(overlap)
+
+    assert [sheet.name for sheet in sheets] == ["Сводка по чатам", "Пары чатов", "Присутствие"]
+    presence = sheets[2]
+    assert presence.columns[-3:] == ["A", "B", "Число чатов"]
+    assert presence.rows[0]["user_id"] == "2"
+    assert presence.rows[0]["Число чатов"] == "2"
+
+
+@pytest.mark.slow
+def test_overlap_scales_to_ten_chats():
+    chats = [(f"chat-{n}", make_result(range(n * 5_000, n * 5_000 + 20_000))) for n in range(10)]
+
+    started = time.perf_counter()
+    overlap = AudienceOverlap.build(chats)
+    rows = OverlapReportBuilder().build(overlap)[2].rows
+    elapsed = time.perf_counter() - started
+
+    assert len(overlap.table) == 65_000
+    assert len(rows) == 65_000
+    assert overlap.intersection().bit_count() == 0
+    assert elapsed < 30
+
+
+def test_pipeline_overlap_groups_files_by_chat_name():
+    first = b'{"name":"Chat A","messages":[{"id":1,"text":"a","from":"Ann","from_id":"user1"},{"id":2,"text":"b","from":"Bob","from_id":"user2"}]}'
+    second = b'{"name":"Chat B","messages":[{"id":1,"text":"c","from":"Bob","from_id":"user2"}]}'
+    files = [
+        RawFileDTO(path="<a>", filename="a.json", content=first),
+        RawFileDTO(path="<b>", filename="b.json", content=second),
+    ]
+
+    report = create_pipeline().execute_overlap(files, chat_name=None, user_id="u")
+
+    assert report.format.value == "excel"
+    assert report.excel_bytes
@@ -92,3 +92,103 @@ def test_parse_sample_html_file(parser_adapter: ParserAdapter, sample_html_raw:
     assert any(msg.author for msg in parsed.messages), "Ожидается наличие авторов"
     assert any(msg.text for msg in parsed.messages), "Ожидается наличие текста"
     assert all(msg.timestamp for msg in parsed.messages if msg.timestamp is not None)
+
+
+def test_parse_respects_time_window(parser_adapter: ParserAdapter):
+    from audience_bot.domain.messages import TimeWindow
+
+    old = b'{"messages":[{"id":1,"text":"old","date":"2024-01-01T10:00:00","from":"Old","from_id":"1"}]}'
+    mixed = (
+        b'{"messages":['
+        b'{"id":2,"text":"before","date":"2025-01-01T10:00:00","from":"A","from_id":"2"},'
+        b'{"id":3,"text":"inside","date":"2025-02-01T10:00:00","from":"B","from_id":"3"},'
+        b'{"id":4,"text":"after","date":"2025-04-01T10:00:00","from":"C","from_id":"4"}]}'
+    )
+    files = [
+        RawFileDTO(path="<old>", filename="old.json", content=old),
+        RawFileDTO(path="<mixed>", filename="mixed.json", content=mixed),
+    ]
+    window = TimeWindow.from_spec("2025-01-15..2025-03-31")
+
+    parsed = parser_adapter.parse(files, window=window)
+
+    assert [msg.text for msg in parsed.messages] == ["inside"]
+
+
+def test_time_window_keeps_undated_messages(parser_adapter: ParserAdapter):
+    from audience_bot.domain.messages import TimeWindow
+
+    undated = b'{"messages":[{"id":1,"text":"no date","from":"A","from_id":"1"}]}'
+    old = (
+        b'{"messages":['
+        b'{"id":2,"text":"old","date":"2024-01-01T10:00:00","from":"B","from_id":"2"},'
+        b'{"id":3,"text":"old undated","from":"C","from_id":"3"}]}'
+    )
+    files = [
+        RawFileDTO(path="<undated>", filename="undated.json", content=undated),
+        RawFileDTO(path="<old>", filename="old.json", content=old),
+    ]
+    window = TimeWindow.from_spec("2025-01-15..2025-03-31")
+
+    parsed = parser_adapter.parse(files, window=window)
+
+    assert [msg.text for msg in parsed.messages] == ["no date", "old undated"]
+
+
+def test_file_outside_window_is_skipped_without_reading_every_date(parser_adapter: ParserAdapter):
+    import json
+    from unittest import mock
+
+    from audience_bot.domain.messages import ChatMessage, TimeWindow
+
+    entries = [
+        {"id": number, "text": "old", "date": f"2024-01-{number:02d}T10:00:00", "from": "A", "from_id": "1"}
+        for number in range(1, 29)
+    ]
+    entries.insert(10, {"id": 100, "text": "undated", "from": "B", "from_id": "2"})
+    old = RawFileDTO(path="<old>", filename="old.json", content=json.dumps({"messages": entries}).encode())
+    window = TimeWindow.from_spec("2025-01-15..2025-03-31")
+
+    peek_spy = mock.patch.object(ChatMessage, "peek_timestamp", wraps=ChatMessage.peek_timestamp)
+    build_spy = mock.patch.object(ChatMessage, "from_dict", wraps=ChatMessage.from_dict)
+    with peek_spy as peek, build_spy as build:
+        parsed = parser_adapter.parse([old], window=window)
+
+    assert [msg.text for msg in parsed.messages] == ["undated"]
+    # Разобраны только даты первой и последней записи, сообщение построено одно — без даты.
+    assert peek.call_count == 2
+    assert build.call_count == 1
+
+
+def test_time_window_spec_parsing():
+    from datetime import datetime
+
+    from audience_bot.domain.messages import TimeWindow
+
+    window = TimeWindow.from_spec("2025-01-01..2025-01-31")
+    assert window.contains(datetime(2025, 1, 31, 23, 59))
+    assert not window.contains(datetime(2025, 2, 1))
+    assert window.contains(None)
+
+    recent = TimeWindow.from_spec("30d", now=datetime(2025, 3, 1))
+    assert recent.since == datetime(2025, 1, 30)
+    assert recent.until is None
+
+    with pytest.raises(ValueError):
+        TimeWindow.from_spec("yesterday")
+
+
+def test_watermark_skips_ingested_messages(parser_adapter: ParserAdapter, sample_json_raw: RawFileDTO):
+    from audience_bot.domain.messages import Watermark
+
+    requested = []
+
+    def lookup(chat_id):
+        requested.append(chat_id)
+        return Watermark(message_id=788)
+
+    parsed = parser_adapter.parse([sample_json_raw], watermarks=lookup)
+
+    assert requested == ["2283832941"]
+    assert [msg.message_id for msg in parsed.messages] == [str(number) for number in range(789, 794)]
+    assert parser_adapter.parse([sample_json_raw], watermarks=lambda _: Watermark(message_id=793)).messages == []
@@ -22,4 +22,250 @@ class PipelineTests(unittest.TestCase):
         report = pipeline.execute([raw_file], chat_name="Demo chat", user_id="tester")
 
         self.assertEqual(report.format.value, "plain_text")
-        self.assertIn("UserOne", report.text or "")
+        self.assertIn("UserOne", report.full_text() or "")
+
+
+class PipelineEnrichmentBudgetTests(unittest.TestCase):
+    def test_slow_enrichment_does_not_exceed_processing_limit(self):
+        import time
+        from unittest import mock
+
+        from dependency_injector import providers
+
+        from audience_bot.application.container import AppContainer
+
+        timeouts = []
+
+        class SlowEnricher:
+            def enrich(self, result, timeout=None):
+                timeouts.append(timeout)
+                time.sleep(1.2)
+                return 0
+
+        path = Path("tests/data/sample.json")
+        raw_file = RawFileDTO(path=str(path), filename=path.name, content=path.read_bytes())
+        with mock.patch.dict(os.environ, {"MAX_PROCESSING_SECONDS": "1", "REPORT_TEXT_THRESHOLD": "1000"}):
+            container = AppContainer()
+            container.profile_enricher.override(providers.Object(SlowEnricher()))
+            report = container.pipeline().execute([raw_file], chat_name=None, user_id="tester")
+
+        self.assertIn("UserOne", report.full_text())
+        self.assertTrue(0 < timeouts[0] <= 1)
+
+
+class PipelineAudienceStoreTests(unittest.TestCase):
+    def test_second_run_reports_delta_in_text(self):
+        import tempfile
+        from unittest import mock
+
+        path = Path("tests/data/sample.json")
+        raw_file = RawFileDTO(path=str(path), filename=path.name, content=path.read_bytes())
+        with tempfile.TemporaryDirectory() as directory:
+            store_path = str(Path(directory) / "audience.sqlite")
+            with mock.patch.dict(os.environ, {"AUDIENCE_STORE_PATH": store_path, "REPORT_TEXT_THRESHOLD": "1000"}):
+                pipeline = create_pipeline()
+            pipeline.execute([raw_file], chat_name="Demo chat", user_id="tester")
+            report = pipeline.execute([raw_file], chat_name="Demo chat", user_id="tester")
+
+        self.assertIn("новых 0, ушли 0", report.full_text() or "")
+
+
+    def test_same_named_chats_of_different_users_do_not_share_history(self):
+        import json
+        import tempfile
+        from unittest import mock
+
+        def export(chat_id, authors):
+            messages = [
+                {"id": number, "type": "message", "date": "2025-01-01T10:00:00", "from": name, "from_id": f"user{uid}"}
+                for number, (uid, name) in enumerate(authors, start=1)
+            ]
+            payload = {"name": "Чат", "type": "private_group", "id": chat_id, "messages": messages}
+            return RawFileDTO(path="<chat>", filename="result.json", content=json.dumps(payload).encode())
+
+        alice_chat = export(1, [(11, "Alice"), (12, "Alina")])
+        bob_chat = export(2, [(21, "Bob"), (22, "Boris")])
+        with tempfile.TemporaryDirectory() as directory:
+            env = {"AUDIENCE_STORE_PATH": str(Path(directory) / "audience.sqlite"), "REPORT_TEXT_THRESHOLD": "1000"}
+            with mock.patch.dict(os.environ, env):
+                pipeline = create_pipeline()
+            pipeline.execute([alice_chat], chat_name=None, user_id="alice")
+            bob_report = pipeline.execute([bob_chat], chat_name=None, user_id="bob")
+            alice_report = pipeline.execute([alice_chat], chat_name=None, user_id="alice")
+            # Тот же чат у другого пользователя — своя история.
+            shared = pipeline.execute([alice_chat], chat_name=None, user_id="bob")
+
+        self.assertIn("Первый сохранённый отчёт", bob_report.full_text())
+        self.assertNotIn("Alice", bob_report.full_text())
+        self.assertIn("новых 0, ушли 0", alice_report.full_text())
+        self.assertNotIn("Bob", alice_report.full_text())
+        self.assertIn("Первый сохранённый отчёт", shared.full_text())
+
+
+class PipelineIncrementalIngestionTests(unittest.TestCase):
+    def test_cumulative_export_processes_only_new_tail(self):
+        import json
+        import tempfile
+        from unittest import mock
+
+        path = Path("tests/data/sample.json")
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        early = dict(payload, messages=payload["messages"][:6])
+        full = RawFileDTO(path=str(path), filename=path.name, content=path.read_bytes())
+        partial = RawFileDTO(path="early.json", filename="early.json", content=json.dumps(early).encode())
+
+        with tempfile.TemporaryDirectory() as directory:
+            env = {
+                "AUDIENCE_STORE_PATH": str(Path(directory) / "audience.sqlite"),
+                "INCREMENTAL_INGESTION": "true",
+                "REPORT_TEXT_THRESHOLD": "1000",
+            }
+            with mock.patch.dict(os.environ, env):
+                pipeline = create_pipeline()
+            pipeline.execute([partial], chat_name=None, user_id="tester")
+            parsed_counts = []
+            original_parse = pipeline._parse.execute
+
+            def spy(*args, **kwargs):
+                parsed = original_parse(*args, **kwargs)
+                parsed_counts.append(len(parsed.messages))
+                return parsed
+
+            with mock.patch.object(pipeline._parse, "execute", spy):
+                report = pipeline.execute([full], chat_name=None, user_id="tester")
+                again = pipeline.execute([full], chat_name=None, user_id="tester")
+
+        self.assertEqual(parsed_counts, [len(payload["messages"]) - 6, 0])
+        reference = create_pipeline().execute([full], chat_name=None, user_id="tester")
+        self.assertEqual(sorted(report.full_text().splitlines()[:-2]), sorted(reference.full_text().splitlines()))
+        self.assertIn("новых 0, ушли 0", again.full_text() or "")
+
+    def test_incremental_runs_keep_activity_and_provenance_of_full_run(self):
+        import json
+        import tempfile
+
+        path = Path("tests/data/sample.json")
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        early = dict(payload, messages=payload["messages"][:6])
+        full = RawFileDTO(path=str(path), filename=path.name, content=path.read_bytes())
+        partial = RawFileDTO(path="early.json", filename="early.json", content=json.dumps(early).encode())
+
+        def snapshot(report):
+            audience = report.audience
+            days = [(day.day, day.messages, day.unique_authors) for day in audience.activity.days()]
+            sources = {
+                profile.profile_id: audience.provenance.describe(profile.profile_id)
+                for _, profile in audience.iter_entries()
+            }
+            return days, sources
+
+        with tempfile.TemporaryDirectory() as directory:
+            pipeline = self._pipeline(directory, PROVENANCE_CAP="20")
+            pipeline.execute([partial], chat_name=None, user_id="tester")
+            cumulative = snapshot(pipeline.execute([full], chat_name=None, user_id="tester"))
+            # Повторная загрузка без новых сообщений: история целиком из хранилища.
+            unchanged = snapshot(pipeline.execute([full], chat_name=None, user_id="tester"))
+            whole = self._pipeline(directory, PROVENANCE_CAP="20", INCREMENTAL_INGESTION="false")
+            reference = snapshot(whole.execute([full], chat_name=None, user_id="other"))
+
+        self.assertEqual(sum(messages for _, messages, _ in cumulative[0]), 11)
+        self.assertEqual(cumulative, reference)
+        self.assertEqual(unchanged, reference)
+
+    def _export(self, chat_id, authors, name="Чат"):
+        import json
+
+        messages = [
+            {"id": number, "type": "message", "date": f"2025-01-0{number}T10:00:00", "from": author, "from_id": f"user{uid}"}
+            for number, (uid, author) in enumerate(authors, start=1)
+        ]
+        payload = {"name": name, "type": "private_group", "id": chat_id, "messages": messages}
+        return RawFileDTO(path="<chat>", filename=f"chat{chat_id}.json", content=json.dumps(payload).encode())
+
+    def _pipeline(self, directory, **extra):
+        from unittest import mock
+
+        env = {
+            "AUDIENCE_STORE_PATH": str(Path(directory) / "audience.sqlite"),
+            "INCREMENTAL_INGESTION": "true",
+            "REPORT_TEXT_THRESHOLD": "1000",
+            **extra,
+        }
+        with mock.patch.dict(os.environ, env):
+            return create_pipeline()
+
+    def test_each_chat_keeps_its_own_watermark_and_audience(self):
+        import tempfile
+
+        from audience_bot.infrastructure.audience_store import SqliteAudienceStore
+
+        first = self._export(1, [(11, "Alice"), (12, "Alina"), (13, "Anna")])
+        second = self._export(2, [(21, "Bob"), (22, "Boris")])
+        foreign = self._export(1, [(31, "Victor")])
+        with tempfile.TemporaryDirectory() as directory:
+            pipeline = self._pipeline(directory)
+            pipeline.execute([first], chat_name=None, user_id="u")
+            # Номера сообщений второго чата не выше границы первого — они всё равно новые.
+            both = pipeline.execute([first, second], chat_name=None, user_id="u")
+            other_user = pipeline.execute([foreign], chat_name=None, user_id="v")
+            store = SqliteAudienceStore(Path(directory) / "audience.sqlite")
+            watermarks = [store.load_watermark(key).message_id for key in ("u:1", "u:2", "v:1")]
+
+        self.assertIn("Bob", both.full_text())
+        self.assertIn("Alice", both.full_text())
+        self.assertEqual(watermarks, [3, 2, 1])
+        self.assertIn("Victor", other_user.full_text())
+        self.assertNotIn("Alice", other_user.full_text())
+
+    def test_failed_report_does_not_advance_watermark(self):
+        import tempfile
+        from unittest import mock
+
+        from audience_bot.application.usecases.exceptions import PipelineError
+
+        chat = self._export(1, [(11, "Alice"), (12, "Alina")])
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(PipelineError):
+                self._pipeline(directory, MAX_PROCESSING_SECONDS="-1").execute([chat], chat_name=None, user_id="u")
+            pipeline = self._pipeline(directory)
+            original_parse = pipeline._parse.execute
+            parsed_counts = []
+
+            def spy(*args, **kwargs):
+                parsed = original_parse(*args, **kwargs)
+                parsed_counts.append(len(parsed.messages))
+                return parsed
+
+            with mock.patch.object(pipeline._parse, "execute", spy):
+                retry = pipeline.execute([chat], chat_name=None, user_id="u")
+
+        # Повтор после сбоя разбирает те же сообщения заново, а не считает их уже учтёнными.
+        self.assertEqual(parsed_counts, [2])
+        self.assertIn("Alice", retry.full_text())
+
+    def test_concurrent_runs_of_one_chat_do_not_overwrite_each_other(self):
+        import tempfile
+        from unittest import mock
+
+        from audience_bot.infrastructure.audience_store import SqliteAudienceStore
+
+        seed = self._export(1, [(11, "Alice"), (12, "Alina")])
+        slow = self._export(1, [(11, "Alice"), (12, "Alina"), (13, "Anna")])
+        fast = self._export(1, [(11, "Alice"), (12, "Alina"), (13, "Anna"), (14, "Boris")])
+        with tempfile.TemporaryDirectory() as directory:
+            self._pipeline(directory).execute([seed], chat_name=None, user_id="u")
+            first, second = self._pipeline(directory), self._pipeline(directory)
+            original_build = first._build_report
+
+            def build_after_other_run(*args, **kwargs):
+                # Второй прогон того же чата успевает сохраниться, пока первый строит отчёт.
+                second.execute([fast], chat_name=None, user_id="u")
+                return original_build(*args, **kwargs)
+
+            with mock.patch.object(first, "_build_report", build_after_other_run):
+                first.execute([slow], chat_name=None, user_id="u")
+            state = SqliteAudienceStore(Path(directory) / "audience.sqlite").load_ingestion("u:1")
+
+        names = {profile.display_name for _, profile in state.result.iter_entries()}
+        self.assertTrue({"Anna", "Boris"} <= names)
+        self.assertEqual((state.watermark.message_id, state.message_count), (4, 4))
@@ -10,7 +10,7 @@ class DummyParser:
     def __init__(self, messages_count: int):
         self.messages_count = messages_count
 
-    def parse(self, files):
+    def parse(self, files, window=None, watermarks=None):
         return ParsedMessagesDTO(messages=[object()] * self.messages_count)
 
 
@@ -0,0 +1,125 @@
+import cProfile
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+from unittest import mock
+
+from audience_bot.application.metrics import observe_stage
+from audience_bot.application.profiling import StageProfiler, active_profiler, configure_profiling
+from audience_bot.application.usecases.dto import RawFileDTO
+from audience_bot.cli import create_pipeline
+
+
+@pytest.fixture
+def profiler(tmp_path):
+    stage_profiler = StageProfiler(tmp_path / "profile")
+    configure_profiling(stage_profiler)
+    yield stage_profiler
+    configure_profiling(None)
+
+
+def _allocate():
+    return [str(index) * 8 for index in range(20_000)]
+
+
+def test_pipeline_stages_are_profiled_separately(profiler):
+    data = Path("tests/data/sample.json").read_bytes()
+    files = [RawFileDTO(path="sample.json", filename="sample.json", content=data)]
+    create_pipeline().execute(files, chat_name=None, user_id="u")
+
+    written = profiler.dump()
+
+    names = {path.name for path in written}
+    assert {"parse.pstats", "parse.folded", "build.pstats", "build.folded", "memory.json"} <= names
+    stats = pstats.Stats(str(profiler.output_dir / "parse.pstats"))
+    assert any(function == "parse" for _, _, function in stats.stats)
+    memory = json.loads((profiler.output_dir / "memory.json").read_text(encoding="utf-8"))
+    assert memory["parse"]["calls"] == 1
+    assert memory["parse"]["peak_bytes"] > 0
+
+
+def test_nested_stage_is_not_counted_in_outer(profiler):
+    with observe_stage("outer"):
+        with observe_stage("inner"):
+            kept = _allocate()
+
+    profiler.dump()
+
+    outer = pstats.Stats(str(profiler.output_dir / "outer.pstats"))
+    inner = pstats.Stats(str(profiler.output_dir / "inner.pstats"))
+    assert not any(function == "_allocate" for _, _, function in outer.stats)
+    assert any(function == "_allocate" for _, _, function in inner.stats)
+    memory = json.loads((profiler.output_dir / "memory.json").read_text(encoding="utf-8"))
+    assert memory["inner"]["peak_bytes"] >= len(kept) * 8
+    assert any("test_profiling.py" in item["location"] for item in memory["inner"]["top_allocations"])
+    folded = (profiler.output_dir / "inner.folded").read_text(encoding="utf-8").splitlines()
+    assert any("_allocate" in line and line.rsplit(" ", 1)[1].isdigit() for line in folded)
+
+
+def test_profiling_is_off_by_default(tmp_path):
+    assert active_profiler() is None
+    assert not tracemalloc.is_tracing()
+    with observe_stage("idle"):
+        _allocate()
+    assert not tracemalloc.is_tracing()
+
+
+def test_configure_profiling_stops_tracemalloc(tmp_path):
+    configure_profiling(StageProfiler(tmp_path))
+    assert tracemalloc.is_tracing()
+    configure_profiling(None)
+    assert not tracemalloc.is_tracing()
+    assert StageProfiler(tmp_path / "empty").dump() == []
+
+
+class _ExclusiveProfile(cProfile.Profile):
+    """Как cProfile в Python 3.12+: второй включённый профилировщик — ошибка."""
+
+    active = 0
+    guard = threading.Lock()
+
+    def enable(self, *args, **kwargs):
+        with self.guard:
+            if _ExclusiveProfile.active:
+                raise ValueError("Another profiling tool is already active")
+            _ExclusiveProfile.active += 1
+        super().enable(*args, **kwargs)
+
+    def disable(self):
+        super().disable()
+        with self.guard:
+            _ExclusiveProfile.active -= 1
+
+
+def test_concurrent_stages_are_profiled_one_at_a_time(profiler):
+    errors = []
+    start = threading.Barrier(4)
+
+    def run():
+        try:
+            start.wait()
+            with observe_stage("concurrent"):
+                with observe_stage("concurrent_inner"):
+                    _allocate()
+                time.sleep(0.01)
+        except Exception as exc:
+            errors.append(exc)
+
+    with mock.patch("audience_bot.application.profiling.cProfile.Profile", _ExclusiveProfile):
+        threads = [threading.Thread(target=run) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert errors == []
+    profiler.dump()
+    memory = json.loads((profiler.output_dir / "memory.json").read_text(encoding="utf-8"))
+    assert memory["concurrent"]["calls"] == 4 and memory["concurrent_inner"]["calls"] == 4
+    # Пик внутреннего этапа — его собственные аллокации, а не сумма по потокам.
+    assert memory["concurrent_inner"]["peak_bytes"] < 4 * 20_000 * 100
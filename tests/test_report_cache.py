@@ -0,0 +1,141 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from audience_bot.application.config import PipelineConfig
+from audience_bot.application.services.conversation import ConversationService
+from audience_bot.application.services.report_cache import ReportCache, report_key
+from audience_bot.application.services.sessions import InMemorySessionStore
+from audience_bot.application.usecases.dto import RawFileDTO, ReportDTO
+from audience_bot.application.usecases.exceptions import PipelineError
+from audience_bot.domain.reporting import ReportFormat
+from audience_bot.infrastructure.temp_storage import InMemoryTempStorageAdapter
+
+
+def _text(size: int) -> ReportDTO:
+    return ReportDTO(format=ReportFormat.PLAIN_TEXT, text="x" * size)
+
+
+def test_key_ignores_file_order_but_not_settings():
+    assert report_key(["b", "a"], None, ReportFormat.CSV) == report_key(["a", "b"], None, ReportFormat.CSV)
+    assert report_key(["a"], None, ReportFormat.CSV) != report_key(["a"], None, ReportFormat.JSONL)
+
+
+def test_cache_evicts_least_recently_used_within_byte_budget():
+    cache = ReportCache(max_bytes=250, ttl_seconds=60)
+    cache.get_or_compute("a", lambda: _text(100))
+    cache.get_or_compute("b", lambda: _text(100))
+    cache.get_or_compute("a", lambda: pytest.fail("a должен быть в кэше"))
+    cache.get_or_compute("c", lambda: _text(100))
+
+    assert cache.size_bytes == 200
+    assert cache.get_or_compute("a", lambda: _text(1)).text == "x" * 100
+    assert cache.get_or_compute("b", lambda: _text(1)).text == "x"
+    # Отчёт больше бюджета не кэшируется вовсе.
+    cache.get_or_compute("huge", lambda: _text(1000))
+    assert cache.get_or_compute("huge", lambda: _text(2)).text == "xx"
+
+
+def test_cache_entries_expire_after_ttl():
+    cache = ReportCache(max_bytes=1000, ttl_seconds=0)
+    cache.get_or_compute("a", lambda: _text(1))
+    assert cache.get_or_compute("a", lambda: _text(2)).text == "xx"
+
+
+def test_concurrent_identical_requests_share_one_computation():
+    cache = ReportCache(max_bytes=1000, ttl_seconds=60)
+    calls = []
+    started = threading.Event()
+
+    def compute():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return _text(3)
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("k", compute))) for _ in range(5)]
+    threads[0].start()
+    started.wait()
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert len(results) == 5 and all(result is results[0] for result in results)
+
+
+def test_failures_are_shared_with_waiters_but_not_cached():
+    cache = ReportCache(max_bytes=1000, ttl_seconds=60)
+
+    def fail():
+        raise PipelineError("boom")
+
+    with pytest.raises(PipelineError):
+        cache.get_or_compute("k", fail)
+    assert cache.get_or_compute("k", lambda: _text(1)).text == "x"
+
+
+def test_streamed_reports_are_rendered_once_and_replayed():
+    cache = ReportCache(max_bytes=1000, ttl_seconds=60)
+    writes = []
+
+    def writer(sink):
+        writes.append(1)
+        sink.write(b"a,b\n")
+
+    report = cache.get_or_compute("k", lambda: ReportDTO(format=ReportFormat.CSV, writer=writer))
+    assert report.file_bytes() == b"a,b\n" and report.file_bytes() == b"a,b\n"
+    assert len(writes) == 1
+
+
+class CountingPipeline:
+    def __init__(self):
+        self.calls = 0
+
+    def execute(self, files, chat_name, user_id, window=None, report_format=None):
+        self.calls += 1
+        return ReportDTO(format=ReportFormat.PLAIN_TEXT, text="report")
+
+
+def test_conversation_reuses_report_for_identical_uploads_across_users():
+    pipeline = CountingPipeline()
+    service = ConversationService(
+        InMemorySessionStore(),
+        pipeline,
+        InMemoryTempStorageAdapter(),
+        PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024),
+        report_cache=ReportCache(max_bytes=1024 * 1024, ttl_seconds=60),
+    )
+    content = Path("tests/data/sample.json").read_bytes()
+    for user_id in ("admin-1", "admin-2"):
+        service.upload_file(user_id, RawFileDTO(path="a", filename="export.json", content=content))
+        assert service.process(user_id, chat_name=None).text == "report"
+    service.upload_file("admin-3", RawFileDTO(path="a", filename="export.json", content=content))
+    service.process("admin-3", chat_name=None, report_format=ReportFormat.CSV)
+
+    assert pipeline.calls == 2
+
+
+def test_conversation_bypasses_cache_when_audience_history_is_stored(tmp_path):
+    pipeline = CountingPipeline()
+    config = PipelineConfig(
+        max_files=2, max_file_size=10 * 1024 * 1024, audience_store_path=str(tmp_path / "audience.sqlite")
+    )
+    service = ConversationService(
+        InMemorySessionStore(),
+        pipeline,
+        InMemoryTempStorageAdapter(),
+        config,
+        report_cache=ReportCache(max_bytes=1024 * 1024, ttl_seconds=60),
+    )
+    content = Path("tests/data/sample.json").read_bytes()
+    for user_id in ("admin-1", "admin-1", "admin-2"):
+        service.upload_file(user_id, RawFileDTO(path="a", filename="export.json", content=content))
+        service.process(user_id, chat_name=None)
+
+    # Каждый прогон обновляет историю чата — отчёт строится заново, а не берётся у другого пользователя.
+    assert pipeline.calls == 3
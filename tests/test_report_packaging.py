@@ -0,0 +1,68 @@
+from audience_bot.domain.reporting import ExcelReport, ReportPackager, SheetModel, paginate
+
+
+def _sheet(name: str, count: int) -> SheetModel:
+    columns = ["id", "name"]
+    return SheetModel(
+        name=name,
+        columns=columns,
+        source=lambda: ((f"{idx:05d}", f"user-{idx:05d}") for idx in range(count)),
+        size=count,
+    )
+
+
+def test_fit_rows_splits_long_sheets_into_numbered_sheets():
+    report = ExcelReport(sheets=[_sheet("Участники", 25), _sheet("Упомянутые", 3)])
+
+    fitted = ReportPackager(max_sheet_rows=10).fit_rows(report)
+
+    assert [sheet.name for sheet in fitted.sheets] == [
+        "Участники",
+        "Участники (2)",
+        "Участники (3)",
+        "Упомянутые",
+    ]
+    assert [sheet.row_count() for sheet in fitted.sheets] == [10, 10, 5, 3]
+    assert list(fitted.sheets[1].iter_values())[0] == ("00010", "user-00010")
+
+
+def test_estimate_grows_with_rows_and_xlsx_costs_more_than_csv():
+    packager = ReportPackager()
+    small = packager.estimate(ExcelReport(sheets=[_sheet("A", 100)]))
+    large = packager.estimate(ExcelReport(sheets=[_sheet("A", 10_000)]))
+
+    assert small.rows == 100 and large.rows == 10_000
+    assert large.xlsx_bytes > small.xlsx_bytes * 50
+    assert large.xlsx_bytes > large.csv_zip_bytes
+    assert packager.fits_xlsx(large)
+    assert not ReportPackager(max_file_bytes=1_000).fits_xlsx(large)
+
+
+def test_partition_keeps_every_row_once_within_budget():
+    report = ExcelReport(sheets=[_sheet("Участники", 1_000), _sheet("Упомянутые", 10)])
+    packager = ReportPackager(max_file_bytes=2_000)
+
+    parts = packager.partition(report)
+
+    assert len(parts) > 1
+    ids = [values[0] for part in parts for sheet in part.sheets for values in sheet.iter_values()]
+    assert len(ids) == 1_010
+    assert all(packager.estimate(part).csv_zip_bytes <= 2_000 for part in parts)
+
+
+def test_paginate_splits_on_line_boundaries_within_limit():
+    lines = [f"строка {idx:03d}" for idx in range(100)]
+
+    pages = list(paginate(lines, limit=100))
+
+    assert all(len(page) <= 100 for page in pages)
+    assert "\n".join(pages).splitlines() == lines
+
+
+def test_paginate_cuts_overlong_line_without_breaking_surrogate_pairs():
+    line = "a" * 5 + "😀" * 5
+
+    pages = list(paginate(["x", line], limit=6))
+
+    # Эмодзи — две единицы UTF-16, как их считает Telegram.
+    assert pages == ["x", "aaaaa", "😀😀😀", "😀😀"]
@@ -1,7 +1,9 @@
+import io
 from datetime import datetime, timezone
 from typing import Any, List
+from zipfile import ZipFile
 
-from audience_bot.domain.reporting import ReportPolicy, ReportFormat
+from audience_bot.domain.reporting import ReportPackager, ReportPolicy, ReportFormat
 from audience_bot.infrastructure.reporting_adapter import ReportingAdapter
 from audience_bot.application.usecases.dto import ExtractionResultDTO, ReportDTO, ReportMetadataDTO
 from audience_bot.domain.extraction import AudienceProfile, ExtractionResult, ProfileId, ProfileType
@@ -42,7 +44,7 @@ def test_reporting_adapter_returns_text_when_under_threshold():
 
     assert isinstance(report, ReportDTO)
     assert report.format == ReportFormat.PLAIN_TEXT
-    assert report.text is not None
+    assert report.full_text()
     assert b"excel" not in (report.excel_bytes or b"")
 
 
@@ -58,3 +60,78 @@ def test_reporting_adapter_returns_excel_when_threshold_reached():
     assert report.format == ReportFormat.EXCEL
     assert report.excel_bytes == b"excel-bytes"
     assert renderer.rendered_reports
+
+
+def test_reporting_adapter_streams_requested_csv_without_rendering_excel():
+    renderer = DummyExcelRenderer()
+    adapter = ReportingAdapter(renderer, report_policy=ReportPolicy(plain_text_threshold=100))
+    extraction = ExtractionResultDTO(result=build_extraction_result(3))
+    metadata = ReportMetadataDTO(
+        export_time=datetime.now(timezone.utc), chat_name="Chat", requested_format=ReportFormat.CSV
+    )
+
+    report = adapter.build(extraction, metadata)
+
+    assert report.format == ReportFormat.CSV
+    assert report.filename == "audience-report.csv"
+    assert not renderer.rendered_reports
+    lines = report.file_bytes().decode("utf-8").splitlines()
+    assert len(lines) == 4 and lines[1].startswith("Участники,")
+
+
+def test_reporting_adapter_forced_format_applies_without_request():
+    adapter = ReportingAdapter(DummyExcelRenderer(), force_format=ReportFormat.JSONL)
+    extraction = ExtractionResultDTO(result=build_extraction_result(1))
+    metadata = ReportMetadataDTO(export_time=datetime.now(timezone.utc), chat_name="Chat")
+
+    assert adapter.build(extraction, metadata).format == ReportFormat.JSONL
+
+
+def test_reporting_adapter_falls_back_to_csv_zip_over_upload_limit():
+    renderer = DummyExcelRenderer()
+    adapter = ReportingAdapter(
+        renderer,
+        report_policy=ReportPolicy(plain_text_threshold=1),
+        packager=ReportPackager(max_file_bytes=2_000),
+    )
+    extraction = ExtractionResultDTO(result=build_extraction_result(200))
+    metadata = ReportMetadataDTO(export_time=datetime.now(timezone.utc), chat_name="Chat")
+
+    report = adapter.build(extraction, metadata)
+
+    assert report.format == ReportFormat.CSV_ZIP
+    assert not renderer.rendered_reports
+    assert report.note and "CSV" in report.note
+    files = [report, *report.parts]
+    assert len(files) > 1
+    assert [item.filename for item in files[:2]] == ["audience-report-1.zip", "audience-report-2.zip"]
+    rows = 0
+    for item in files:
+        with ZipFile(io.BytesIO(item.file_bytes())) as archive:
+            for name in archive.namelist():
+                rows += len(archive.read(name).decode("utf-8").splitlines()) - 1
+    assert rows == 200
+
+
+def test_reporting_adapter_paginates_long_text_reports():
+    result = ExtractionResult()
+    for idx in range(40):
+        name = f"Участник с очень длинным отображаемым именем {idx} " * 4
+        result.add_participant(
+            AudienceProfile(
+                profile_id=ProfileId(user_id=idx, username=f"user{idx}", display_name=name),
+                profile_type=ProfileType.PARTICIPANT,
+                username=f"@user{idx}",
+                display_name=name,
+            )
+        )
+    adapter = ReportingAdapter(DummyExcelRenderer(), report_policy=ReportPolicy(plain_text_threshold=100))
+    metadata = ReportMetadataDTO(export_time=datetime.now(timezone.utc), chat_name="Chat")
+
+    report = adapter.build(ExtractionResultDTO(result=result), metadata)
+
+    pages = list(report.iter_pages())
+    assert len(pages) > 1
+    assert all(len(page) <= 4096 for page in pages)
+    assert "\n".join(pages) == report.full_text()
+    assert report.full_text().count("@user") == 40
@@ -47,3 +47,67 @@ class ExcelReportBuilderTests(unittest.TestCase):
         self.assertEqual(report.sheets[1].name, "Упомянутые")
         self.assertEqual(report.sheets[2].name, "Каналы")
         self.assertTrue(any(row["Username"] == "@alice" and row["Имя"] == "Алиса" for row in report.sheets[0].rows))
+
+    def test_builder_adds_provenance_column_when_index_present(self):
+        from audience_bot.domain.extraction import ProvenanceIndex
+
+        result = ExtractionResult()
+        profile_id = ProfileId(user_id=1, username="@alice", display_name="Алиса")
+        result.add_participant(
+            AudienceProfile(
+                profile_id=profile_id, profile_type=ProfileType.PARTICIPANT, username="@alice", display_name="Алиса"
+            )
+        )
+        result.provenance = ProvenanceIndex()
+        result.provenance.record(profile_id, "author", "812")
+
+        metadata = ReportMetadata(exported_at=datetime.now(timezone.utc), chat_name="Test", participant_count=1)
+        report = ExcelReportBuilder().build(result, metadata)
+
+        self.assertEqual(report.sheets[0].rows[0][ExcelReportBuilder.PROVENANCE_COLUMN], "автор #812")
+
+    def test_builder_adds_activity_sheet(self):
+        from audience_bot.domain.extraction import AudienceExtractor
+        from audience_bot.domain.messages import ChatMessage, RawUserRef
+
+        author = RawUserRef(display_name="Алиса", user_id=1, username="@alice", first_name=None, last_name=None)
+        result = AudienceExtractor().extract(
+            [ChatMessage(message_id="1", timestamp=datetime(2025, 1, 1, 10), author=author)]
+        )
+        metadata = ReportMetadata(exported_at=datetime.now(timezone.utc), chat_name="Test", participant_count=1)
+        report = ExcelReportBuilder().build(result, metadata)
+
+        self.assertEqual(report.sheets[-1].name, "Активность")
+        self.assertEqual(
+            report.sheets[-1].rows, [{"Дата": "2025-01-01", "Сообщений": "1", "Уникальных авторов": "1"}]
+        )
+
+    def test_builder_profile_sheets_are_lazy_tuples_in_column_order(self):
+        from audience_bot.domain.reporting import SheetModel
+
+        result = ExtractionResult()
+        for user_id, username in ((2, "@bob"), (1, "@alice")):
+            result.add_participant(
+                AudienceProfile(
+                    profile_id=ProfileId(user_id=user_id, username=username, display_name=username.strip("@")),
+                    profile_type=ProfileType.PARTICIPANT,
+                    username=username,
+                    display_name=username.strip("@"),
+                )
+            )
+        metadata = ReportMetadata(exported_at=datetime(2025, 1, 2, 3, 4, 5), chat_name="Test", participant_count=2)
+        sheet = ExcelReportBuilder().build(result, metadata).sheets[0]
+
+        values = list(sheet.iter_values())
+        self.assertEqual(values, list(sheet.iter_values()))
+        self.assertEqual([row[:3] for row in values], [("2025-01-02 03:04:05", "1", "@alice"), ("2025-01-02 03:04:05", "2", "@bob")])
+        self.assertTrue(all(len(row) == len(sheet.columns) for row in values))
+
+        # Ленивый лист читается и словарями — не пустым списком.
+        self.assertEqual([row["Username"] for row in sheet.rows], ["@alice", "@bob"])
+        self.assertEqual(sheet.rows[0]["Дата экспорта"], "2025-01-02 03:04:05")
+
+        eager = SheetModel(name="Лист", columns=["A", "B"], rows=[{"B": "2"}])
+        self.assertEqual(list(eager.iter_values()), [("", "2")])
+        with self.assertRaises(ValueError):
+            SheetModel(name="Лист", columns=["A"], rows=[{"A": "1"}], source=lambda: [("1",)])
@@ -0,0 +1,38 @@
+import pytest
+from synthetic_export import SyntheticExportSpec, export_bytes
+
+from audience_bot.application.usecases.dto import RawFileDTO
+from audience_bot.domain.extraction import AudienceExtractor
+from audience_bot.infrastructure.parsers import ParserAdapter
+
+SPEC = SyntheticExportSpec(messages=2_000, authors=150, mentioned_only=40, deleted_ratio=0.05, seed=7)
+
+
+def _extract(fmt):
+    content = export_bytes(SPEC, fmt)
+    parsed = ParserAdapter().parse([RawFileDTO(path="<synthetic>", filename=f"result.{fmt}", content=content)])
+    return parsed, AudienceExtractor().extract(parsed.messages)
+
+
+def test_generator_is_deterministic():
+    assert export_bytes(SPEC) == export_bytes(SPEC)
+    assert export_bytes(SPEC) != export_bytes(SyntheticExportSpec(messages=2_000, seed=8))
+
+
+@pytest.mark.parametrize("fmt", ["json", "html", "zip"])
+def test_synthetic_export_parses_in_every_format(fmt):
+    parsed, result = _extract(fmt)
+
+    assert len(parsed.messages) == SPEC.messages
+    # Удалённые аккаунты в аудиторию не попадают.
+    assert 0 < len(result.participants) < SPEC.authors
+    assert result.mentioned_only
+
+
+def test_json_export_has_channels_and_matches_zip():
+    parsed, result = _extract("json")
+    _, zipped = _extract("zip")
+
+    assert parsed.chat_name == SPEC.chat_name
+    assert len(result.channels) == SPEC.channels
+    assert (len(zipped.participants), len(zipped.mentioned_only)) == (len(result.participants), len(result.mentioned_only))
@@ -0,0 +1,126 @@
+import csv
+import gzip
+import io
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+from audience_bot.domain.reporting import ExcelReport, ExcelReportBuilder, ReportFormat, ReportMetadata, SheetModel
+from audience_bot.domain.extraction import AudienceProfile, ExtractionResult, ProfileId, ProfileType
+from audience_bot.infrastructure.table_export import TableReportWriter
+from audience_bot.infrastructure.xlsx_stream import StreamingExcelRendererAdapter
+
+
+def _report() -> ExcelReport:
+    result = ExtractionResult()
+    result.add_participant(
+        AudienceProfile(
+            profile_id=ProfileId(user_id=1, username="@alice", display_name="Алиса, \"А\""),
+            profile_type=ProfileType.PARTICIPANT,
+            username="@alice",
+            display_name="Алиса, \"А\"",
+        )
+    )
+    result.add_mentioned(
+        AudienceProfile(
+            profile_id=ProfileId(user_id=None, username="@bob", display_name="Боб"),
+            profile_type=ProfileType.MENTIONED_ONLY,
+            username="@bob",
+            display_name="Боб",
+        )
+    )
+    metadata = ReportMetadata(exported_at=datetime(2025, 1, 1, 12), chat_name="Chat", participant_count=1)
+    report = ExcelReportBuilder().build(result, metadata)
+    report.sheets.append(SheetModel(name="Изменения", columns=["Изменение"], rows=[{"Изменение": "новый"}]))
+    return report
+
+
+def test_csv_contains_profile_sheets_with_sheet_column():
+    sink = io.BytesIO()
+    TableReportWriter().write(_report(), ReportFormat.CSV, sink)
+
+    rows = list(csv.reader(io.StringIO(sink.getvalue().decode("utf-8"))))
+    assert rows[0][:3] == ["Лист", "Дата экспорта", "user_id"]
+    assert rows[1][0] == "Участники" and rows[1][4] == "Алиса, \"А\""
+    assert rows[2][0] == "Упомянутые" and rows[2][2] == ""
+    assert len(rows) == 3
+
+
+def test_jsonl_includes_every_sheet_and_gzip_round_trips():
+    writer = TableReportWriter(compress=True)
+    sink = io.BytesIO()
+    writer.write(_report(), ReportFormat.JSONL, sink)
+
+    assert writer.filename(ReportFormat.JSONL) == "audience-report.jsonl.gz"
+    records = [json.loads(line) for line in gzip.decompress(sink.getvalue()).decode("utf-8").splitlines()]
+    assert [record["Лист"] for record in records] == ["Участники", "Упомянутые", "Изменения"]
+    assert records[0]["Username"] == "@alice"
+    assert records[-1] == {"Лист": "Изменения", "Изменение": "новый"}
+    # Приёмник остаётся открытым — в него можно писать дальше.
+    sink.write(b"")
+
+
+def _load_sqlite(data: bytes, tmp_path) -> sqlite3.Connection:
+    path = tmp_path / "report.sqlite"
+    path.write_bytes(data)
+    return sqlite3.connect(path)
+
+
+def test_sqlite_report_has_profiles_categories_metadata_and_indexes(tmp_path):
+    report = _report()
+    activity = {"Дата": "2025-01-01", "Сообщений": "3", "Уникальных авторов": "2"}
+    report.sheets.insert(2, SheetModel(name="Активность", columns=list(activity), rows=[activity]))
+    writer = TableReportWriter()
+    sink = io.BytesIO()
+    writer.write(report, ReportFormat.SQLITE, sink)
+
+    assert writer.filename(ReportFormat.SQLITE) == "audience-report.sqlite"
+    connection = _load_sqlite(sink.getvalue(), tmp_path)
+    rows = connection.execute(
+        "SELECT c.name, p.user_id, p.username, p.display_name, p.has_channel"
+        " FROM profiles p JOIN categories c ON c.id = p.category_id ORDER BY p.id"
+    ).fetchall()
+    assert rows == [("Участники", 1, "@alice", "Алиса, \"А\"", 0), ("Упомянутые", None, "@bob", "Боб", 0)]
+    metadata = dict(connection.execute("SELECT key, value FROM metadata"))
+    assert metadata["chat_name"] == "Chat" and metadata["profile_count"] == "2"
+    assert metadata["exported_at"] == "2025-01-01 12:00:00"
+    assert connection.execute("SELECT * FROM activity").fetchall() == [("2025-01-01", 3, 2)]
+    extra = connection.execute("SELECT sheet, data FROM sheet_rows").fetchall()
+    assert [(sheet, json.loads(data)) for sheet, data in extra] == [("Изменения", {"Изменение": "новый"})]
+    indexes = {name for (name,) in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"profiles_by_user_id", "profiles_by_username"} <= indexes
+    plan = connection.execute("EXPLAIN QUERY PLAN SELECT * FROM profiles WHERE username = '@bob'").fetchall()
+    assert "profiles_by_username" in str(plan)
+    connection.close()
+
+
+@pytest.mark.slow
+def test_sqlite_build_is_faster_than_excel_for_large_audience():
+    # Полный замер — BENCH_PROFILES=500000 (см. docs/quality/testing-strategy.md).
+    count = int(os.environ.get("BENCH_PROFILES", "20000"))
+    result = ExtractionResult()
+    for idx in range(count):
+        result.add_participant(
+            AudienceProfile(
+                profile_id=ProfileId(user_id=idx, username=f"@user{idx}", display_name=f"User {idx}"),
+                profile_type=ProfileType.PARTICIPANT,
+                username=f"@user{idx}",
+                display_name=f"User {idx}",
+            )
+        )
+    metadata = ReportMetadata(exported_at=datetime(2025, 1, 1), chat_name="Big", participant_count=count)
+    report = ExcelReportBuilder().build(result, metadata)
+
+    started = time.perf_counter()
+    TableReportWriter().write(report, ReportFormat.SQLITE, io.BytesIO())
+    sqlite_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    StreamingExcelRendererAdapter().render(report)
+    excel_seconds = time.perf_counter() - started
+
+    print(f"profiles={count} sqlite={sqlite_seconds:.2f}s xlsx={excel_seconds:.2f}s")
+    assert sqlite_seconds < excel_seconds
@@ -0,0 +1,96 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+import pytest
+
+from audience_bot.application.config import TelegramConfig
+from audience_bot.infrastructure.telegram import TelegramAPIAdapter
+
+
+@pytest.fixture
+def document_server():
+    """sendDocument: multipart — загрузка с новым file_id, форма — отправка по известному file_id."""
+    calls = []
+    known = set()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.headers["Content-Type"].startswith("multipart/form-data"):
+                file_id = f"file-{len(known) + 1}"
+                known.add(file_id)
+                calls.append(("upload", len(body)))
+                status, payload = 200, {"ok": True, "result": {"document": {"file_id": file_id}}}
+            else:
+                file_id = parse_qs(body.decode())["document"][0]
+                calls.append(("file_id", file_id))
+                if file_id in known:
+                    status, payload = 200, {"ok": True, "result": {"document": {"file_id": file_id}}}
+                else:
+                    status, payload = 400, {"ok": False, "description": "Bad Request: wrong file identifier"}
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}", calls, known
+    server.shutdown()
+    server.server_close()
+
+
+def _adapter(base_url, cache_size=256):
+    config = TelegramConfig(
+        token="t",
+        poll_interval=1,
+        poll_timeout=1,
+        base_url=base_url,
+        file_base_url=base_url,
+        file_id_cache_size=cache_size,
+    )
+    return TelegramAPIAdapter(config)
+
+
+def test_send_file_reuses_file_id_for_same_content(document_server):
+    base_url, calls, _ = document_server
+    adapter = _adapter(base_url)
+    report = b"x" * 100_000
+
+    adapter.send_file("admin-1", report, "audience-report.xlsx")
+    adapter.send_file("admin-2", report, "audience-report.xlsx")
+    adapter.send_file("admin-2", b"other", "audience-report.xlsx")
+
+    assert [kind for kind, _ in calls] == ["upload", "file_id", "upload"]
+    assert calls[1] == ("file_id", "file-1")
+
+
+def test_send_file_reuploads_when_file_id_is_rejected(document_server):
+    base_url, calls, known = document_server
+    adapter = _adapter(base_url)
+
+    adapter.send_file("c", b"report", "audience-report.csv")
+    known.clear()
+    adapter.send_file("c", b"report", "audience-report.csv")
+    adapter.send_file("c", b"report", "audience-report.csv")
+
+    assert calls == [("upload", calls[0][1]), ("file_id", "file-1"), ("upload", calls[2][1]), ("file_id", "file-1")]
+
+
+def test_file_id_cache_is_bounded(document_server):
+    base_url, calls, _ = document_server
+    adapter = _adapter(base_url, cache_size=1)
+
+    adapter.send_file("c", b"first", "a.csv")
+    adapter.send_file("c", b"second", "a.csv")
+    adapter.send_file("c", b"first", "a.csv")
+
+    assert [kind for kind, _ in calls] == ["upload", "upload", "upload"]
@@ -0,0 +1,119 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+from audience_bot.application.config import PipelineConfig
+from audience_bot.application.services.conversation import ConversationService
+from audience_bot.application.services.sessions import InMemorySessionStore
+from audience_bot.application.tracing import (
+    JsonlSpanExporter,
+    configure_tracing,
+    otlp_payload,
+    start_span,
+    traced,
+)
+from audience_bot.cli import create_pipeline
+from audience_bot.infrastructure.telegram import BotController, ConsoleTelegramAPIAdapter, TelegramWebhookAdapter
+from audience_bot.infrastructure.temp_storage import InMemoryTempStorageAdapter
+
+
+class CollectingExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def shutdown(self):
+        pass
+
+
+class DownloadingAPI(ConsoleTelegramAPIAdapter):
+    def download_file(self, file_id):
+        return Path("tests/data/sample.json").read_bytes()
+
+
+@pytest.fixture
+def exporter():
+    collecting = CollectingExporter()
+    configure_tracing(collecting)
+    yield collecting
+    configure_tracing(None)
+
+
+def test_update_is_traced_from_webhook_to_pipeline_stages(exporter):
+    session_store = InMemorySessionStore()
+    config = PipelineConfig(max_files=2, max_file_size=10 * 1024 * 1024)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        service = ConversationService(
+            session_store, create_pipeline(), InMemoryTempStorageAdapter(), config, executor=executor
+        )
+        webhook = TelegramWebhookAdapter(BotController(service, DownloadingAPI()))
+        webhook.handle_request(
+            {
+                "update_id": 1,
+                "message": {
+                    "chat": {"id": "c"},
+                    "from": {"id": "u"},
+                    "document": {"file_id": "f", "file_name": "sample.json"},
+                },
+            }
+        )
+        webhook.handle_request({"update_id": 2, "message": {"chat": {"id": "c"}, "from": {"id": "u"}, "text": "/process"}})
+
+    roots = [span for span in exporter.spans if span.parent_id is None]
+    assert [root.name for root in roots] == ["telegram.update", "telegram.update"]
+    assert [root.attributes["update_id"] for root in roots] == [1, 2]
+    upload_trace, process_trace = (root.trace_id for root in roots)
+    upload_names = {span.name for span in exporter.spans if span.trace_id == upload_trace}
+    process_names = {span.name for span in exporter.spans if span.trace_id == process_trace}
+    # Фоновая подготовка файла — в трассе загрузки, несмотря на другой поток.
+    assert {"stage.download", "conversation.upload_file", "pipeline.prepare", "stage.parse"} <= upload_names
+    assert {"bot.route", "conversation.process", "pipeline.execute_prepared", "stage.build", "bot.send_response"} <= (
+        process_names
+    )
+    by_id = {span.span_id: span for span in exporter.spans}
+    build = next(span for span in exporter.spans if span.name == "stage.build")
+    assert by_id[build.parent_id].name == "pipeline.execute_prepared"
+    assert build.attributes["format"] in {"plain_text", "excel"}
+
+
+def test_spans_record_errors_and_nothing_is_exported_when_disabled(exporter):
+    with pytest.raises(ValueError):
+        with start_span("failing"):
+            raise ValueError("boom")
+    assert exporter.spans[-1].status == "error"
+    assert exporter.spans[-1].attributes["error"] == "ValueError"
+
+    configure_tracing(None)
+    calls = []
+
+    @traced("disabled")
+    def work():
+        calls.append(1)
+        return 42
+
+    with start_span("ignored") as span:
+        span.set_attribute("key", "value")
+    assert work() == 42 and calls == [1]
+    assert [span.name for span in exporter.spans] == ["failing"]
+
+
+def test_jsonl_and_otlp_encodings(tmp_path, exporter):
+    with start_span("root", update_id=7):
+        with start_span("child"):
+            pass
+    jsonl = JsonlSpanExporter(tmp_path / "traces.jsonl")
+    for span in exporter.spans:
+        jsonl.export(span)
+    jsonl.shutdown()
+
+    records = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [record["name"] for record in records] == ["child", "root"]
+    assert records[0]["trace_id"] == records[1]["trace_id"]
+    assert records[0]["parent_id"] == records[1]["span_id"]
+    spans = otlp_payload(exporter.spans)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans[0]["traceId"]) == 32 and len(spans[0]["spanId"]) == 16
+    assert spans[1]["attributes"] == [{"key": "update_id", "value": {"intValue": "7"}}]
@@ -24,7 +24,7 @@ class DummyParser:
         self.messages = messages
         self.calls: List[List[RawFileDTO]] = []
 
-    def parse(self, files: List[RawFileDTO]) -> ParsedMessagesDTO:
+    def parse(self, files: List[RawFileDTO], window=None, watermarks=None) -> ParsedMessagesDTO:
         self.calls.append(files)
         return self.messages
 